@@ -5,6 +5,7 @@ from .device_widget import DeviceWidget
 from .colorbar_widget import ColorbarWidget
 from .matrix_widget import MatrixWidget
 from .crossbar_container_widget import CrossbarContainerWidget
+from .crossbar_image_widget import CrossbarImageWidget
 from .crossbar_widget import CrossbarWidget
 from .config_hardware_widget import ConfigHardwareWidget
 from .data_display_widget import DataDisplayWidget
@@ -1,7 +1,11 @@
 from PyQt5.QtGui import QColor
 import numpy as np
 
+from .. import constants
+
 resistanceColorGradient = []
+# colour of devices whose resistance cannot be displayed
+resistanceColorInvalid = QColor(125, 125, 125)
 
 def _rainbow(x=0):
     # clip values between 0 and 256
@@ -24,3 +28,30 @@ for i in range(256):
     (r, g, b) = _rainbow(i)
     color.setRgbF(r, g, b, 1.0)
     resistanceColorGradient.insert(0, color)
+
+
+def resistanceColorIndex(M):
+    """
+    Index into `resistanceColorGradient` for every resistance in ``M``,
+    computed for all of them at once on a log scale between
+    ``constants.MIN_RES`` and ``constants.MAX_RES``. Resistances that cannot
+    be displayed (not positive, NaN or infinite) get an index of -1.
+
+    >>> idx = resistanceColorIndex([1e3, 1e5, np.inf])
+    >>> colors = [resistanceColorGradient[i] if i >= 0 else
+    >>>     resistanceColorInvalid for i in idx]
+    """
+    M = np.atleast_1d(np.asarray(M, dtype=np.float64))
+    idx = np.full(M.shape, -1, dtype=np.int64)
+
+    valid = np.isfinite(M) & (M > 0)
+    minMlog = np.log10(constants.MIN_RES)
+    normMlog = np.log10(constants.MAX_RES) - minMlog
+    raw = ((np.log10(M[valid]) - minMlog)*255/normMlog).astype(np.int64)
+
+    # Same as indexing the gradient list with `raw` directly: anything
+    # out of range gets the last colour and negative indices wrap around
+    size = len(resistanceColorGradient)
+    idx[valid] = np.where((raw >= size) | (raw < -size), size-1, raw % size)
+
+    return idx
@@ -11,6 +11,8 @@ import sys
 from PyQt5 import QtGui, QtCore, QtWidgets
 from . import DeviceWidget
 from . import MatrixWidget
+from .common import resistanceColorGradient, resistanceColorIndex
+from .common import resistanceColorInvalid
 
 from .. import state
 HW = state.hardware
@@ -21,6 +23,9 @@ from ..Globals import functions
 
 class CrossbarContainerWidget(QtWidgets.QWidget):
 
+    # maximum rate (per s) the crossbar is recoloured at
+    RECOLOR_FPS = 30
+
     def __init__(self):
         super().__init__()
 
@@ -50,6 +55,14 @@ class CrossbarContainerWidget(QtWidgets.QWidget):
 
         self.dragging=False
 
+        # Recolor requests are collected here and applied together at
+        # most RECOLOR_FPS times per second
+        self._dirty = {}
+        self._recolorTimer = QtCore.QTimer(self)
+        self._recolorTimer.setSingleShot(True)
+        self._recolorTimer.setInterval(int(1000/self.RECOLOR_FPS))
+        self._recolorTimer.timeout.connect(self._flushRecolor)
+
     def disableCell(self, w, b):
         self.matrix.cells[w][b].disableIt()
 
@@ -65,7 +78,27 @@ class CrossbarContainerWidget(QtWidgets.QWidget):
         functions.cbAntenna.deselectOld.connect(self.matrix.cells[w][b].dehighlight)
 
     def recolor(self, M, w, b):
-        self.matrix.cells[w][b].recolor(M)
+        # only the latest value of every device matters
+        self._dirty[(w, b)] = M
+        if not self._recolorTimer.isActive():
+            self._recolorTimer.start()
+
+    def _flushRecolor(self):
+        if len(self._dirty) == 0:
+            return
+
+        (dirty, self._dirty) = (self._dirty, {})
+        indices = resistanceColorIndex(list(dirty.values()))
+        cells = self.matrix.cells
+
+        for ((w, b), idx) in zip(dirty.keys(), indices.tolist()):
+            # the array might have shrunk in the meantime
+            if w >= len(cells) or b >= len(cells[w]):
+                continue
+            if idx >= 0:
+                cells[w][b].setColor(resistanceColorGradient[idx])
+            else:
+                cells[w][b].setColor(resistanceColorInvalid)
 
     def dummySlot(self):
         pass
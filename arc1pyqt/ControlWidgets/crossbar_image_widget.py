@@ -0,0 +1,309 @@
+####################################
+
+# (c) Radu Berdan
+# ArC Instruments Ltd.
+
+# This code is licensed under GNU v3 license (see LICENSE.txt for details)
+
+####################################
+
+import numpy as np
+from PyQt5 import QtGui, QtCore, QtWidgets
+
+from .common import resistanceColorGradient, resistanceColorIndex
+from .common import resistanceColorInvalid
+
+from .. import state
+HW = state.hardware
+APP = state.app
+CB = state.crossbar
+from ..Globals import functions
+
+
+# special colour indices; everything else indexes `resistanceColorGradient`
+_DISABLED = -3
+_EMPTY = -2
+_INVALID = -1
+_OFFSET = 3
+
+
+def _argb(color):
+    return QtGui.QColor(color).rgba()
+
+
+class CrossbarImageWidget(QtWidgets.QWidget):
+    """
+    Crossbar view that paints the whole array as a single image, from a
+    numpy array holding the colour index of every device. Unlike
+    `CrossbarContainerWidget` there are no per-device widgets, so redraws
+    and hit-testing for hover, selection and range selection are
+    independent of the size of the array.
+    """
+
+    # maximum rate (per s) the crossbar is recoloured at
+    RECOLOR_FPS = 30
+
+    # margins reserved for the wordline and bitline labels
+    LABEL_MARGIN = (22, 14)
+
+    def __init__(self, words=HW.conf.words, bits=HW.conf.bits, \
+            width=(22,50), height=(14,50), parent=None):
+        super().__init__(parent=parent)
+
+        self.cellWidth = width
+        self.cellHeight = height
+
+        # colour lookup table indexed by colour index + _OFFSET
+        self._lut = np.array([_argb(QtGui.QColor(255, 255, 255)),
+            _argb(QtGui.QColor(255, 255, 255)),
+            _argb(resistanceColorInvalid)] + \
+            [_argb(c) for c in resistanceColorGradient], dtype=np.uint32)
+
+        self.initUI()
+        self.redrawArray(words, bits)
+
+    def initUI(self):
+
+        functions.cbAntenna.selectDeviceSignal.connect(self.changeDevice)
+        functions.cbAntenna.recolor.connect(self.recolor)
+        functions.SAantenna.disable.connect(self.disableCell)
+        functions.SAantenna.enable.connect(self.enableCell)
+
+        self.setMouseTracking(True)
+        self.setSizePolicy(QtWidgets.QSizePolicy.MinimumExpanding, \
+                QtWidgets.QSizePolicy.MinimumExpanding)
+
+        self.labelFont = QtGui.QFont()
+        self.labelFont.setPointSize(7)
+
+        self.gridPen = QtGui.QPen(QtGui.QColor(200, 200, 200))
+        self.selectPen = QtGui.QPen(QtGui.QColor(0, 0, 0))
+        self.selectPen.setWidth(4)
+        self.rangePen = QtGui.QPen(QtGui.QColor(255, 0, 0))
+        self.rangePen.setWidth(3)
+
+        self.dragging = False
+        self.origin = None
+        self.hovered = None
+        self.showRange = True
+
+        # Recolor requests are collected here and applied together at
+        # most RECOLOR_FPS times per second
+        self._dirty = {}
+        self._recolorTimer = QtCore.QTimer(self)
+        self._recolorTimer.setSingleShot(True)
+        self._recolorTimer.setInterval(int(1000/self.RECOLOR_FPS))
+        self._recolorTimer.timeout.connect(self._flushRecolor)
+
+    def redrawArray(self, words=HW.conf.words, bits=HW.conf.bits):
+        self.words = words
+        self.bits = bits
+
+        self._colors = np.full((words, bits), _EMPTY, dtype=np.int16)
+        self._enabled = np.ones((words, bits), dtype=bool)
+        self.selected = None
+        self.range = None
+
+        # pick up whatever is already in the session
+        last = np.full((words, bits), np.nan)
+        for w in range(1, min(words+1, len(CB.history))):
+            for b in range(1, min(bits+1, len(CB.history[w]))):
+                if len(CB.history[w][b]) > 0:
+                    last[w-1][b-1] = CB.history[w][b].resistance[-1]
+        read = ~np.isnan(last)
+        self._colors[read] = resistanceColorIndex(last[read])
+
+        self.updateGeometry()
+        self.update()
+
+    def minimumSizeHint(self):
+        # large arrays get smaller cells
+        cw = min(self.cellWidth[0], max(2, (32*self.cellWidth[0])//self.bits))
+        ch = min(self.cellHeight[0], max(2, (32*self.cellHeight[0])//self.words))
+        return QtCore.QSize(self.LABEL_MARGIN[0] + cw*self.bits + 1,
+            self.LABEL_MARGIN[1] + ch*self.words + 1)
+
+    def sizeHint(self):
+        return self.minimumSizeHint()
+
+    def _grid(self):
+        # returns (x0, y0, cell width, cell height) of the array area
+        availW = self.width() - self.LABEL_MARGIN[0] - 1
+        availH = self.height() - self.LABEL_MARGIN[1] - 1
+        cw = min(availW / self.bits, self.cellWidth[1])
+        ch = min(availH / self.words, self.cellHeight[1])
+        x0 = self.LABEL_MARGIN[0] + (availW - cw*self.bits)/2
+        y0 = (availH - ch*self.words)/2
+        return (x0, y0, cw, ch)
+
+    def cellAt(self, pos, clamp=False):
+        """
+        Device ``(w, b)`` under widget position ``pos`` or None if there is
+        none. If ``clamp`` is True positions outside the array map to the
+        nearest device.
+        """
+        (x0, y0, cw, ch) = self._grid()
+        b = int(np.floor((pos.x() - x0) / cw)) + 1
+        w = int(np.floor((pos.y() - y0) / ch)) + 1
+
+        if clamp:
+            return (min(max(w, 1), self.words), min(max(b, 1), self.bits))
+        if 1 <= w <= self.words and 1 <= b <= self.bits:
+            return (w, b)
+        return None
+
+    def cellRect(self, w, b):
+        """
+        Geometry of device ``(w, b)`` in widget coordinates.
+        """
+        (x0, y0, cw, ch) = self._grid()
+        return QtCore.QRectF(x0 + (b-1)*cw, y0 + (w-1)*ch, cw, ch)
+
+    def paintEvent(self, e):
+        (x0, y0, cw, ch) = self._grid()
+        (words, bits) = (self.words, self.bits)
+
+        colors = np.where(self._enabled, self._colors, _DISABLED)
+        argb = np.ascontiguousarray(self._lut[colors + _OFFSET])
+        image = QtGui.QImage(argb.data, bits, words, 4*bits,
+            QtGui.QImage.Format_ARGB32)
+
+        qp = QtGui.QPainter()
+        qp.begin(self)
+
+        # one pixel per device, scaled up without smoothing
+        qp.drawImage(QtCore.QRectF(x0, y0, cw*bits, ch*words), image)
+
+        # cell borders; skipped when cells get too small to see them
+        if cw >= 4 and ch >= 4:
+            qp.setPen(self.gridPen)
+            lines = [QtCore.QLineF(x0 + c*cw, y0, x0 + c*cw, y0 + words*ch) \
+                for c in range(bits+1)]
+            lines += [QtCore.QLineF(x0, y0 + r*ch, x0 + bits*cw, y0 + r*ch) \
+                for r in range(words+1)]
+            qp.drawLines(lines)
+
+        # labels, thinned out if they would overlap
+        qp.setFont(self.labelFont)
+        qp.setPen(QtGui.QColor(0, 0, 0))
+        metrics = QtGui.QFontMetrics(self.labelFont)
+        wstep = max(1, int(np.ceil(metrics.height() / ch)))
+        bstep = max(1, int(np.ceil(metrics.horizontalAdvance('%d ' % bits) / cw)))
+        for w in range(1, words+1, wstep):
+            qp.drawText(QtCore.QRectF(0, y0 + (w-1)*ch, x0 - 2, ch),
+                QtCore.Qt.AlignRight|QtCore.Qt.AlignVCenter, '%d' % w)
+        for b in range(1, bits+1, bstep):
+            qp.drawText(QtCore.QRectF(x0 + (b-1)*cw, y0 + words*ch, cw,
+                self.LABEL_MARGIN[1]), QtCore.Qt.AlignHCenter|QtCore.Qt.AlignTop,
+                '%d' % b)
+
+        qp.setBrush(QtCore.Qt.NoBrush)
+        if self.selected is not None:
+            qp.setPen(self.selectPen)
+            qp.drawRect(self.cellRect(*self.selected))
+
+        if self.range is not None and self.showRange:
+            (minW, maxW, minB, maxB) = self.range
+            qp.setPen(self.rangePen)
+            qp.drawRect(self.cellRect(minW, minB).united(self.cellRect(maxW, maxB)))
+
+        qp.end()
+
+    def _inArray(self, w, b):
+        return 1 <= w <= self.words and 1 <= b <= self.bits
+
+    def disableCell(self, w, b):
+        if self._inArray(w, b):
+            self._enabled[w-1][b-1] = False
+            self.update()
+
+    def enableCell(self, w, b):
+        if not self._inArray(w, b):
+            return
+        self._enabled[w-1][b-1] = True
+        try:
+            self._colors[w-1][b-1] = resistanceColorIndex(CB.history[w][b][-1][0])[0]
+        except IndexError:
+            self._colors[w-1][b-1] = _EMPTY
+        self.update()
+
+    def changeDevice(self, w, b):
+        self.selected = (w, b)
+        self.update()
+
+    def recolor(self, M, w, b):
+        # only the latest value of every device matters
+        self._dirty[(w, b)] = M
+        if not self._recolorTimer.isActive():
+            self._recolorTimer.start()
+
+    def _flushRecolor(self):
+        if len(self._dirty) == 0:
+            return
+
+        (dirty, self._dirty) = (self._dirty, {})
+        coords = np.array(list(dirty.keys()), dtype=np.int64)
+        values = np.array(list(dirty.values()), dtype=np.float64)
+
+        # the array might have shrunk in the meantime
+        valid = (coords[:, 0] >= 1) & (coords[:, 0] <= self.words) & \
+            (coords[:, 1] >= 1) & (coords[:, 1] <= self.bits)
+        (w, b) = (coords[valid, 0], coords[valid, 1])
+        self._colors[w-1, b-1] = resistanceColorIndex(values[valid])
+        self.update()
+
+    def mousePressEvent(self, event):
+        if event.button() == QtCore.Qt.LeftButton:
+            self.origin = event.pos()
+            self.dragging = True
+
+            cell = self.cellAt(self.origin)
+            if cell is None:
+                return
+
+            (w, b) = cell
+            if CB.checkSA == False or (w, b) in CB.customArray:
+                self.changeDevice(w, b)
+                # signal the crossbar antenna that this device has been selected
+                functions.cbAntenna.selectDeviceSignal.emit(w, b)
+                functions.displayUpdate.updateSignal_short.emit()
+
+            if HW.ArC is not None and HW.conf.sessionmode == 2:
+                HW.ArC.write_b("02\n")
+                HW.ArC.queue_select(w, b)
+        else:
+            self.showRange = not self.showRange
+            self.update()
+
+    def mouseMoveEvent(self, event):
+        if self.dragging:
+            (w0, b0) = self.cellAt(self.origin, clamp=True)
+            (w1, b1) = self.cellAt(event.pos(), clamp=True)
+            (minW, maxW) = (min(w0, w1), max(w0, w1))
+            (minB, maxB) = (min(b0, b1), max(b0, b1))
+
+            CB.limits['words'] = (minW, maxW)
+            CB.limits['bits'] = (minB, maxB)
+
+            self.range = (minW, maxW, minB, maxB)
+            self.showRange = True
+            self.update()
+
+        cell = self.cellAt(event.pos())
+        if cell == self.hovered:
+            return
+        self.hovered = cell
+
+        if cell is None:
+            functions.hoverAntenna.hideHoverPanel.emit()
+        else:
+            rect = self.cellRect(*cell).toRect()
+            functions.hoverAntenna.displayHoverPanel.emit(cell[0], cell[1],
+                rect.x(), rect.y(), rect.width(), rect.height())
+
+    def mouseReleaseEvent(self, event):
+        self.dragging = False
+
+    def leaveEvent(self, event):
+        self.hovered = None
+        functions.hoverAntenna.hideHoverPanel.emit()
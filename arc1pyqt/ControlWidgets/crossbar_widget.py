@@ -17,6 +17,7 @@ APP = state.app
 CB = state.crossbar
 from ..Globals import functions, fonts, styles
 from . import CrossbarContainerWidget
+from . import CrossbarImageWidget
 from .common import resistanceColorGradient
 
 
@@ -56,7 +57,10 @@ class CrossbarWidget(QtWidgets.QWidget):
         lay2=QtWidgets.QHBoxLayout()
         lay2.setSpacing(0)
 
-        self.cb = CrossbarContainerWidget()
+        if APP.imageCrossbar:
+            self.cb = CrossbarImageWidget()
+        else:
+            self.cb = CrossbarContainerWidget()
 
         lay2.addStretch()
         lay2.addWidget(wordline)
@@ -34,6 +34,11 @@ class DataDisplayWidget(QtWidgets.QWidget):
         DisplayMode.ABS_CURRENT: ('A', 'Abs. Current', lambda r, v: np.abs(v/r))
     }
 
+    # Above this many points per window individual point symbols and
+    # markers of the resistance and amplitude plots are no longer drawn
+    # (they would merge into a solid band anyway)
+    MAX_SYMBOL_POINTS = 5000
+
     def __init__(self):
         super().__init__()
         self.initUI()
@@ -84,6 +89,9 @@ class DataDisplayWidget(QtWidgets.QWidget):
         self.plot_pls=view.addPlot()
         self.plot_pls.setMouseEnabled(True,False)
         self.curveP=self.plot_pls.plot(pen=penP)
+        for curve in [self.curveM, self.curveP]:
+            curve.setClipToView(True)
+            curve.setDownsampling(auto=True, method='peak')
         self.curvePMarkers=self.plot_pls.plot(pen=None, symbolPen=None,
                 symbolBrush=(0,0,255), symbol='s', symbolSize=5, pxMode=True)
 
@@ -212,44 +220,48 @@ class DataDisplayWidget(QtWidgets.QWidget):
                 self.plot_mem.setXRange(max(lastPoint-points,0),lastPoint-1)
                 self.plot_pls.setXRange(max(lastPoint-points,0),lastPoint-1)
 
-            Mlist=[]
-            PList=[]
-            PWList=[]
-            PMarkerList=[]
-            ReadMarkerList=[]
-
-            for item in CB.history[CB.word][CB.bit][firstPoint:lastPoint]:
-                if self.log > 0:
-                    Mlist.append(np.abs(func(item[0], item[1])))
-                else:
-                    Mlist.append(func(item[0], item[1]))
-                PList.append(0)
-                PList.append(item[1])
-                PList.append(0)
-                if (item[2]==0):
-                    PMarkerList.append(np.nan)
-                    PWList.append(np.nan)
-                else:
-                    PMarkerList.append(item[1])
-                    PWList.append(item[2])
-
-                ReadMarkerList.append(item[5])
+            history = CB.history[CB.word][CB.bit][firstPoint:lastPoint]
+            amp = history.amplitude
+            pw = history.pulsewidth
+
+            # resistances of 0 are displayed as inf/nan, same as the
+            # empty reads
+            with np.errstate(divide='ignore', invalid='ignore'):
+                Mlist = np.array(func(history.resistance, amp), dtype=np.float64)
+            if self.log > 0:
+                Mlist = np.abs(Mlist)
+
+            # every point is drawn as a 0 → amplitude → 0 triplet
+            PList = np.zeros((len(history), 3))
+            PList[:, 1] = amp
+
+            noPulse = (pw == 0)
+            PMarkerList = np.where(noPulse, np.nan, amp)
+            PWList = np.where(noPulse, np.nan, pw)
+            ReadMarkerList = np.array(history.vread)
 
             self.plot_pls.enableAutoRange()
 
-            pNrList=np.asarray(range(firstPoint,lastPoint))
+            pNrList=np.arange(firstPoint,lastPoint)
 
-            self.curveM.setData(pNrList,np.asarray(Mlist))
-            self.curveP.setData(np.repeat(pNrList,3),np.asarray(PList))
-            self.curvePW.setData(pNrList,np.asarray(PWList))
-            self.curvePMarkers.setData(pNrList,np.asarray(PMarkerList))
-            self.curveReadMarkers.setData(pNrList, np.asarray(ReadMarkerList))
+            self.curveM.setData(pNrList,Mlist)
+            self.curveP.setData(np.repeat(pNrList,3),PList.ravel())
+            self.curvePW.setData(pNrList,PWList)
+
+            if len(pNrList) <= self.MAX_SYMBOL_POINTS:
+                self.curveM.setSymbol('s')
+                self.curvePMarkers.setData(pNrList,PMarkerList)
+                self.curveReadMarkers.setData(pNrList, ReadMarkerList)
+            else:
+                self.curveM.setSymbol(None)
+                self.curvePMarkers.setData([],[])
+                self.curveReadMarkers.setData([],[])
 
             if self.log==0:
                 # If any infinite numbers arise, deal appropriately.
-                self.plot_mem.setYRange(min(Mlist)/1.2,self.max_without_inf(Mlist)*1.2)
+                self.plot_mem.setYRange(self.min_without_nan(Mlist)/1.2,self.max_without_inf(Mlist)*1.2)
             else:
-                self.plot_mem.setYRange(np.log10(min(Mlist)/1.2),np.log10(self.max_without_inf(Mlist)*1.2))
+                self.plot_mem.setYRange(np.log10(self.min_without_nan(Mlist)/1.2),np.log10(self.max_without_inf(Mlist)*1.2))
 
         else:
             self.curveM.setData([],[])
@@ -263,10 +275,18 @@ class DataDisplayWidget(QtWidgets.QWidget):
         self.update()
 
     def max_without_inf(self, lst):
-        maxim=0
-        for value in lst:
-            if value>maxim and value!=np.inf:
-                maxim=value
-
-        return maxim
+        # largest finite positive value, 0 if there is none
+        values = np.asarray(lst, dtype=np.float64)
+        values = values[np.isfinite(values) & (values > 0)]
+        if len(values) == 0:
+            return 0
+        return values.max()
+
+    def min_without_nan(self, lst):
+        # smallest value ignoring NaNs, 0 if there is none
+        values = np.asarray(lst, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return 0
+        return values.min()
 
@@ -13,7 +13,8 @@ from PyQt5 import QtGui, QtWidgets
 
 from .. import Globals
 from ..Globals import functions
-from .common import resistanceColorGradient
+from .common import resistanceColorGradient, resistanceColorIndex
+from .common import resistanceColorInvalid
 
 from .. import state
 CB = state.crossbar
@@ -83,27 +84,13 @@ class DeviceWidget(QtWidgets.QWidget):
 
 
     def recolor(self,M):
+        idx = resistanceColorIndex(M)[0]
+        if idx >= 0:
+            self.setColor(resistanceColorGradient[idx])
+        else:
+            self.setColor(resistanceColorInvalid)
 
-        minMlog=np.log10(constants.MIN_RES)
-        normMlog=np.log10(constants.MAX_RES) - minMlog
-
-        color = QtGui.QColor(125, 125, 125)
-
-        if M>0:
-            try:
-                # get the log index out of 255 max values
-                idx = int((np.log10(M)-minMlog)*255/(normMlog))
-                color = resistanceColorGradient[idx]
-            except OverflowError:
-                # Inf
-                color = QtGui.QColor(125, 125, 125)
-            except ValueError:
-                # Inf
-                color = QtGui.QColor(125, 125, 125)
-            except IndexError:
-                # Above 100M but still measurable
-                color = resistanceColorGradient[-1]
-
+    def setColor(self, color):
         self.brush.setColor(color)
         self.update()
 
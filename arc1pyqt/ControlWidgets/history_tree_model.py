@@ -50,6 +50,17 @@ class HistoryTreeItem:
         # if it's currently selected or not
         self._active = False
 
+        # position under parent; kept up to date by the parent
+        self._row = 0
+
+        # number of history rows represented by the children of this item
+        # or None if the children have not been fetched yet
+        self._fetched = None
+
+        # number of consecutive reads or pulses represented by this item;
+        # None for anything else
+        self._count = None
+
     @property
     def coords(self):
         return (self._w, self._b)
@@ -85,6 +96,25 @@ class HistoryTreeItem:
     def setActive(self, what):
         self._active = what
 
+    @property
+    def count(self):
+        return self._count
+
+    def setCount(self, count):
+        self._count = count
+
+    def extendRun(self, end):
+        # one more read or pulse, ending at history row ``end``
+        self._count += 1
+        self._end = end
+
+    @property
+    def fetched(self):
+        return self._fetched
+
+    def setFetched(self, upto):
+        self._fetched = upto
+
     def child(self, row):
         try:
             return self.children[row]
@@ -99,10 +129,13 @@ class HistoryTreeItem:
 
     def appendChild(self, item):
         item._parent = self
+        item._row = len(self.children)
         self.children.append(item)
 
     def removeChild(self, row):
         self.children.pop(row)
+        for (i, child) in enumerate(self.children[row:], row):
+            child._row = i
 
     def clear(self):
         self.children.clear()
@@ -111,9 +144,7 @@ class HistoryTreeItem:
         if self.parent() is None:
             return 0
 
-        parent = self.parent()
-
-        return parent.indexOf(self)
+        return self._row
 
     def indexOf(self, item):
         return self.children.index(item)
@@ -128,20 +159,38 @@ class HistoryTreeItem:
 
 
 class HistoryTreeModel(QtCore.QAbstractItemModel):
-
-    def __init__(self, data=None, title=None, parent=None):
+    """
+    Two-level model of the session history: one top-level item per device
+    and one child per history block. Children are populated lazily; they
+    are only requested from ``fetcher`` when a device is first expanded.
+    ``fetcher`` is called with the top-level item and must return a tuple
+    ``(children, upto)`` where ``upto`` is the number of history rows the
+    children represent.
+    """
+
+    def __init__(self, data=None, title=None, fetcher=None, parent=None):
         super().__init__()
 
         # header title, if any
         self._title = title
 
+        # provider of the children of unfetched top-level items
+        self._fetcher = fetcher
+
         # dummy root item
         self._root = HistoryTreeItem(-1, -1, -1, -1, "", None)
 
+        # (w, b) -> row of the corresponding top-level item
+        self._rows = {}
+
+        # coordinates of the currently active top-level item, if any
+        self._active = None
+
         # add any given data to the tree
         if data:
             for child in data:
                 self._root.appendChild(child)
+                self._rows[child.coords] = child.row()
 
     def index(self, row, col, parent_idx=None):
 
@@ -162,12 +211,7 @@ class HistoryTreeModel(QtCore.QAbstractItemModel):
         return QtCore.QModelIndex()
 
     def appendTopLevel(self, item):
-
-        self.beginInsertRows(QtCore.QModelIndex(), 0, item.childCount()-1)
-        self._root.appendChild(item)
-        self.endInsertRows()
-
-        return self.createIndex(self._root.childCount()-1, 0, item)
+        return self.appendChild(item)
 
     def appendChild(self, item, parentIdx=None):
 
@@ -179,47 +223,93 @@ class HistoryTreeModel(QtCore.QAbstractItemModel):
             parent = parentIdx.internalPointer()
             idx = parentIdx
 
-        self.beginInsertRows(idx, 0, item.childCount()-1)
+        row = parent.childCount()
+        self.beginInsertRows(idx, row, row)
         parent.appendChild(item)
+        if parent is self._root:
+            self._rows[item.coords] = row
         self.endInsertRows()
 
-        return self.createIndex(parent.childCount()-1, 0, item)
+        return self.createIndex(row, 0, item)
 
     def children(self):
         return self._root.children
 
     def appendChildFromParts(self, w, b, start, end, descr, tag):
-        self.beginInsertRows(QtCore.QModelIndex(), 0, item.childCount()-1)
-        self._root.appendChild(HistoryTreeItem(w, b, start, end, descr, tag))
-        self.endInsertRows()
+        self.appendChild(HistoryTreeItem(w, b, start, end, descr, tag))
 
     def removeChild(self, row):
         child = self._root.child(row)
-        idx = self.createIndex(row, 0, child)
-        self.beginRemoveRows(idx, row, 0)
+        self.beginRemoveRows(QtCore.QModelIndex(), row, row)
         self._root.removeChild(row)
+        del self._rows[child.coords]
+        for item in self._root.children[row:]:
+            self._rows[item.coords] = item.row()
+        if self._active == child.coords:
+            self._active = None
         self.endRemoveRows()
 
     def clear(self):
         self.beginResetModel()
         self._root.clear()
+        self._rows.clear()
+        self._active = None
         self.endResetModel()
 
     def clearTopLevel(self, w, b):
+        """
+        Remove all children of the top-level item of ``(w, b)``; they will
+        be fetched again the next time they are needed.
+        """
         toplevelIdx = self.findTopLevel(w, b)
         if toplevelIdx is None:
             return
         toplevel = toplevelIdx.internalPointer()
-        self.beginResetModel()
+        toplevel.setFetched(None)
+        if toplevel.childCount() == 0:
+            return
+        self.beginRemoveRows(toplevelIdx, 0, toplevel.childCount()-1)
         toplevel.clear()
-        self.endResetModel()
+        self.endRemoveRows()
+
+    def hasChildren(self, parent_idx=QtCore.QModelIndex()):
+        if not parent_idx.isValid():
+            return self._root.childCount() > 0
+        item = parent_idx.internalPointer()
+        # unfetched devices are only shown if they have data so they
+        # can always be expanded
+        if self.isTopLevel(parent_idx) and item.fetched is None:
+            return True
+        return item.childCount() > 0
+
+    def canFetchMore(self, parent_idx):
+        if not parent_idx.isValid() or self._fetcher is None:
+            return False
+        return self.isTopLevel(parent_idx) and \
+            parent_idx.internalPointer().fetched is None
+
+    def fetchMore(self, parent_idx):
+        if not self.canFetchMore(parent_idx):
+            return
+        toplevel = parent_idx.internalPointer()
+        (children, upto) = self._fetcher(toplevel)
+        toplevel.setFetched(upto)
+        if len(children) == 0:
+            return
+
+        first = toplevel.childCount()
+        self.beginInsertRows(parent_idx, first, first + len(children) - 1)
+        for child in children:
+            toplevel.appendChild(child)
+        self.endInsertRows()
 
     def parent(self, idx):
         if not idx.isValid():
             return QtCore.QModelIndex()
 
         p = idx.internalPointer().parent()
-        if p:
+        # top-level items have no parent as far as Qt is concerned
+        if p and p is not self._root:
             return super().createIndex(p.row(), 0, p)
         return QtCore.QModelIndex()
 
@@ -240,6 +330,8 @@ class HistoryTreeModel(QtCore.QAbstractItemModel):
         if role == QtCore.Qt.DisplayRole:
             if self.isTopLevel(idx):
                 return "W=%d | B=%d" % (child.coords)
+            if child.count is not None:
+                return "%s × %d" % (child.description, child.count)
             return child.description
         return None
 
@@ -267,27 +359,64 @@ class HistoryTreeModel(QtCore.QAbstractItemModel):
         self.setActiveIdx(idx, what)
 
     def setActiveIdx(self, idx, what):
-        idx.internalPointer().setActive(what)
+        item = idx.internalPointer()
+        item.setActive(what)
+        if self.isTopLevel(idx):
+            if what:
+                self._active = item.coords
+            elif self._active == item.coords:
+                self._active = None
         self.dataChanged.emit(idx, idx)
 
+    def activate(self, w, b):
+        """
+        Make the top-level item of ``(w, b)`` the active one. Only the
+        previously active and the newly active rows are touched. Returns
+        the index of the top-level item or None if there is none.
+        """
+        idx = self.findTopLevel(w, b)
+        if idx is None:
+            return None
+
+        if self._active is not None and self._active != (w, b):
+            previous = self.findTopLevel(*self._active)
+            if previous is not None:
+                self.setActiveIdx(previous, False)
+
+        if not idx.internalPointer().active:
+            self.setActiveIdx(idx, True)
+        self._active = (w, b)
+
+        return idx
+
     def setItemDescription(self, row, what, parentIdx=None):
         if parentIdx is None:
             parent = self._root
         else:
             parent = parentIdx.internalPointer()
 
-        item = parentIdx.internalPointer().child(row)
+        item = parent.child(row)
         item.setDescription(what)
 
         idx = self.createIndex(row, 0, item)
         self.dataChanged.emit(idx, idx)
 
+    def extendRun(self, row, end, parentIdx):
+        """
+        Add one more read or pulse, ending at history row ``end``, to the
+        run represented by child ``row`` of ``parentIdx``.
+        """
+        item = parentIdx.internalPointer().child(row)
+        item.extendRun(end)
+
+        idx = self.createIndex(row, 0, item)
+        self.dataChanged.emit(idx, idx)
+
     def isRoot(self, idx):
         return idx.internalPointer() == self._root
 
     def findTopLevel(self, word, bit):
-        for i in range(self._root.childCount()):
-            item = self._root.child(i)
-            if item.coords == (word, bit):
-                return self.createIndex(i, 0, item)
-        return None
+        row = self._rows.get((word, bit), None)
+        if row is None:
+            return None
+        return self.createIndex(row, 0, self._root.child(row))
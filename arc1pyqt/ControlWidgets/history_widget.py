@@ -21,6 +21,7 @@ APP = state.app
 CB = state.crossbar
 from ..Globals import functions, fonts
 from .. import Graphics
+from ..modutils import ResultCache
 
 from .history_tree_model import HistoryTreeItem, HistoryTreeModel
 from .history_tree_model import HistoryTreeItemDelegate
@@ -38,13 +39,15 @@ class HistoryWidget(QtWidgets.QWidget):
         self.dieName.textChanged.connect(self.changeSessionNameManually)
 
         self.historyView = QtWidgets.QTreeView()
-        self.historyView.setModel(HistoryTreeModel(title='Device History', parent=self))
+        self.historyView.setModel(HistoryTreeModel(title='Device History',
+            fetcher=self._fetchTopLevel, parent=self))
         self.historyView.setItemDelegate(HistoryTreeItemDelegate(self.historyView.model(), self))
         self.historyView.clicked.connect(self._onClicked)
         self.historyView.doubleClicked.connect(self._displayResults)
 
         functions.historyTreeAntenna.updateTree.connect(self._updateTree)
         functions.historyTreeAntenna.updateTree_batch.connect(self._updateTree_batch)
+        functions.historyTreeAntenna.updateTree_rows.connect(self._updateTree_rows)
         functions.historyTreeAntenna.rebuildTreeTopLevel.connect(self._rebuildTopLevel)
         functions.historyTreeAntenna.clearTree.connect(self._clearTree)
         functions.historyTreeAntenna.changeSessionName.connect(self.changeSessionName)
@@ -58,7 +61,12 @@ class HistoryWidget(QtWidgets.QWidget):
         mainLayout.setSpacing(0)
         mainLayout.setContentsMargins(0,0,0,0)
 
-        self.resultWindow = []
+        # result windows and the prepared data behind them, keyed by
+        # (w, b, start, end, tag)
+        self.resultWindows = {}
+        self.results = ResultCache(parent=self)
+        self.results.ready.connect(self._showResults)
+
         self.setLayout(mainLayout)
 
     def changeSessionNameManually(self, txt):
@@ -69,13 +77,37 @@ class HistoryWidget(QtWidgets.QWidget):
 
     def _clearTree(self):
         self.historyView.model().clear()
+        self._invalidateResults()
+
+    def _invalidateResults(self, w=None, b=None):
+        # forget results (and their windows) of device (w, b) or of all
+        # devices if no device is given
+        self.results.invalidate(w, b)
+        for key in [k for k in self.resultWindows if w is None or k[:2] == (w, b)]:
+            del self.resultWindows[key]
 
     def _updateTree_batch(self, w, b, idx):
         # Update tree for a specific word/bit starting
         # from idx down to the latest item in the
         # device history
-        for i in range(idx, len(CB.history[w][b])):
-            self._updateTree(w, b, i)
+        self._updateTree_rows(w, b, CB.history[w][b].blocks(idx).end)
+
+    def _updateTree_rows(self, w, b, rows):
+        # Update tree for a specific word/bit using only the
+        # specified history rows; these are typically the rows
+        # that mark a read, a pulse or the end of a module block
+        if len(rows) == 0:
+            return
+
+        # nothing to do for rows of a device that has not been expanded
+        # yet other than making sure it's there
+        toplevel = self.historyView.model().findTopLevel(w, b)
+        if toplevel is None or toplevel.internalPointer().fetched is None:
+            self._updateTree(w, b, int(rows[-1]))
+            return
+
+        for i in rows:
+            self._updateTree(w, b, int(i))
 
     def _updateTree(self, w, b, historyIdx=-1):
         # historyIdx is used if we want to update the tree
@@ -84,48 +116,78 @@ class HistoryWidget(QtWidgets.QWidget):
         # which is typically an 'S R' tag, a 'P' tag or a regular
         # 'XXX_e' tag.
 
-        existingItem = self.historyView.model().findTopLevel(w, b)
+        model = self.historyView.model()
 
-        if existingItem is None:
+        if model.findTopLevel(w, b) is None:
             # new (W|B) combination
             # add it to the root of the tree
-            toplevel = HistoryTreeItem(w=w, b=b)
-            idx = self.historyView.model().appendTopLevel(toplevel)
-        else:
-            # otherwise we will append stuff to the existing node
-            # returned from `findTopLevel`
-            toplevel = existingItem.internalPointer()
-            idx = existingItem
+            model.appendTopLevel(HistoryTreeItem(w=w, b=b))
+
+        # make it the active entry; this also returns the node we
+        # will be appending stuff to
+        idx = model.activate(w, b)
+        toplevel = idx.internalPointer()
+
+        # children of devices that have not been expanded yet are only
+        # created when the tree asks for them (see `_fetchTopLevel`)
+        if toplevel.fetched is None:
+            return
 
-        self._deunderline()
-        toplevel.setActive(True)
+        if historyIdx < 0:
+            historyIdx += len(CB.history[w][b])
+
+        # this row is already accounted for; that happens if the device
+        # was expanded after the row was added but before we got here
+        if historyIdx < toplevel.fetched:
+            return
+        toplevel.setFetched(historyIdx + 1)
 
         item = self.createItem(w, b, historyIdx)
+        if item is None:
+            return
 
         if toplevel.childCount() > 0:
             previousItem = toplevel.children[-1]
         else:
             previousItem = None
 
-        # if the new item is read or pulse
-        if item.description in ['Read', 'Pulse']:
-            # and so is the previous item on the list
-            if previousItem and previousItem.description.startswith(item.description):
-                # just increase the counter of the previous one
-                # no need to add a new item
-                parts = previousItem.description.split(' × ')
-                num = int(parts[-1]) + 1
-                # change the description of the last child of toplevel
-                self.historyView.model().setItemDescription(len(toplevel.children)-1,
-                    '%s × %d' % (parts[0], num), idx)
-
-                # exit early
-                return
+        if self._continuesRun(previousItem, item):
+            # just increase the counter of the last child of toplevel
+            # no need to add a new item
+            model.extendRun(len(toplevel.children)-1, historyIdx, idx)
+            return
+
+        model.appendChild(item, idx)
+
+    def _fetchTopLevel(self, toplevel):
+        # Create all the children of a toplevel entry from the block
+        # index of its history; this is called by the model when the
+        # entry is expanded for the first time
+        (w, b) = toplevel.coords
+        history = CB.history[w][b]
+        blocks = history.blocks()
+
+        children = []
+        for (start, end, code) in zip(blocks.start.tolist(),
+                blocks.end.tolist(), blocks.tagcode.tolist()):
+            item = self._blockItem(w, b, start, end, code)
+            if item is None:
+                continue
+
+            previousItem = children[-1] if len(children) > 0 else None
+            if self._continuesRun(previousItem, item):
+                previousItem.extendRun(end)
             else:
-                # add it as x 1
-                item.setDescription('%s × 1' % item.description)
+                children.append(item)
+
+        return (children, len(history))
 
-        insertedIdx = self.historyView.model().appendChild(item, idx)
+    def _continuesRun(self, previousItem, item):
+        # Consecutive reads or pulses are shown as a single entry with a
+        # counter; check if `item` is the next one of such a run ending
+        # with `previousItem`
+        return previousItem is not None and item.count is not None and \
+            previousItem.count is not None and previousItem.tag == item.tag
 
     def _displayResults(self, idx):
         item = idx.internalPointer()
@@ -134,18 +196,41 @@ class HistoryWidget(QtWidgets.QWidget):
         (start, end) = item.range
         tag = item.tag
 
-        raw = CB.history[w][b][start:end+1]
+        if tag not in APP.modules.keys():
+            return
 
-        if tag in APP.modules.keys():
-            cb = APP.modules[tag].callback
+        mod = APP.modules[tag]
+        if mod.callback is None:
+            return
 
-            if cb is None:
-                return
+        key = (w, b, start, end, tag)
 
-            widget = cb(w, b, raw, self)
-            self.resultWindow.append(widget)
+        # these results have been opened before; just bring them up
+        widget = self.resultWindows.get(key, None)
+        if widget is not None:
             widget.show()
-            widget.update()
+            widget.raise_()
+            widget.activateWindow()
+            return
+
+        raw = CB.history[w][b][start:end+1]
+
+        if mod.prepare is None:
+            self._showResults(key, raw)
+            return
+
+        # prepared in the background; `_showResults` is called when ready
+        # unless they are already cached
+        result = self.results.request(key, mod.prepare, w, b, raw)
+        if result is not None:
+            self._showResults(key, result)
+
+    def _showResults(self, key, data):
+        (w, b, start, end, tag) = key
+        widget = APP.modules[tag].callback(w, b, data, self)
+        self.resultWindows[key] = widget
+        widget.show()
+        widget.update()
 
     def _changeDisplayToSelectedItem(self, idx):
         model = self.historyView.model()
@@ -157,28 +242,14 @@ class HistoryWidget(QtWidgets.QWidget):
         item = idx.internalPointer()
         (w, b) = item.coords
 
-        # and check if there's a top level with those coords
-        toplevel = self.historyView.model().findTopLevel(w, b)
-
-        # something is wrong; there's nowhere to append
-        # this should only happen when a device with no
-        # active measurements has been selected in the crossbar
-        if toplevel is None:
-            return
-
-        # change the active entry to the one matching W, B
-        self._deunderline()
-        self.historyView.model().setActiveIdx(toplevel, True)
+        # change the active entry to the one matching W, B, if there's a
+        # top level with those coords; if not this should only happen when
+        # a device with no active measurements has been selected in the
+        # crossbar
+        model.activate(w, b)
 
     def _switchTopLevel(self, w, b):
-        model = self.historyView.model()
-        toplevel = self.historyView.model().findTopLevel(w, b)
-
-        if toplevel is None:
-            return
-
-        self._deunderline()
-        self.historyView.model().setActiveIdx(toplevel, True)
+        self.historyView.model().activate(w, b)
 
     def _onClicked(self, idx):
         self._changeDisplayToSelectedItem(idx)
@@ -186,144 +257,75 @@ class HistoryWidget(QtWidgets.QWidget):
         functions.cbAntenna.selectDeviceSignal.emit(w, b)
         functions.displayUpdate.updateSignal_short.emit()
 
-    def _deunderline(self):
-        # deactivate all top-level children
-        for (i, child) in enumerate(self.historyView.model().children()):
-            self.historyView.model().setActive(i, False)
-
     def _rebuildTopLevel(self, w, b):
         # force rebuild of a toplevel entry
         # this may be required when a toplevel entry has corrupted data
-        # and indices need to be updated to salvage as much as possible
+        # and indices need to be updated to salvage as much as possible;
+        # it is also how entries are created when a session is loaded
         model = self.historyView.model()
+        self._invalidateResults(w, b)
 
-        # first clear this toplevel
-        model.clearTopLevel(w, b)
+        if len(CB.history[w][b]) == 0:
+            return
 
-        # traverse the current history
-        for (counter, row) in enumerate(CB.history[w][b]):
-            tag = row[3]
+        # first clear this toplevel; its children will be fetched again
+        # from the history once needed
+        if model.findTopLevel(w, b) is None:
+            model.appendTopLevel(HistoryTreeItem(w=w, b=b))
+        else:
+            model.clearTopLevel(w, b)
 
-            # and re-add data
-            if 'S R' in tag or tag.endswith('_e') or tag == 'P':
-                self._updateTree(w, b, counter)
+        # bring it back right away if it's expanded
+        idx = model.activate(w, b)
+        if self.historyView.isExpanded(idx):
+            model.fetchMore(idx)
 
     def createItem(self, w, b, historyIdx=-1):
 
-        item = HistoryTreeItem()
-        item.setCoords(w, b)
-
-        # get the (full) tag of the last item in history
-        # for instance RET_xxx_i
-        tag = CB.history[w][b][historyIdx][3]
-        # and that's the module tag, for instance RET
-        modTag = None
-
-        # try to split the tag
-        # TAG_xxx_s -> ['TAG', 'xxx', 's']
-        tagParts = tag.split("_")
-
-        # so this is the actual tag to look for in APP.modules.
-        # if there are no "_" in the tag then this is probably
-        # a read or pulse tag ("P", "S R..." or "F R...")
-        if len(tagParts) == 1:
-            # pulse tags are always 'P' but read tags can be
-            # either of 'S R2 V=X.Y' or 'S R V=X.Y' so take
-            # AT MOST the first 3 characters of the tag
-            # P -> P
-            # S R2 V=X.Y -> S R
-            # etc.
-            # The read module is tagged with 'S R' so that way
-            # we always get the correct one.
-            # I know this is ugly but there is technical
-            # baggage that come with this behaviour so if we
-            # change that, people's log files will break
-            modTag = tag[:3]
-            standardTag = False
-        else:
-            # in this case the tag looks like TAG_xxxx_{s, i, e}
-            # so get the first part ('TAG'). This is the
-            # standard behaviour.
-            modTag = tagParts[0]
-            standardTag = True
+        history = CB.history[w][b]
+
+        # the entry is the block that ends at historyIdx, typically the
+        # last item in history (because, well..., it just ended!)
+        end = historyIdx if historyIdx >= 0 else len(history) + historyIdx
+        blocks = history.blocks(end)
+
+        if len(blocks.end) == 0 or blocks.end[0] != end:
+            # this will happen when there is no proper start tag,
+            # essentially if a module produced only one value (the '_e'
+            # one). In that case there really isn't anything we can do
+            # with it so just skip the entry altogether
+            if history.tagTable.updatesTree(history.tagCode(end)):
+                print('Could not find start/end indices when traversing the history tree for',
+                    history.tagInfo(end).module)
+            return None
+
+        return self._blockItem(w, b, int(blocks.start[0]), end,
+            int(blocks.tagcode[0]))
+
+    def _blockItem(self, w, b, start, end, code):
+
+        # get the parsed tag of the block, for instance
+        # RET_xxx_e -> ('RET', 'e', 'xxx'); the module tag (RET) is
+        # what we need to look for in APP.modules. Read or pulse tags
+        # ("P", "S R..." or "F R...") have the first 3 characters of the
+        # tag as their module tag so that way we always get the correct one.
+        modTag = CB.history[w][b].tagTable.info(code).module
 
         # check out if there's a module registered with the
         # tag. If not return None
         mod = APP.modules.get(modTag, None)
 
+        # no such module, don't know what to do with it
+        # ignore
+        if not mod:
+            return None
+
         # if there is a mod; great! put its name on the tree
         # item's description
-        if mod:
-            item.setDescription(mod.display)
-        else:
-            # no such module, don't know what to do with it
-            # ignore
-            return
+        item = HistoryTreeItem(w, b, start, end, mod.display, modTag)
 
-        # get the start and end of the operation for non read/pulse actions
-        start = 0
-        end = 0
-
-        if standardTag:
-            # the end of the range is always the last entry (because, well...,
-            # it just ended!)
-            end = len(CB.history[w][b]) - 1
-
-            try:
-                lastIndex = None
-                traverse = True
-
-                # check first if we have stored the index of the tag
-                # in the crossbar history data structure
-                # [W][B][
-                #   [.....],
-                #   [.....],
-                #   [R, V, PW, tag, readopt, Vread, startidx] <- last item for this (W,B)
-                #                                     ^^^^
-                #                         check if this is > 0
-                # ]
-                # for any non read/pulse tags (what we call standard tags) the last item on
-                # the list should be an _e tag which typically saves this start index value.
-                if CB.history[w][b][historyIdx][-1] > 0:
-                    # great the start index of the block is stored
-                    # this is our start, no need to traverse the tree backwards
-                    start = CB.history[w][b][historyIdx][-1] + 1
-                    traverse = False
-
-                # traverse the entries in reverse (-1) to find the ranges
-                # if for some reason the start index was not saved in the end
-                # tag then resort to traverse the history backwards to find
-                # the start tag; these shouldn't be triggered really
-                if traverse:
-                    for (i, row) in enumerate(CB.history[w][b][::-1]):
-
-                        # and extract the tag from the history entry
-                        # [Resistance, Voltage, PulseWidth, tag, read opt., Vread, startidx]
-                        #                                   ^^^
-                        #                                this one
-                        tag = row[3]
-                        # if this matches the current modTag and it's a start tag (_s)
-                        # we found the start! stop traversing.
-                        # we are using `startswith` rather than equality because
-                        # tags might have multiple parts, such as MSS1, MSS2, MSS3
-                        if tag.startswith(modTag) and tag.endswith('_s'):
-                            lastIndex = i
-                            break
-
-                    # this will happen when there is no proper start tag, essentially
-                    # if a module produced only one value (the '_e' one). In that case
-                    # there really isn't anything we can do with it so just skip the
-                    # entry altogether
-                    if lastIndex is None:
-                        print('Could not find start/end indices when traversing the history tree for',
-                            modTag)
-                        return
-                    start = end - lastIndex
-            except ValueError:
-                pass
-
-        # adjust tree item's ranges and tag
-        item.setRange(start, end)
-        item.setTag(modTag)
+        # reads and pulses (tags without a phase) start a run of one
+        if CB.history[w][b].tagTable.info(code).phase is None:
+            item.setCount(1)
 
         return item
@@ -57,7 +57,7 @@ class _ReadAllWorker(QtCore.QObject):
             devices = all_devices
             # perform standard read All
             for (word, bit) in devices:
-                Mnow=float(HW.ArC.read_floats(1))
+                Mnow=float(HW.ArC.read_floats(1)[0])
 
                 self.sendData.emit(word,bit,Mnow,self.Vread,0,self.tag)
                 self.sendPosition.emit(word,bit)
@@ -74,7 +74,7 @@ class _ReadAllWorker(QtCore.QObject):
                 HW.ArC.write_b(str(word)+"\n")
                 HW.ArC.write_b(str(bit)+"\n")
 
-                Mnow = float(HW.ArC.read_floats(1))
+                Mnow = float(HW.ArC.read_floats(1)[0])
 
                 self.sendData.emit(word,bit,Mnow,self.Vread,0,self.tag)
                 self.sendPosition.emit(word,bit)
@@ -14,6 +14,7 @@ import json
 from PyQt5 import QtGui, QtCore, QtWidgets
 
 from .. import ProgPanels
+from ..modutils import BaseProgPanel
 from ..Globals import styles
 
 from .. import state
@@ -178,6 +179,15 @@ class ProgPanelWidget(QtWidgets.QWidget):
         for child in range(self.tabFrame.count()):
             self.tabFrame.widget(child).setEnabled(state)
 
+    def stop(self):
+        """
+        Abort the operations of all panels, see `BaseProgPanel.stop`.
+        """
+        for child in range(self.tabFrame.count()):
+            wdg = self.tabFrame.widget(child)
+            if isinstance(wdg, BaseProgPanel):
+                wdg.stop()
+
     def removePanel(self):
         self.tabFrame.removeTab(self.tabFrame.currentIndex())
 
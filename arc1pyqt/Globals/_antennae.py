@@ -50,6 +50,8 @@ class HistoryTreeAntenna(QObject):
     # used for signaling the device history tree list to update its contents
     updateTree=pyqtSignal(int,int)
     updateTree_batch = pyqtSignal(int, int, int)
+    # update tree for a specific word/bit from an array of history rows
+    updateTree_rows = pyqtSignal(int, int, object)
     clearTree=pyqtSignal()
     changeSessionName=pyqtSignal()
     rebuildTreeTopLevel = pyqtSignal(int, int)
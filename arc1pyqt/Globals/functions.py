@@ -27,8 +27,10 @@ addressAntenna = AddressAntenna()
 
 
 from .. import state
+from ..history import tagTable
 HW = state.hardware
 CB = state.crossbar
+APP = state.app
 
 
 # Update history function
@@ -42,12 +44,69 @@ def updateHistory(w, b, m, a, pw, tag, Vread=None):
         res = m
 
     CB.append(w, b, res, a, pw, tag, readTag, Vread)
+    if APP.journal is not None:
+        APP.journal.record(w, b, res, a, pw, tag, readTag, Vread)
 
     CB.word = w
     CB.bit = b
     cbAntenna.recolor.emit(m,w,b)
 
 
+def updateHistoryBlock(w, b, m, a, pw, tag, Vread=None):
+    """
+    Block version of `updateHistory`. All arguments can be either scalars,
+    shared by all the measurements of the block, or sequences of the same
+    length. History is extended in bulk, one run of consecutive
+    measurements on the same device at a time, and every device is
+    recoloured once.
+    """
+    m = np.atleast_1d(np.asarray(m, dtype=np.float64))
+    n = len(m)
+    if n == 0:
+        return
+
+    def column(values, dtype):
+        return np.broadcast_to(np.asarray(values, dtype=dtype), (n,))
+
+    w = column(w, np.int64)
+    b = column(b, np.int64)
+    a = column(a, np.float64)
+    pw = column(pw, np.float64)
+    if Vread is None:
+        Vread = HW.conf.Vread
+    Vread = column(Vread, np.float64)
+    if isinstance(tag, str):
+        tag = [tag] * n
+    tagCodes = tagTable.codeArray(tag)
+    readTag = 'R'+str(HW.conf.readmode)
+    readTagCodes = np.full(n, tagTable.code(readTag), dtype=np.int32)
+    if HW.conf.sessionmode == 1:
+        res = m/2
+    else:
+        res = m
+
+    # split into runs of consecutive measurements on the same device
+    key = w * 65536 + b
+    bounds = np.concatenate(([0], np.flatnonzero(key[1:] != key[:-1]) + 1, [n]))
+    last = {}
+    for (start, end) in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        (dw, db) = (int(w[start]), int(b[start]))
+        CB.extendCodes(dw, db, res[start:end], a[start:end], pw[start:end],
+            tagCodes[start:end], readTagCodes[start:end], Vread[start:end],
+            notify=True)
+        last[(dw, db)] = float(m[end-1])
+
+    if APP.journal is not None:
+        APP.journal.recordBlock(zip(w.tolist(), b.tolist(), res.tolist(),
+            a.tolist(), pw.tolist(), [str(t) for t in tag],
+            [readTag] * n, Vread.tolist()))
+
+    CB.word = int(w[-1])
+    CB.bit = int(b[-1])
+    for ((dw, db), lastm) in last.items():
+        cbAntenna.recolor.emit(lastm, dw, db)
+
+
 def writeDelimitedData(data, dest, delimiter="\t"):
     try:
         f = open(dest, 'w')
@@ -10,7 +10,6 @@
 from PyQt5 import QtGui, QtCore, QtWidgets
 import sys
 import os
-import time
 import pyqtgraph as pg
 import numpy as np
 import queue
@@ -484,30 +483,27 @@ class CT_LIVE(QtWidgets.QWidget):
     def resizeWidget(self,event):
         pass
 
-    def sendParams(self, totalCycles):
-        HW.ArC.write_b(str(self.v_pmax)+"\n")
-        HW.ArC.write_b(str(self.v_nmax)+"\n")
-        HW.ArC.write_b(str(self.v_start)+"\n")
-        HW.ArC.write_b(str(self.v_step)+"\n")
-        HW.ArC.write_b(str((float(self.pw-2)/1000))+"\n")
-        HW.ArC.write_b(str(float(self.interpulse/1000))+"\n")
-        time.sleep(0.01)
-        HW.ArC.write_b(str((self.c_p)/1000000)+"\n")
-        HW.ArC.write_b(str((self.c_n)/-1000000)+"\n")
-
-        HW.ArC.write_b(str(totalCycles)+"\n")
-        HW.ArC.write_b(str(int(self.combo_IVtype.currentIndex()))+"\n")
-        HW.ArC.write_b(str(int(self.combo_IVoption.currentIndex()))+"\n")
-        HW.ArC.write_b(str(int(self.returnCheck))+"\n")
+    def sendParams(self, job, totalCycles):
+        HW.ArC.command(job,
+            self.v_pmax,
+            self.v_nmax,
+            self.v_start,
+            self.v_step,
+            float(self.pw-2)/1000,
+            float(self.interpulse/1000),
+            (self.c_p)/1000000,
+            (self.c_n)/-1000000,
+            totalCycles,
+            int(self.combo_IVtype.currentIndex()),
+            int(self.combo_IVoption.currentIndex()),
+            int(self.returnCheck))
 
     def programOne(self, totalCycles):
         if (HW.ArC.port is not None) and (self.thread is None):
             self.wi = CB.word
             self.bi = CB.bit
             job="201"
-            HW.ArC.write_b(job+"\n")
-
-            self.sendParams(totalCycles)
+            self.sendParams(job, totalCycles)
 
             self.thread = QtCore.QThread()
             self.threadWrapper = ThreadWrapper([[CB.word,CB.bit]], totalCycles)
@@ -568,15 +564,17 @@ class CT_LIVE(QtWidgets.QWidget):
                 M=V[i]/C[i]
                 CB.append(w, b, abs(V[i]/C[i]), V[i], 0, tag+"_"+str(cycle), readTag, V[i])
 
+        history = CB.history[w][b]
+
         if firstPoint > 0:
-            CB.history[w][b][firstPoint-1][3]="CT_s"
+            history.setTag(firstPoint-1, "CT_s")
         else:
-            CB.history[w][b][0][3]="CT_s"
+            history.setTag(0, "CT_s")
 
-        CB.history[w][b][-1][3]="CT_e"
+        history.setTag(-1, "CT_e")
 
         # set the point where this starts
-        CB.history[w][b][-1][-1]=firstPoint-1
+        history.setStartIndex(-1, firstPoint-1)
         functions.historyTreeAntenna.updateTree.emit(self.wi, self.bi)
 
     def record_data(self, w,b, M, A, pw, tag):
@@ -79,16 +79,15 @@ class ThreadWrapper(BaseThreadWrapper):
     def sendParams(self):
         """ Transfer the parameters to ArC ONE """
 
-        self.log("Initiating ChronoAmperometry (job 220)")
-        HW.ArC.write_b(str(220) + "\n")
-
         p = self.params # shorthand; `self.params` is too long!
 
+        self.log("Initiating ChronoAmperometry (job 220)")
         self.log("Sending ChronoAmperometry params:", p)
-        HW.ArC.write_b("%.3e\n" % p["bias"])
-        HW.ArC.write_b("%.3e\n" % p["pw"])
-        HW.ArC.write_b("%d\n" % p["num_reads"])
-        HW.ArC.write_b(str(len(self.deviceList)) + "\n")
+        HW.ArC.command(220,
+            "%.3e" % p["bias"],
+            "%.3e" % p["pw"],
+            "%d" % p["num_reads"],
+            len(self.deviceList))
         self.log("Parameters written")
 
     @BaseThreadWrapper.runner
@@ -98,26 +98,20 @@ class ThreadWrapper(BaseThreadWrapper):
     def sendParams(self):
         """ Transfer the parameters to ArC ONE """
 
-        self.log("Initiating ConvergeToState (job 21)")
-        HW.ArC.write_b(str(21) + "\n") # job number, converge to state
-
         p = self.params # shorthand; `self.params` is too long!
 
+        self.log("Initiating ConvergeToState (job 21)")
         self.log("Sending ConvergeToState params")
-        HW.ArC.write_b("%.3e\n" % p["vmin"])
-        HW.ArC.write_b("%.3e\n" % p["vstep"])
-        HW.ArC.write_b("%.3e\n" % p["vmax"])
-        HW.ArC.write_b("%.3e\n" % p["pwmin"])
-        HW.ArC.write_b("%.3e\n" % p["pwstep"])
-        HW.ArC.write_b("%.3e\n" % p["pwmax"])
-        HW.ArC.write_b("%.3e\n" % p["interpulse"])
-        HW.ArC.write_b("%.3e\n" % p["res_target"])
-        HW.ArC.write_b("%.3e\n" % p["res_target_tolerance"])
-        HW.ArC.write_b("%.3e\n" % p["res_initial_tolerance"])
-
-        HW.ArC.write_b("%d\n" % p["pulses"])
-        HW.ArC.write_b("%d\n" % p["init_pol"])
-        HW.ArC.write_b(str(len(self.deviceList)) + "\n")
+        floats = ["vmin", "vstep", "vmax", "pwmin", "pwstep", "pwmax",
+            "interpulse", "res_target", "res_target_tolerance",
+            "res_initial_tolerance"]
+
+        # job number, converge to state
+        HW.ArC.command(21,
+            *["%.3e" % p[k] for k in floats],
+            "%d" % p["pulses"],
+            "%d" % p["init_pol"],
+            len(self.deviceList))
 
     @BaseThreadWrapper.runner
     def run(self):
@@ -10,7 +10,6 @@
 from PyQt5 import QtGui, QtCore, QtWidgets
 import sys
 import os
-import time
 import importlib
 
 import pyqtgraph as pg
@@ -109,17 +108,16 @@ class ThreadWrapper(BaseThreadWrapper):
                     valuesNew=HW.ArC.read_floats(3)
 
                     if (float(valuesNew[0])!=0 or float(valuesNew[1])!=0 or float(valuesNew[2])!=0):
-                        self.sendData.emit(w,b,valuesOld[0],valuesOld[1],valuesOld[2],tag_,valuesOld[1])
-                        self.displayData.emit()
+                        self.queueData(w,b,valuesOld[0],valuesOld[1],valuesOld[2],tag_,valuesOld[1])
                         tag_=tag+'_i_'+str(cycle)
                     else:
                         if (cycle==self.totalCycles):
                             tag_=tag+'_e'
                         else:
                             tag_=tag+'_i_'+str(cycle)
-                        self.sendData.emit(w,b,valuesOld[0],valuesOld[1],valuesOld[2],tag_,valuesOld[1])
-                        self.displayData.emit()
+                        self.queueData(w,b,valuesOld[0],valuesOld[1],valuesOld[2],tag_,valuesOld[1])
                         endCommand=1
+            self.flushData()
             self.updateTree.emit(w,b)
 
 
@@ -362,14 +360,7 @@ class CurveTracer(BaseProgPanel):
     def resizeWidget(self,event):
         pass
 
-    def sendParams(self):
-        HW.ArC.write_b(str(float(self.leftEdits[0].text()))+"\n")
-        HW.ArC.write_b(str(float(self.leftEdits[1].text()))+"\n")
-        HW.ArC.write_b(str(float(self.leftEdits[3].text()))+"\n")
-        HW.ArC.write_b(str(float(self.leftEdits[2].text()))+"\n")
-        HW.ArC.write_b(str((float(self.leftEdits[4].text())-2)/1000)+"\n")
-        HW.ArC.write_b(str(float(self.rightEdits[1].text())/1000)+"\n")
-        time.sleep(0.01)
+    def sendParams(self, job):
         CSp=float(self.rightEdits[2].text())
         CSn=float(self.rightEdits[3].text())
 
@@ -378,14 +369,19 @@ class CurveTracer(BaseProgPanel):
         if CSn==10.0:
             CSn=10.1
 
-
-        HW.ArC.write_b(str(CSp/1000000)+"\n")
-        HW.ArC.write_b(str(CSn/-1000000)+"\n")
-
-        HW.ArC.write_b(str(int(self.rightEdits[0].text()))+"\n")
-        HW.ArC.write_b(str(int(self.combo_IVtype.currentIndex()))+"\n")
-        HW.ArC.write_b(str(int(self.combo_IVoption.currentIndex()))+"\n")
-        HW.ArC.write_b(str(int(self.returnCheck))+"\n")
+        HW.ArC.command(job,
+            float(self.leftEdits[0].text()),
+            float(self.leftEdits[1].text()),
+            float(self.leftEdits[3].text()),
+            float(self.leftEdits[2].text()),
+            (float(self.leftEdits[4].text())-2)/1000,
+            float(self.rightEdits[1].text())/1000,
+            CSp/1000000,
+            CSn/-1000000,
+            int(self.rightEdits[0].text()),
+            int(self.combo_IVtype.currentIndex()),
+            int(self.combo_IVoption.currentIndex()),
+            int(self.returnCheck))
 
     def programOne(self):
         self.programDevs([[CB.word, CB.bit]])
@@ -402,9 +398,8 @@ class CurveTracer(BaseProgPanel):
         totalCycles = int(self.rightEdits[0].text())
 
         job="201"
-        HW.ArC.write_b(job+"\n")   # sends the job
+        self.sendParams(job)
 
-        self.sendParams()
         wrapper = ThreadWrapper(devs, totalCycles)
         self.execute(wrapper, wrapper.run)
 
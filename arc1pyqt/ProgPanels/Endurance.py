@@ -46,30 +46,8 @@ class ThreadWrapper(BaseThreadWrapper):
 
             HW.ArC.queue_select(w, b)
 
-            firstPoint=1
-            endCommand=0
-
-            valuesNew=HW.ArC.read_floats(3)
-
-            if (float(valuesNew[0])!=0 or float(valuesNew[1])!=0 or float(valuesNew[2])!=0):
-                tag_=tag+'_s'
-            else:
-                endCommand=1
-
-            while(endCommand==0):
-                valuesOld=valuesNew
-
-                valuesNew=HW.ArC.read_floats(3)
-
-                if (float(valuesNew[0])!=0 or float(valuesNew[1])!=0 or float(valuesNew[2])!=0):
-                    self.sendData.emit(w,b,valuesOld[0],valuesOld[1],valuesOld[2],tag_)
-                    self.displayData.emit()
-                    tag_=tag+'_i'
-                else:
-                    tag_=tag+'_e'
-                    self.sendData.emit(w,b,valuesOld[0],valuesOld[1],valuesOld[2],tag_)
-                    self.displayData.emit()
-                    endCommand=1
+            self.queueRecords(w, b, HW.ArC.records(3), tag)
+            self.flushData()
             self.updateTree.emit(w,b)
 
 
@@ -259,28 +237,28 @@ class Endurance(BaseProgPanel):
             self.vW.setFixedWidth(event.size().width()-object.verticalScrollBar().width())
         return False
 
-    def sendParams(self):
-        # positive amplitude
-        HW.ArC.write_b(str(float(self.leftEdits[0].text()))+"\n")
-        # positive pw
-        HW.ArC.write_b(str(float(self.leftEdits[1].text())/1000000)+"\n")
-        # positive cut-off
-        HW.ArC.write_b(str(float(self.leftEdits[2].text())/1000000)+"\n")
-        # negative amplitude
-        HW.ArC.write_b(str(float(self.rightEdits[0].text())*-1)+"\n")
-        # negative pw
-        HW.ArC.write_b(str(float(self.rightEdits[1].text())/1000000)+"\n")
-        # negative cut-off
-        HW.ArC.write_b(str(float(self.rightEdits[2].text())/1000000)+"\n")
-        # interpulse
-        HW.ArC.write_b(str(float(self.leftEdits[5].text()))+"\n")
-
-        # positive number of pulses
-        HW.ArC.write_b(str(int(self.leftEdits[3].text()))+"\n")
-        # negative number of pulses
-        HW.ArC.write_b(str(int(self.rightEdits[3].text()))+"\n")
-        # cycles
-        HW.ArC.write_b(str(int(self.leftEdits[4].text()))+"\n")
+    def sendParams(self, job):
+        HW.ArC.command(job,
+            # positive amplitude
+            float(self.leftEdits[0].text()),
+            # positive pw
+            float(self.leftEdits[1].text())/1000000,
+            # positive cut-off
+            float(self.leftEdits[2].text())/1000000,
+            # negative amplitude
+            float(self.rightEdits[0].text())*-1,
+            # negative pw
+            float(self.rightEdits[1].text())/1000000,
+            # negative cut-off
+            float(self.rightEdits[2].text())/1000000,
+            # interpulse
+            float(self.leftEdits[5].text()),
+            # positive number of pulses
+            int(self.leftEdits[3].text()),
+            # negative number of pulses
+            int(self.rightEdits[3].text()),
+            # cycles
+            int(self.leftEdits[4].text()))
 
     def programOne(self):
         self.programDevs([[CB.word, CB.bit]])
@@ -296,8 +274,7 @@ class Endurance(BaseProgPanel):
     def programDevs(self, devs):
 
         job="191"
-        HW.ArC.write_b(job+"\n")
-        self.sendParams()
+        self.sendParams(job)
 
         wrapper = ThreadWrapper(devs)
         self.execute(wrapper, wrapper.run)
@@ -308,6 +285,11 @@ class Endurance(BaseProgPanel):
         else:
             self.hboxProg.setEnabled(True)
 
+    @staticmethod
+    def prepare(w, b, data):
+        # resistance and voltage of every pulse
+        return (np.array(data.resistance), np.array(data.amplitude))
+
     @staticmethod
     def display(w, b, data, parent=None):
         dialog = QtWidgets.QDialog(parent)
@@ -315,12 +297,8 @@ class Endurance(BaseProgPanel):
         containerLayout = QtWidgets.QVBoxLayout()
         dialog.setWindowTitle("Endurance W=%d | B=%d" % (w, b))
 
-        R = np.empty(len(data))
-        V = np.empty(len(data))
-        Z = np.zeros(len(data)) # zeroaxis
-        for (i, line) in enumerate(data):
-            R[i] = line[0]
-            V[i] = line[1]
+        (R, V) = data
+        Z = np.zeros(len(R)) # zeroaxis
 
         Vidx = np.repeat(np.arange(0, len(R)), 2)
 
@@ -363,4 +341,4 @@ class Endurance(BaseProgPanel):
         return dialog
 
 
-tags = { 'top': ModTag(tag, "Endurance", Endurance.display) }
+tags = { 'top': ModTag(tag, "Endurance", Endurance.display, Endurance.prepare) }
@@ -10,7 +10,6 @@
 from PyQt5 import QtGui, QtCore, QtWidgets
 import sys
 import os
-import time
 import pyqtgraph
 import numpy as np
 from functools import partial
@@ -47,30 +46,8 @@ class ThreadWrapper(BaseThreadWrapper):
 
             HW.ArC.queue_select(w, b)
 
-            firstPoint=1
-            endCommand=0
-
-            valuesNew=HW.ArC.read_floats(3)
-
-            if (float(valuesNew[0])!=0 or float(valuesNew[1])!=0 or float(valuesNew[2])!=0):
-                tag_=tag+'_s'
-            else:
-                endCommand=1
-
-            while(endCommand==0):
-                valuesOld=valuesNew
-
-                valuesNew=HW.ArC.read_floats(3)
-
-                if (float(valuesNew[0])!=0 or float(valuesNew[1])!=0 or float(valuesNew[2])!=0):
-                    self.sendData.emit(w,b,valuesOld[0],valuesOld[1],valuesOld[2],tag_)
-                    self.displayData.emit()
-                    tag_=tag+'_i'
-                else:
-                    tag_=tag+'_e'
-                    self.sendData.emit(w,b,valuesOld[0],valuesOld[1],valuesOld[2],tag_)
-                    self.displayData.emit()
-                    endCommand=1
+            self.queueRecords(w, b, HW.ArC.records(3), tag)
+            self.flushData()
 
             self.updateTree.emit(w,b)
 
@@ -290,51 +267,43 @@ class FormFinder(BaseProgPanel):
         if (self.checkNeg.isChecked()):
             polarity=-1
 
-        HW.ArC.write_b(job+"\n")   # sends the job
-
         pmodeIdx = self.pulsingModeCombo.currentIndex()
         pmode = self.pulsingModeCombo.itemData(pmodeIdx)["mode"]
 
-        HW.ArC.write_b(str(float(self.leftEdits[0].text())*polarity)+"\n")
-        HW.ArC.write_b(str(float(self.leftEdits[1].text())*polarity)+"\n")
-        HW.ArC.write_b(str(float(self.leftEdits[2].text())*polarity)+"\n")
-
-        time.sleep(0.05)
-
-        HW.ArC.write_b(str(float(self.leftEdits[3].text())/1000000)+"\n")
+        params = [float(self.leftEdits[0].text())*polarity,
+            float(self.leftEdits[1].text())*polarity,
+            float(self.leftEdits[2].text())*polarity,
+            float(self.leftEdits[3].text())/1000000]
 
         # Determine the step
         if job != "14": # modal formfinder
             if pmode == 1:
                 # if step is time make it into seconds
-                HW.ArC.write_b(str(float(self.leftEdits[4].text())/1000000)+"\n")
+                params.append(float(self.leftEdits[4].text())/1000000)
             else:
                 # else it is percentage, leave it as is
-                HW.ArC.write_b(str(float(self.leftEdits[4].text()))+"\n")
+                params.append(float(self.leftEdits[4].text()))
         else: # legacy behaviour
-            HW.ArC.write_b(str(float(self.leftEdits[4].text()))+"\n")
+            params.append(float(self.leftEdits[4].text()))
 
-        HW.ArC.write_b(str(float(self.leftEdits[5].text())/1000000)+"\n")
+        params.append(float(self.leftEdits[5].text())/1000000)
+        params.append(float(self.leftEdits[6].text())/1000)
 
-        HW.ArC.write_b(str(float(self.leftEdits[6].text())/1000)+"\n")
-        time.sleep(0.05)
-
-        HW.ArC.write_b(str(float(self.rightEdits[1].text()))+"\n")
-        #HW.ArC.write_b(str(float(self.rightEdits[2].text()))+"\n")
-        time.sleep(0.05)
+        params.append(float(self.rightEdits[1].text()))
         if self.checkRthr.isChecked():
-            HW.ArC.write_b(str(float(self.rightEdits[2].text()))+"\n")
+            params.append(float(self.rightEdits[2].text()))
         else:
-            HW.ArC.write_b(str(float(0))+"\n")
-        time.sleep(0.05)
+            params.append(float(0))
 
         if job != "14": # newer version of formfinder
-            HW.ArC.write_b(str(int(pmode))+"\n")
+            params.append(int(pmode))
 
         pSR = self.rightEdits[3].currentData()
-        HW.ArC.write_b(str(int(pSR))+"\n")
-        HW.ArC.write_b(str(int(self.rightEdits[0].text()))+"\n")
-        time.sleep(0.05)
+        params.append(int(pSR))
+        params.append(int(self.rightEdits[0].text()))
+
+        # the whole job header goes out in one write
+        HW.ArC.command(job, *params)
 
     def programDevs(self, devs):
 
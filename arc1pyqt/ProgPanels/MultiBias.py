@@ -186,16 +186,7 @@ class MultiBias(BaseProgPanel):
         else:
             if HW.ArC is not None:
                 job="50"
-                HW.ArC.write_b(job+"\n")
-
-                self.sendParams()
-
-                HW.ArC.write_b(str(len(wLines))+"\n")
-                HW.ArC.write_b(str(self.edit_blines.value())+"\n")
-                HW.ArC.write_b(str(RW)+"\n")
-
-                for nr in wLines:
-                    HW.ArC.write_b(str(nr)+"\n")
+                self.sendParams(job, wLines, RW)
 
                 wrapper = ThreadWrapper(wLines, \
                         int(self.edit_blines.value()), RW, \
@@ -210,10 +201,15 @@ class MultiBias(BaseProgPanel):
                 wrapper.updateCurrentRead.connect(self.updateCurrentRead)
                 self.execute(wrapper, wrapper.run)
 
-    def sendParams(self):
-        HW.ArC.write_b(str(float(self.leftEdits[0].text()))+"\n")
-        HW.ArC.write_b(str(float(self.leftEdits[1].text())/1000000)+"\n")
-        HW.ArC.write_b(str(float(self.leftEdits[2].text()))+"\n")
+    def sendParams(self, job, wLines, RW):
+        HW.ArC.command(job,
+            float(self.leftEdits[0].text()),
+            float(self.leftEdits[1].text())/1000000,
+            float(self.leftEdits[2].text()),
+            len(wLines),
+            self.edit_blines.value(),
+            RW,
+            *wLines)
 
     def apply_write(self):
         self.apply_multiBias(2)
@@ -41,24 +41,19 @@ class ThreadWrapper(BaseThreadWrapper):
 
         numDevices = int(len(self.deviceList))
 
-        HW.ArC.write_b(str(161) + "\n")
-
         data = self.params
 
-        HW.ArC.write_b(str(data["pulse_duration"])+"\n")
-        HW.ArC.write_b(str(data["vmin"])+"\n")
-        HW.ArC.write_b(str(data["vstep"])+"\n")
-        HW.ArC.write_b(str(data["vmax"])+"\n")
-        HW.ArC.write_b(str(data["interpulse"])+"\n")
-
-        HW.ArC.write_b(str(data["trailer_reads"])+"\n")
-        HW.ArC.write_b(str(data["prog_pulses"])+"\n")
-        HW.ArC.write_b(str(data["tolerance_band"])+"\n")
-        HW.ArC.write_b(str(data["read_write"])+"\n")
-
-        HW.ArC.write_b(str(numDevices)+"\n")
-
-        HW.ArC.queue_select(w, b)
+        HW.ArC.command(161,
+            data["pulse_duration"],
+            data["vmin"],
+            data["vstep"],
+            data["vmax"],
+            data["interpulse"],
+            data["trailer_reads"],
+            data["prog_pulses"],
+            data["tolerance_band"],
+            data["read_write"],
+            numDevices, w, b)
 
     def phase1(self, w, b):
 
@@ -105,8 +100,6 @@ class ThreadWrapper(BaseThreadWrapper):
     def initialisePhase2(self, w, b, sign = 1):
         numDevices = int(len(self.deviceList))
 
-        HW.ArC.write_b(str(162) + "\n")
-
         data = self.params
         stateMode = data["state_mode"]
         if data["single_phase_run"]: # always use the values supplied by user
@@ -114,13 +107,7 @@ class ThreadWrapper(BaseThreadWrapper):
             stateMode = 1
         voltage = float(data["stability_voltage"] * sign * stateMode)
 
-        HW.ArC.write_b(str(voltage) + "\n")
-        HW.ArC.write_b(str(data["stability_pw"]) + "\n")
-
-        HW.ArC.write_b(str(numDevices)+"\n")
-
-        HW.ArC.write_b(str(w)+"\n")
-        HW.ArC.write_b(str(b)+"\n")
+        HW.ArC.command(162, voltage, data["stability_pw"], numDevices, w, b)
 
     def phase2(self, w, b, sign = 1):
 
@@ -199,57 +186,48 @@ class ThreadWrapper(BaseThreadWrapper):
         data = self.params
 
         if str(data["assess_mode"]) == "voltage":
-            HW.ArC.write_b(str(163) + "\n")
-
-            HW.ArC.write_b(str(data["state_reads"]) + "\n")
-            HW.ArC.write_b(str(data["state_prog_pulses"]) + "\n")
-            HW.ArC.write_b(str(data["state_stdev"]) + "\n")
-            HW.ArC.write_b(str(data["state_monotonic"]) + "\n")
-            HW.ArC.write_b(str(data["state_counter_reset"]) + "\n")
-
-            HW.ArC.write_b(str(data["state_pulse_duration"]) + "\n")
-            HW.ArC.write_b(str(-sign * data["state_mode"] * data["state_vmin"]) + "\n")
-            HW.ArC.write_b(str(-sign * data["state_mode"] * data["state_vstep"]) + "\n")
-            HW.ArC.write_b(str(-sign * data["state_vmax"]) + "\n")
-            HW.ArC.write_b(str(data["state_interpulse"]) + "\n")
-            HW.ArC.write_b(str(data["state_retention"]) + "\n")
+            job = 163
+            params = [data["state_reads"],
+                data["state_prog_pulses"],
+                data["state_stdev"],
+                data["state_monotonic"],
+                data["state_counter_reset"],
+                data["state_pulse_duration"],
+                -sign * data["state_mode"] * data["state_vmin"],
+                -sign * data["state_mode"] * data["state_vstep"],
+                -sign * data["state_vmax"],
+                data["state_interpulse"],
+                data["state_retention"]]
         elif str(data["assess_mode"]) == "pulse":
-            HW.ArC.write_b(str(164) + "\n")
-
-            HW.ArC.write_b(str(data["state_reads"]) + "\n")
-            HW.ArC.write_b(str(data["state_prog_pulses"]) + "\n")
-            HW.ArC.write_b(str(data["state_stdev"]) + "\n")
-            HW.ArC.write_b(str(data["state_monotonic"]) + "\n")
-            HW.ArC.write_b(str(data["state_counter_reset"]) + "\n")
-
-            HW.ArC.write_b(str(data["state_pwmin"]) + "\n")
-            HW.ArC.write_b(str(-sign * data["state_mode"] * data["state_voltage"]) + "\n")
-            HW.ArC.write_b(str(data["state_pwstep"]) + "\n")
-            HW.ArC.write_b(str(data["state_pwmax"]) + "\n")
-            HW.ArC.write_b(str(data["state_interpulse"]) + "\n")
-            HW.ArC.write_b(str(data["state_retention"]) + "\n")
+            job = 164
+            params = [data["state_reads"],
+                data["state_prog_pulses"],
+                data["state_stdev"],
+                data["state_monotonic"],
+                data["state_counter_reset"],
+                data["state_pwmin"],
+                -sign * data["state_mode"] * data["state_voltage"],
+                data["state_pwstep"],
+                data["state_pwmax"],
+                data["state_interpulse"],
+                data["state_retention"]]
         elif str(data["assess_mode"]) == "program":
-            HW.ArC.write_b(str(165) + "\n")
-
-            HW.ArC.write_b(str(data["state_reads"]) + "\n")
-            HW.ArC.write_b(str(data["state_prog_pulses_min"]) + "\n")
-            HW.ArC.write_b(str(data["state_prog_pulses_step"]) + "\n")
-            HW.ArC.write_b(str(data["state_prog_pulses_max"]) + "\n")
-            HW.ArC.write_b(str(data["state_stdev"]) + "\n")
-            HW.ArC.write_b(str(data["state_monotonic"]) + "\n")
-            HW.ArC.write_b(str(data["state_counter_reset"]) + "\n")
-
-            HW.ArC.write_b(str(data["state_pulse_duration"]) + "\n")
-            HW.ArC.write_b(str(-sign * data["state_mode"] * data["state_vmin"]) + "\n")
-            HW.ArC.write_b(str(data["state_interpulse"]) + "\n")
-            HW.ArC.write_b(str(data["state_retention"]) + "\n")
+            job = 165
+            params = [data["state_reads"],
+                data["state_prog_pulses_min"],
+                data["state_prog_pulses_step"],
+                data["state_prog_pulses_max"],
+                data["state_stdev"],
+                data["state_monotonic"],
+                data["state_counter_reset"],
+                data["state_pulse_duration"],
+                -sign * data["state_mode"] * data["state_vmin"],
+                data["state_interpulse"],
+                data["state_retention"]]
         else:
             raise Exception("Unknown state assessment mode")
 
-        HW.ArC.write_b(str(numDevices)+"\n")
-
-        HW.ArC.write_b(str(w)+"\n")
-        HW.ArC.write_b(str(b)+"\n")
+        HW.ArC.command(job, *params, numDevices, w, b)
 
     def phase3(self, w, b, sign = 1):
         self.initialisePhase3(w, b, sign)
@@ -552,20 +530,6 @@ class MultiStateSeeker(Ui_MSSParent, BaseProgPanel):
 
         return result
 
-    def sendParams(self):
-        data = self.gatherData()
-
-        HW.ArC.write_b(str(data["pulse_duration"])+"\n")
-        HW.ArC.write_b(str(data["vmin"])+"\n")
-        HW.ArC.write_b(str(data["vstep"])+"\n")
-        HW.ArC.write_b(str(data["vmax"])+"\n")
-        HW.ArC.write_b(str(data["interpulse"])+"\n")
-
-        HW.ArC.write_b(str(data["trailer_reads"])+"\n")
-        HW.ArC.write_b(str(data["prog_pulses"])+"\n")
-        HW.ArC.write_b(str(data["tolerance_band"])+"\n")
-        HW.ArC.write_b(str(data["read_write"])+"\n")
-
     def programOne(self):
         self.programDevs(self.PROGRAM_ONE)
 
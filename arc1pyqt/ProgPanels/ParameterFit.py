@@ -11,7 +11,6 @@ from PyQt5 import QtGui, QtCore, QtWidgets
 from functools import partial
 import sys
 import os
-import time
 import numpy as np
 import scipy.stats as stat
 import scipy.version
@@ -628,24 +627,16 @@ class ThreadWrapper(BaseThreadWrapper):
 
     def curveTracer(self, w, b, vPos, vNeg, vStart, vStep, interpulse, pwstep, ctType, startTag, midTag, endTag):
 
-        HW.ArC.write_b(str(201) + "\n")
-
-        HW.ArC.write_b(str(vPos) + "\n")
-        HW.ArC.write_b(str(vNeg) + "\n")
-        HW.ArC.write_b(str(vStart) + "\n")
-        HW.ArC.write_b(str(vStep) + "\n")
-        HW.ArC.write_b(str(pwstep) + "\n")
-        HW.ArC.write_b(str(interpulse) + "\n")
-        time.sleep(0.01)
-        HW.ArC.write_b(str(0.0) + "\n") # CSp
-        HW.ArC.write_b(str(0.0) + "\n") # CSn
-        HW.ArC.write_b(str(1) + "\n") # single cycle
-        HW.ArC.write_b(str(ctType) + "\n") # staircase or pulsed
-        HW.ArC.write_b(str(0) + "\n") # towards V+ always
-        HW.ArC.write_b(str(0) + "\n") # do not halt+return
-
-        HW.ArC.write_b(str(1) + "\n") # single device always
-        HW.ArC.queue_select(w, b)
+        HW.ArC.command(201,
+            vPos, vNeg, vStart, vStep, pwstep, interpulse,
+            0.0,    # CSp
+            0.0,    # CSn
+            1,      # single cycle
+            ctType, # staircase or pulsed
+            0,      # towards V+ always
+            0,      # do not halt+return
+            1,      # single device always
+            w, b)
 
         end = False
 
@@ -687,25 +678,23 @@ class ThreadWrapper(BaseThreadWrapper):
 
     def formFinder(self, w, b, V, pw, interpulse, nrPulses, startTag, midTag, endTag):
 
-        HW.ArC.write_b(str(14) + "\n") # job number, form finder
-
-        HW.ArC.write_b(str(V) + "\n") # Vmin == Vmax
-        if V > 0:
-            HW.ArC.write_b(str(0.1) + "\n") # no step, single voltage
-        else:
-            HW.ArC.write_b(str(-0.1) + "\n")
-        HW.ArC.write_b(str(V) + "\n") # Vmax == Vmin
-        HW.ArC.write_b(str(pw) + "\n") # pw_min == pw_max
-        HW.ArC.write_b(str(100.0) + "\n") # no pulse step
-        HW.ArC.write_b(str(pw) + "\n") # pw_max == pw_min
-        HW.ArC.write_b(str(interpulse) + "\n") # interpulse time
-        #HW.ArC.write_b(str(nrPulses) + "\n") # number of pulses
-        HW.ArC.write_b(str(10.0) + "\n") # 10 Ohms R threshold (ie no threshold)
-        HW.ArC.write_b(str(0.0) + "\n") # 0% R threshold (ie no threshold)
-        HW.ArC.write_b(str(7) + "\n") # 7 -> no series resistance
-        HW.ArC.write_b(str(nrPulses) + "\n") # number of pulses
-        HW.ArC.write_b(str(1) + "\n") # single device always
-        HW.ArC.queue_select(w, b)
+        # no step, single voltage
+        Vstep = 0.1 if V > 0 else -0.1
+
+        HW.ArC.command(14,  # job number, form finder
+            V,              # Vmin == Vmax
+            Vstep,
+            V,              # Vmax == Vmin
+            pw,             # pw_min == pw_max
+            100.0,          # no pulse step
+            pw,             # pw_max == pw_min
+            interpulse,     # interpulse time
+            10.0,           # 10 Ohms R threshold (ie no threshold)
+            0.0,            # 0% R threshold (ie no threshold)
+            7,              # 7 -> no series resistance
+            nrPulses,       # number of pulses
+            1,              # single device always
+            w, b)
 
         end = False
 
@@ -254,24 +254,29 @@ class Retention(BaseProgPanel):
         self.programDevs(rangeDev)
 
     @staticmethod
-    def display(w, b, data, parent=None):
+    def prepare(w, b, data):
         timePoints = []
-        m = []
+        rows = []
 
-        for point in data:
-            tag = str(point[3])
-            tagCut = tag[4:]
+        # only reads tagged with a timestamp are retention points
+        tags = data.tagTable
+        for (i, code) in enumerate(data.tagcodes.tolist()):
+            tagCut = tags.tag(code)[4:]
             try:
-                timePoint = float(tagCut)
-                timePoints.append(timePoint)
-                m.append(point[0])
+                timePoints.append(float(tagCut))
+                rows.append(i)
             except ValueError:
                 pass
 
         # subtract the first point from all timepoints
-        firstPoint = timePoints[0]
-        for i in range(len(timePoints)):
-            timePoints[i] = timePoints[i] - firstPoint
+        timePoints = np.asarray(timePoints)
+        timePoints = timePoints - timePoints[0]
+
+        return (timePoints, data.resistance[rows])
+
+    @staticmethod
+    def display(w, b, data, parent=None):
+        (timePoints, m) = data
 
         view = pg.GraphicsLayoutWidget()
         label_style = {'color': '#000000', 'font-size': '10pt'}
@@ -292,8 +297,8 @@ class Retention(BaseProgPanel):
         statsLayout.addWidget(
             QtWidgets.QLabel('Total readings: %d - Average: %s - Std. Deviation: %s' % (
                 len(m),
-                pg.siFormat(np.average(np.asarray(m)), suffix='Ω'),
-                pg.siFormat(np.std(np.asarray(m)), suffix='Ω'))))
+                pg.siFormat(np.average(m), suffix='Ω'),
+                pg.siFormat(np.std(m), suffix='Ω'))))
         resLayout.addItem(statsLayout)
 
         resultWindow = QtWidgets.QWidget()
@@ -304,10 +309,10 @@ class Retention(BaseProgPanel):
         resultWindow.setLayout(resLayout)
 
         retentionPlot.setYRange(min(m)/1.5, max(m)*1.5)
-        retentionCurve.setData(np.asarray(timePoints),np.asarray(m))
+        retentionCurve.setData(timePoints, m)
         resultWindow.update()
 
         return resultWindow
 
 
-tags = { 'top': ModTag(tag, "Retention", Retention.display) }
+tags = { 'top': ModTag(tag, "Retention", Retention.display, Retention.prepare) }
@@ -28,12 +28,9 @@ class ThreadWrapper(BaseThreadWrapper):
     def run(self):
 
         job="3"                     # define job
-        HW.ArC.write_b(job+"\n")            # Send job followed by cell position and pulsing parameters
-        HW.ArC.write_b(str(CB.word)+"\n")
-        HW.ArC.write_b(str(CB.bit)+"\n")
-
-        HW.ArC.write_b(str(float(self.amplitude))+"\n")
-        HW.ArC.write_b(str(float(self.pw))+"\n")
+        # Send job followed by cell position and pulsing parameters
+        HW.ArC.command(job, CB.word, CB.bit, float(self.amplitude),
+            float(self.pw))
 
         # Read the value of M after the pulse
         Mnow = HW.ArC.read_floats(1)
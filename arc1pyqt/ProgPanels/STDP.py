@@ -13,7 +13,6 @@ import os
 import re
 import numpy as np
 import pyqtgraph as pg
-import time
 
 from arc1pyqt import Graphics
 from arc1pyqt import state
@@ -47,6 +46,25 @@ class ThreadWrapper(BaseThreadWrapper):
 
         global tag
 
+        # The waveforms only depend on dt so they are built and encoded
+        # once, before the device loop; each one is then sent to ArC ONE
+        # in a single write
+        waveforms = []
+        for dt in self.timeSteps:
+            #dt/=self.warp # bug fix
+            total_time, total_voltage=self.make_time_series(dt/self.warp, self.gain, self.warp, self.max_spike_time, self.pre_time, \
+                         self.pre_voltage, self.post_time, self.post_voltage)
+
+            points = np.column_stack((total_time, total_voltage)).ravel()
+            frame = HW.ArC.encode(None, len(total_time), *points.tolist())
+
+            if total_voltage.max()>=abs(total_voltage.min()):
+                max_ampl=total_voltage.max()
+            else:
+                max_ampl=total_voltage.min()
+
+            waveforms.append((dt, frame, max_ampl, total_time.max()))
+
         HW.ArC.write_b(str(int(len(self.deviceList)))+"\n")
 
         for device in self.deviceList:
@@ -64,17 +82,8 @@ class ThreadWrapper(BaseThreadWrapper):
 
             HW.ArC.write_b(str(int(len(self.timeSteps)))+"\n")
 
-            for dt in self.timeSteps:
-                #dt/=self.warp # bug fix
-                total_time, total_voltage=self.make_time_series(dt/self.warp, self.gain, self.warp, self.max_spike_time, self.pre_time, \
-                             self.pre_voltage, self.post_time, self.post_voltage)
-
-                HW.ArC.write_b(str(int(len(total_time)))+"\n")
-
-                for i in range(len(total_time)):
-                    HW.ArC.write_b(str(float(total_time[i]))+"\n")
-                    HW.ArC.write_b(str(float(total_voltage[i]))+"\n")
-                    time.sleep(0.001)
+            for (dt, frame, max_ampl, max_time) in waveforms:
+                HW.ArC.write(frame)
 
                 valuesNew=HW.ArC.read_floats(3)
                 tag_=tag+" dt="+str("%.6f" % dt)+" before"
@@ -85,13 +94,7 @@ class ThreadWrapper(BaseThreadWrapper):
 
                 tag_=tag+" dt="+str("%.6f" % dt)+" after"
 
-                if max(total_voltage)>=abs(min(total_voltage)):
-                    max_ampl=max(total_voltage)
-                else:
-                    max_ampl=min(total_voltage)
-
-
-                self.sendData.emit(w,b,valuesNew[0],max_ampl,max(total_time),tag_)
+                self.sendData.emit(w,b,valuesNew[0],max_ampl,max_time,tag_)
                 self.displayData.emit()
 
             valuesNew=HW.ArC.read_floats(3)
@@ -130,53 +133,26 @@ class ThreadWrapper(BaseThreadWrapper):
             post_time=self_post_time
             post_voltage=self_post_voltage
 
-        total_time=[0]
-        total_voltage=[0]
-        index_pre=1
-        index_post=1
-
-        pre_voltage=[x*gain for x in pre_voltage]
-        post_voltage=[x*gain for x in post_voltage]
-
-        pre_time=[x*warp for x in pre_time]
-        post_time=[x*warp for x in post_time]
-
-        while index_pre<len(pre_time) and index_post<len(post_time):
-            if pre_time[index_pre]<post_time[index_post]:
-
-                total_time.append(pre_time[index_pre])
-                v1=post_voltage[index_post]
-                v0=post_voltage[index_post-1]
-                t1=post_time[index_post]
-                t0=post_time[index_post-1]
-                tx=pre_time[index_pre]
-
-                vpost=v1-(v1-v0)*(t1-tx)/(t1-t0)
-
-                total_voltage.append(pre_voltage[index_pre]-vpost)
-                index_pre+=1
-
-            elif pre_time[index_pre]>post_time[index_post]:
+        pre_voltage=np.asarray(pre_voltage, dtype=float)*gain
+        post_voltage=np.asarray(post_voltage, dtype=float)*gain
 
-                total_time.append(post_time[index_post])
-                v1=pre_voltage[index_pre]
-                v0=pre_voltage[index_pre-1]
-                t1=pre_time[index_pre]
-                t0=pre_time[index_pre-1]
-                tx=post_time[index_post]
+        pre_time=np.asarray(pre_time, dtype=float)*warp
+        post_time=np.asarray(post_time, dtype=float)*warp
 
-                vpre=v1-(v1-v0)*(t1-tx)/(t1-t0)
+        # The combined waveform has a point at every pre and post point
+        # (after the first) up to the end of the shorter of the two spikes,
+        # where the voltage is pre - post with the other spike linearly
+        # interpolated. It always starts and ends at 0 V.
+        end=min(pre_time[-1], post_time[-1])
+        merged=np.union1d(pre_time[1:], post_time[1:])
+        merged=merged[merged<=end]
 
-                total_voltage.append(vpre-post_voltage[index_post])
-                index_post+=1
-            else:
-                total_time.append(post_time[index_post])
-                total_voltage.append(pre_voltage[index_pre]-post_voltage[index_post])
-                index_pre+=1
-                index_post+=1
+        merged_voltage=np.interp(merged, pre_time, pre_voltage) - \
+            np.interp(merged, post_time, post_voltage)
 
-        total_voltage.append(0)
-        total_time.append(max([pre_time[-1],post_time[-1]]))
+        total_time=np.concatenate(([0], merged,
+            [max(pre_time[-1], post_time[-1])]))
+        total_voltage=np.concatenate(([0], merged_voltage, [0]))
 
         return total_time, total_voltage
 
@@ -674,7 +650,7 @@ class STDP(BaseProgPanel):
         job = "40"
         timeSteps = self.prepare_time_steps()
 
-        HW.ArC.write_b(job+"\n")
+        HW.ArC.command(job)
 
         wrapper = ThreadWrapper(devs, [self.gain, self.warp, self.max_spike_time, \
             self.pre_time, self.pre_voltage, self.post_time, self.post_voltage], \
@@ -10,7 +10,6 @@
 from PyQt5 import QtGui, QtCore, QtWidgets
 import sys
 import os
-import time
 
 import pyqtgraph as pg
 import numpy as np
@@ -48,30 +47,8 @@ class ThreadWrapper(BaseThreadWrapper):
 
             HW.ArC.queue_select(w, b)
 
-            firstPoint=1
-            endCommand=0
-
-            valuesNew=HW.ArC.read_floats(3)
-
-            if (float(valuesNew[0])!=0 or float(valuesNew[1])!=0 or float(valuesNew[2])!=0):
-                tag_=tag+'_s'
-            else:
-                endCommand=1
-
-            while(endCommand==0):
-                valuesOld=valuesNew
-
-                valuesNew=HW.ArC.read_floats(3)
-
-                if (float(valuesNew[0])!=0 or float(valuesNew[1])!=0 or float(valuesNew[2])!=0):
-                    self.sendData.emit(w,b,valuesOld[0],valuesOld[1],valuesOld[2],tag_)
-                    self.displayData.emit()
-                    tag_=tag+'_i'
-                else:
-                    tag_=tag+'_e'
-                    self.sendData.emit(w,b,valuesOld[0],valuesOld[1],valuesOld[2],tag_)
-                    self.displayData.emit()
-                    endCommand=1
+            self.queueRecords(w, b, HW.ArC.records(3), tag)
+            self.flushData()
             self.updateTree.emit(w,b)
 
 
@@ -258,20 +235,7 @@ class SwitchSeeker(BaseProgPanel):
             self.vW.setFixedWidth(event.size().width()-object.verticalScrollBar().width())
         return False
 
-    def sendParams(self):
-        HW.ArC.write_b(str(float(self.leftEdits[2].text())/1000)+"\n")
-        HW.ArC.write_b(str(float(self.leftEdits[3].text()))+"\n")
-        HW.ArC.write_b(str(float(self.leftEdits[4].text()))+"\n")
-        HW.ArC.write_b(str(float(self.leftEdits[5].text()))+"\n")
-        HW.ArC.write_b(str(float(self.leftEdits[8].text())/1000)+"\n")
-        HW.ArC.write_b(str(float(self.leftEdits[9].text()))+"\n")
-        time.sleep(0.01)
-        HW.ArC.write_b(str(int(self.leftEdits[0].text()))+"\n")
-        HW.ArC.write_b(str(int(self.leftEdits[1].text()))+"\n")
-        HW.ArC.write_b(str(int(self.leftEdits[6].text()))+"\n")
-        HW.ArC.write_b(str(int(self.leftEdits[7].text()))+"\n")
-        HW.ArC.write_b(str(int(self.checkRead.isChecked()))+"\n")
-
+    def sendParams(self, job):
         # Check if Stage I should be skipped
         if self.skipICheckBox.isChecked():
             # -1 or 1 are the QVariants available from the combobox
@@ -283,7 +247,19 @@ class SwitchSeeker(BaseProgPanel):
             # if 0 then Stage I will not be skipped
             skipStageI = str(0)
 
-        HW.ArC.write_b(skipStageI+"\n")
+        HW.ArC.command(job,
+            float(self.leftEdits[2].text())/1000,
+            float(self.leftEdits[3].text()),
+            float(self.leftEdits[4].text()),
+            float(self.leftEdits[5].text()),
+            float(self.leftEdits[8].text())/1000,
+            float(self.leftEdits[9].text()),
+            int(self.leftEdits[0].text()),
+            int(self.leftEdits[1].text()),
+            int(self.leftEdits[6].text()),
+            int(self.leftEdits[7].text()),
+            int(self.checkRead.isChecked()),
+            skipStageI)
 
     def programOne(self):
         self.programDevs([[CB.word, CB.bit]])
@@ -298,9 +274,8 @@ class SwitchSeeker(BaseProgPanel):
 
     def programDevs(self, devs):
         job="%d"%self.getJobCode()
-        HW.ArC.write_b(job+"\n")   # sends the job
+        self.sendParams(job)
 
-        self.sendParams()
         wrapper = ThreadWrapper(devs)
         self.execute(wrapper, wrapper.run)
 
@@ -328,11 +328,12 @@ class VolatilityRead(BaseProgPanel):
     def resizeWidget(self,event):
         pass
 
-    def sendParams(self):
-        HW.ArC.write_b(str(float(self.leftEdits[0].text()))+"\n")
-        HW.ArC.write_b(str(float(self.leftEdits[1].text())/1000000)+"\n")
-        HW.ArC.write_b(str(float(self.leftEdits[2].text()))+"\n")
-        HW.ArC.write_b(str(float(self.leftEdits[3].text()))+"\n")
+    def sendParams(self, job):
+        HW.ArC.command(job,
+            float(self.leftEdits[0].text()),
+            float(self.leftEdits[1].text())/1000000,
+            float(self.leftEdits[2].text()),
+            float(self.leftEdits[3].text()))
 
     def programOne(self):
         self.programDevs([[CB.word, CB.bit]])
@@ -356,9 +357,7 @@ class VolatilityRead(BaseProgPanel):
         pw = float(self.leftEdits[1].text())/1000000
 
         job="33"
-        HW.ArC.write_b(job+"\n")
-
-        self.sendParams()
+        self.sendParams(job)
 
         wrapper = ThreadWrapper(devs, A, pw, B, stopTime, stopConf, \
                 stopTol, self.combo_stopOptions.currentText())
@@ -1 +1,2 @@
 from .virtualarc import VirtualArC
+from .device_model import DeviceModel, models, registerModel
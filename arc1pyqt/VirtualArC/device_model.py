@@ -0,0 +1,85 @@
+import numpy as np
+
+
+class DeviceModel:
+    """
+    Base class for the device models used by `VirtualArC`. A single model
+    instance emulates a whole array of devices: its state and parameters
+    are numpy arrays of the same shape and `DeviceModel.step` advances
+    every device at once for an equally shaped array of voltages.
+
+    Subclasses list their parameters and nominal values in ``defaults``;
+    keyword arguments override them. Argument ``variation`` is the
+    relative standard deviation of the per-device parameter spread, either
+    a float applied to every parameter or a dict keyed by parameter name,
+    and ``seed`` seeds the generator used for the spread and the initial
+    resistances so that an emulated array can be reproduced.
+    """
+
+    # nominal parameter values
+    defaults = {}
+    # parameters that are never varied across devices
+    fixed = ()
+    # range initial resistances are drawn from
+    initialRange = (1e3, 1e4)
+    # whether `DeviceModel.pulse` is exact instead of stepped; exact models
+    # also provide ``integrate(R, Vm, t, dt)``, the stepped reference used
+    # to check them
+    exact = False
+
+    def __init__(self, shape=(), variation=0.0, seed=None, **params):
+        self.shape = shape
+        self.rng = np.random.default_rng(seed)
+
+        unknown = set(params.keys()) - set(self.defaults.keys())
+        if len(unknown) > 0:
+            raise TypeError("Unknown parameters for %s: %s" % \
+                (self.__class__.__name__, ", ".join(sorted(unknown))))
+
+        for (name, nominal) in self.defaults.items():
+            value = params.get(name, nominal)
+            if isinstance(variation, dict):
+                sigma = variation.get(name, 0.0)
+            elif name in self.fixed:
+                sigma = 0.0
+            else:
+                sigma = variation
+            if sigma > 0 and shape != ():
+                value = value * (1.0 + sigma*self.rng.standard_normal(shape))
+            setattr(self, name, value)
+
+    def initialise(self, Rinit=None):
+        """
+        Set the initial resistance of the devices; if ``Rinit`` is None
+        it is drawn uniformly from ``initialRange``.
+        """
+        if Rinit is None:
+            Rinit = self.rng.uniform(*self.initialRange, size=self.shape)
+        self.Rmem = Rinit
+
+    def step(self, Vm, dt):
+        """
+        Advance all devices by ``dt`` under bias ``Vm`` and return the new
+        resistances.
+        """
+        raise NotImplementedError()
+
+    def pulse(self, Vm, pw, dt):
+        """
+        Apply a pulse of amplitude ``Vm`` and width ``pw``. By default
+        this steps the model at ``dt``.
+        """
+        for timestep in range(int(pw/dt)):
+            self.step(Vm, dt)
+        return self.Rmem
+
+
+# Available device models by name
+models = {}
+
+
+def registerModel(name, cls):
+    """
+    Make device model ``cls`` available to `VirtualArC` as ``name``.
+    """
+    models[name] = cls
@@ -1,46 +1,69 @@
 import numpy as np
 import collections
+from .device_model import DeviceModel, registerModel
 
-class ParametricDevice:
+class ParametricDevice(DeviceModel):
+    """
+    Parametric memristor model with dR/dt = s(V)·f(R, V). The device state
+    ``Rmem`` and the biasing voltage can be either scalars or numpy arrays,
+    in which case a single instance emulates a whole array of devices.
+    """
 
-    def __init__(self, Ap, An, a0p, a1p, a0n, a1n, tp, tn):
-
-        self.Ap = Ap
-        self.An = An
-        self.a0p = a0p
-        self.a1p = a1p
-        self.a0n = a0n
-        self.a1n = a1n
-        self.tp = tp
-        self.tn = tn
-
-    def initialise(self, Rinit):
-        self.Rmem = Rinit
+    defaults = { 'Ap': 11.483, 'An': -11.483, 'a0p': 9000, 'a1p': 500,
+        'a0n': 5000, 'a1n': 500, 'tp': 1.731, 'tn': 1.731 }
+    initialRange = (4250, 8000)
+    exact = True
 
     def hstep(self, param):
-        return np.piecewise(param, [ param <= 0, param > 0 ], [0, 1])
+        return np.heaviside(param, 0)
 
     def r_V(self, V):
-        if V > 0:
-            return self.a0p + self.a1p*V
-        else:
-            return self.a0n + self.a1n*V
+        return np.where(V > 0, self.a0p + self.a1p*V, self.a0n + self.a1n*V)
 
     def f_V(self, R, V):
-        if V > 0:
-            return self.hstep(self.r_V(V) - R)*np.power((self.r_V(V) - R), 2)
-        else:
-            return self.hstep(R - self.r_V(V))*np.power((R - self.r_V(V)), 2)
+        dist = np.where(V > 0, self.r_V(V) - R, R - self.r_V(V))
+        return self.hstep(dist)*np.power(dist, 2)
 
     def s_V(self, V):
-        if V > 0:
-            return self.Ap * (-1 + np.exp(np.abs(V)/self.tp))
-        else:
-            return self.An * (-1 + np.exp(np.abs(V)/self.tn))
+        return np.where(V > 0, self.Ap * (-1 + np.exp(np.abs(V)/self.tp)),
+            self.An * (-1 + np.exp(np.abs(V)/self.tn)))
 
-    def step_dt(self, Vm, dt):
+    def step(self, Vm, dt):
 
         dR = self.s_V(Vm) * self.f_V(self.Rmem, Vm) * dt
 
         self.Rmem = self.Rmem + dR
+        return self.Rmem
+
+    def response(self, R, Vm, t):
+        """
+        Exact resistance after biasing a device at resistance ``R`` with
+        ``Vm`` for time ``t``. This is the analytical solution of
+        dR/dt = s(V)·f(R, V), same as `ParameterFit.analytical`.
+        """
+        dist = self.r_V(Vm) - R
+        sgn = np.where(Vm > 0, 1.0, -1.0)
+        k = self.s_V(Vm) * dist * self.hstep(sgn*dist) * t
+        return (R + k*self.r_V(Vm)) / (1 + k)
+
+    def integrate(self, R, Vm, t, dt):
+        """
+        Forward-Euler counterpart of `ParametricDevice.response` stepping
+        at ``dt``; the state of the device is left untouched.
+        """
+        s = self.s_V(Vm)
+        for timestep in range(int(t/dt)):
+            R = R + s * self.f_V(R, Vm) * dt
+        return R
+
+    def pulse(self, Vm, pw, dt=None):
+        """
+        Apply a pulse of amplitude ``Vm`` and width ``pw`` in a single
+        step using the closed form solution of the model; ``dt`` is
+        ignored.
+        """
+        self.Rmem = self.response(self.Rmem, Vm, pw)
+        return self.Rmem
+
 
+registerModel('parametric', ParametricDevice)
@@ -0,0 +1,147 @@
+"""
+Serial emulator for ArC ONE. This opens a pseudo-terminal and speaks the
+firmware protocol on it using the `VirtualArC` engine, so that the real
+`arc1pyqt.instrument.ArC1` driver (and pyserial underneath it) can be
+exercised without an instrument attached. POSIX only.
+
+Run it as a separate process
+
+    python -m arc1pyqt.VirtualArC.pty_emulator --seed 1
+
+and connect `ArC1` to the device path it prints, or use `PtyEmulator`
+directly to run it in the background of the current process.
+
+Pseudo-terminals have no notion of parity and some Linux kernels reject
+reconfiguring one that was opened with parity enabled, which is what
+pyserial does when the timeout of the port is changed.
+"""
+
+import os
+import sys
+import tty
+import select
+import signal
+import argparse
+import threading
+
+from .device_model import models
+from .virtualarc import VirtualPort
+
+
+class PtyEmulator:
+    """
+    Emulated ArC ONE behind a pseudo-terminal. The device path to open is
+    available as ``device`` (and as ``link``, a symbolic link to it, if
+    one was requested). Remaining arguments select the device model, see
+    `VirtualPort`.
+    """
+
+    # how often (in s) the emulator checks whether it should stop
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, model='parametric', params=None, variation=0.0, seed=None,
+            link=None):
+        self.port = VirtualPort(model, params, variation, seed)
+        self.port.timeout = self.POLL_INTERVAL
+
+        (self._master, self._slave) = os.openpty()
+        # no echo or line discipline until the client configures the port;
+        # the slave end is also kept open so that the pty survives clients
+        # connecting and disconnecting
+        tty.setraw(self._slave)
+        self.device = os.ttyname(self._slave)
+
+        self.link = link
+        if link is not None:
+            if os.path.lexists(link):
+                os.unlink(link)
+            os.symlink(self.device, link)
+
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """
+        Start serving in background threads.
+        """
+        for target in (self._receive, self._transmit):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """
+        Stop serving and release the pseudo-terminal.
+        """
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self.port.close()
+
+        os.close(self._master)
+        os.close(self._slave)
+        if self.link is not None and os.path.islink(self.link):
+            os.unlink(self.link)
+
+    def wait(self):
+        """
+        Block until `PtyEmulator.stop` is called from another thread.
+        """
+        while not self._stop.wait(self.POLL_INTERVAL):
+            pass
+
+    def _receive(self):
+        # host -> emulated instrument
+        while not self._stop.is_set():
+            (ready, _, _) = select.select([self._master], [], [],
+                self.POLL_INTERVAL)
+            if len(ready) == 0:
+                continue
+            try:
+                data = os.read(self._master, 4096)
+            except OSError:
+                break
+            self.port.write(data)
+
+    def _transmit(self):
+        # emulated instrument -> host
+        while not self._stop.is_set():
+            data = self.port.read(1)
+            if len(data) == 0:
+                continue
+            data += self.port.read_all()
+            view = memoryview(data)
+            while len(view) > 0:
+                view = view[os.write(self._master, view):]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Emulate an ArC ONE on a pseudo-terminal")
+    parser.add_argument('--model', choices=sorted(models.keys()),
+        default='parametric', help="device model to emulate")
+    parser.add_argument('--variation', type=float, default=0.0,
+        help="relative spread of the device parameters")
+    parser.add_argument('--seed', type=int, default=None,
+        help="seed for the device parameters and initial state")
+    parser.add_argument('--link', default=None,
+        help="also expose the emulator as a symbolic link at this path")
+    args = parser.parse_args(args)
+
+    emulator = PtyEmulator(model=args.model, variation=args.variation,
+        seed=args.seed, link=args.link)
+
+    def _terminate(*_):
+        emulator._stop.set()
+    signal.signal(signal.SIGTERM, _terminate)
+    signal.signal(signal.SIGINT, _terminate)
+
+    emulator.start()
+    print(emulator.link or emulator.device, flush=True)
+    emulator.wait()
+    emulator.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,216 +1,235 @@
 import numpy as np
-#from biolek_device import BiolekDevice as memristor
-from ..instrument import Instrument
-from .parametric_device import ParametricDevice as memristor
+from ..instrument import ArC1
+from .device_model import models
+from . import parametric_device, biolek_device
 from functools import partial
 import time
-from threading import Thread
+import threading
 import queue
 
 
 readNoise = 0.01
 write_scheme = {'V/2':0.5}
-
-
-class VirtualArC(Instrument):
-
-    def __init__(self):
-        self.port="not none"
-        self.crossbar=[[] for x in range(33)]
-        self.counter=0
+# How pulses are emulated; 'exact' uses the closed form response of the
+# device model, 'stepped' integrates it at `VirtualArC.dt` and 'check' does
+# both, reporting where they diverge by more than `checkTolerance`. Models
+# without a closed form are always stepped.
+pulseMode = 'exact'
+checkTolerance = 0.01
+
+# Jobs understood by the emulated firmware and the `VirtualPort` methods
+# decoding their arguments. Unknown jobs are ignored.
+COMMANDS = {
+    '00': '_cmd_reset',
+    '0': '_cmd_initialise',
+    '01': '_cmd_update_read',
+    '02': '_cmd_select',
+    '1': '_cmd_readSingle',
+    '2': '_cmd_readAll',
+    '3': '_cmd_pulse',
+    '04': '_cmd_pulseonly',
+    '14': '_cmd_formfinder',
+    '15': '_cmd_switchseeker_fast',
+    '152': '_cmd_switchseeker_slow',
+    '191': '_cmd_endurance',
+    '201': '_cmd_curvetracer',
+}
+
+
+class VirtualPort:
+    """
+    Stand-in for the serial port of an ArC ONE that emulates the firmware
+    on a virtual crossbar. Commands are written as newline terminated
+    tokens and decoded according to `COMMANDS`; replies are float32 values
+    (or lines of text) appended to a byte buffer that is read through the
+    same `read`, `readline` and `inWaiting` calls as `serial.Serial`.
+    Emulation runs in a background thread, one job per command or device,
+    so replies stream in as they would from the instrument.
+    """
+
+    def __init__(self, model='parametric', params=None, variation=0.0, seed=None):
+        self.model=model
+        self.params=params or {}
+        self.variation=variation
+        self.seed=seed
+
+        self.crossbar=None
         self.w=0
         self.b=0
-        self.q_in=queue.Queue()
-        self.q_out=queue.Queue()
         self.dt=1e-6
         self.Vread=0.5
         self.option = None
+        self.timeout = None
         self.initialise()
 
-    def initialise(self):
-        for w in range(32+1):
-            self.crossbar[w].append(0)
-            for b in range(32):
-                #mx=memristor(Ap=11.483, An=-0.17658, tp=1.731, tn=1.298, a0p=5055, a0n=7586, a1p=-139, a1n=4027)
-                mx=memristor(Ap=11.483, An=-11.483, tp=1.731, tn=1.731, a0p=9000, a0n=5000, a1p=500, a1n=500)
-                #mx.initialise(mx.Ron+5e5+(1-2*np.random.rand())*5e5)
-                mx.initialise(5e3+(1-1.25*np.random.rand())*3e3)
-                self.crossbar[w].append(mx)
-
-    def base_readline(self):
-        return "100\n"
-        pass
-
-    def read(self, size=1):
-        if size > 1:
-            ret = [float(self.q_out.get(True)) for _ in range(size)]
-            return ret
-        return float(self.q_out.get(True))
-
-    def inWaiting(self):
-        return self.q_out.qsize()
-
-    def update_read(self, config):
-        self.Vread = config.Vread
-
-    def base_write(self,value):
-        job=value.rstrip()
-        if job=="1":
-            self.write=self.get_readSingle
-
-        if job=="2":
-            self.write=self.get_readAll
-
-        if job=="3":
-            self.write=self.get_pulse
-
-        if job=="04":
-            self.write=self.get_pulseonly
-
-        if job=="191":
-            self.write=self.get_endurance
-
-        if job=="152":
-            self.write=self.get_switchseeker_slow
-
-        if job=="15":
-            self.write=self.get_switchseeker_fast
-
-        if job=="201":
-            self.write=self.get_curvetracer
-
-        if job=="14":
-            self.write=self.get_formfinder
-
-        if job=="14":
-            self.write=self.get_formfinder
+        self._in = bytearray()
+        self._command = None
+        self._out = bytearray()
+        self._cond = threading.Condition()
 
-        if job=="33":
-            pass
+        self._jobs = queue.Queue()
+        self._worker = threading.Thread(target=self._work, daemon=True)
+        self._worker.start()
 
-    def write(self,value):
-        job=value.rstrip()
-        if job=="1":
-            self.write=self.get_readSingle
-
-        if job=="2":
-            self.write=self.get_readAll
-
-        if job=="3":
-            self.write=self.get_pulse
-
-        if job=="04":
-            self.write=self.get_pulseonly
-
-        if job=="191":
-            self.write=self.get_endurance
-
-        if job=="152":
-            self.write=self.get_switchseeker_slow
-
-        if job=="15":
-            self.write=self.get_switchseeker_fast
-
-        if job=="201":
-            self.write=self.get_curvetracer
-
-        if job=="14":
-            self.write=self.get_formfinder
-
-        if job=="33":
-            pass
-
-    def queue_select(self, word, bit):
+    def initialise(self):
+        # device model `self.model` (see `device_model.models`) with
+        # per-device parameters drawn around `self.params`
+        mx=models[self.model]((32+1, 32+1), variation=self.variation,
+            seed=self.seed, **self.params)
+        mx.initialise()
+        self.crossbar=VirtualCrossbar(mx, 32, 32)
+
+    ################################################## SERIAL API #####
+    def write(self, data):
         """
-        Write a word-/bitline pair
+        Feed bytes to the command decoder.
         """
-        self.write_b("%d\n" % int(word))
-        self.write_b("%d\n" % int(bit))
-        self.w = word
-        self.b = bit
+        self._in.extend(data)
+        while True:
+            idx = self._in.find(b'\n')
+            if idx < 0:
+                break
+            token = bytes(self._in[:idx]).decode().strip()
+            del self._in[:idx+1]
+            self._decode(token)
+        return len(data)
 
-    def select(self, word, bit):
+    def read(self, size=1):
         """
-        For VirtualArC that's exactly the same as `VirtualArC.queue_select`.
+        Read ``size`` bytes, waiting for them for up to ``timeout``
+        seconds (indefinitely if None). Fewer bytes are returned on
+        timeout.
         """
-        self.queue_select(word, bit)
-
-    def read_one(self, word, bit):
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._out) >= size, self.timeout)
+            data = bytes(self._out[:size])
+            del self._out[:size]
+        return data
+
+    def readline(self):
+        with self._cond:
+            self._cond.wait_for(lambda: b'\n' in self._out, self.timeout)
+            idx = self._out.find(b'\n')
+            size = len(self._out) if idx < 0 else idx+1
+            data = bytes(self._out[:size])
+            del self._out[:size]
+        return data
+
+    def read_all(self):
         """
-        Read resistance of device located at word, bit
+        Read whatever is available without waiting.
         """
-        self.write_b("1\n")
-        self.queue_select(word, bit)
-
-        return float(self.read_floats(1))
+        with self._cond:
+            data = bytes(self._out)
+            self._out.clear()
+        return data
 
-    def pulseread_one(self, word, bit, voltage, pw):
+    def reset_input_buffer(self):
         """
-        Pulse a device at `word × bit` and read its value
+        Discard everything not read yet.
         """
-        self.write_b("3\n")
-        self.queue_select(word, bit)
+        with self._cond:
+            self._out.clear()
 
-        self.write_b("%f\n" % voltage)
-        self.write_b("%f\n" % pw)
+    def inWaiting(self):
+        return len(self._out)
 
-        return float(self.read_floats(1))
+    @property
+    def in_waiting(self):
+        return len(self._out)
 
-    def pulse_active(self, voltage, pw):
-        """
-        Pulse currently selected device. Selection must be previously
-        done with `arc1pyqt.VirtualArC.VirtualArC.select`.
-        """
-        self.write_b("04\n")
-        self.write_b("%f\n" % voltage)
-        self.write_b("%f\n" % pw)
+    def close(self):
+        self._jobs.put(None)
+
+    ################################################## DECODER ########
+    def _decode(self, token):
+        try:
+            if self._command is None:
+                if token not in COMMANDS:
+                    return
+                self._command = getattr(self, COMMANDS[token])()
+                next(self._command)
+            else:
+                self._command.send(token)
+        except StopIteration:
+            self._command = None
+        except ValueError:
+            # malformed argument; drop the command
+            self._command = None
+
+    def _params(self, how_many):
+        values = []
+        for _ in range(how_many):
+            values.append(float((yield)))
+        return values
+
+    def _submit(self, func, *args):
+        self._jobs.put(partial(func, *args))
+
+    def _device(self, func, w, b, *args):
+        self.w = int(w)
+        self.b = int(b)
+        func(*args)
+
+    def _work(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            job()
+
+    def _send(self, data):
+        with self._cond:
+            self._out.extend(data)
+            self._cond.notify_all()
+
+    def sendFloats(self, *values):
+        self._send(np.array(values, dtype=np.float32).tobytes())
 
-    def write_b(self, value):
-        self.write(value)
+    def tripleSend(self, Mnow, ampl, pw):
+        self.sendFloats(Mnow, ampl, pw)
 
-    def read_floats(self, how_many):
-        return self.read(how_many)
+    ################################################## SETUP ##########
+    def _cmd_reset(self):
+        return
+        yield
 
-    ################################################## CURVETRACER ####
-    def get_formfinder(self, value):
-        self.counter+=1
-        self.q_in.put(value.rstrip())
-        if self.counter==12:
-            #self.execute_endurance()
-            pl = {}
-
-            pl['Vmin'] = float(self.q_in.get())
-            pl['Vstep'] = float(self.q_in.get())
-            pl['Vmax'] = float(self.q_in.get())
-            pl['pwmin'] = float(self.q_in.get())
-            pl['pwstep'] = float(self.q_in.get())
-            pl['pwmax'] = float(self.q_in.get())
-            pl['interpulse'] =float(self.q_in.get())
-
-            pl['Rthr'] = float(float(self.q_in.get()))
-            pl['Rthr_p'] = int(float(self.q_in.get()))
-
-            pl['pSR'] = int(float(self.q_in.get()))
-            pl['nrP'] = int(float(self.q_in.get()))
-
-            self.nr_of_devices=int(float(self.q_in.get()))
-
-            self.counter=0
-            self.write = partial(self.get_formfinder_device, payload=pl)
-
-    def get_formfinder_device(self, value, payload):
-        self.counter+=1
-        self.q_in.put(value.rstrip())
-        if self.counter==2:
-            self.w=int(float(self.q_in.get()))
-            self.b=int(float(self.q_in.get()))
-            self.counter=0
-            target = partial(self.execute_formfinder, payload=payload)
-            t = Thread(target=target)
-            t.start()
+    def _cmd_initialise(self):
+        p = yield from self._params(7)
+        self.Vread = p[6]
+        self._send(b"1\n")
+
+    def _cmd_update_read(self):
+        p = yield from self._params(2)
+        self.Vread = p[1]
+
+    def _cmd_select(self):
+        (self.w, self.b) = map(int, (yield from self._params(2)))
+
+    ################################################## FORMFINDER #####
+    def _cmd_formfinder(self):
+        p = yield from self._params(12)
+        pl = {}
+
+        pl['Vmin'] = p[0]
+        pl['Vstep'] = p[1]
+        pl['Vmax'] = p[2]
+        pl['pwmin'] = p[3]
+        pl['pwstep'] = p[4]
+        pl['pwmax'] = p[5]
+        pl['interpulse'] = p[6]
+
+        pl['Rthr'] = p[7]
+        pl['Rthr_p'] = int(p[8])
+
+        pl['pSR'] = int(p[9])
+        pl['nrP'] = int(p[10])
+
+        for _ in range(int(p[11])):
+            (w, b) = yield from self._params(2)
+            self._submit(self._device, self.execute_formfinder, w, b, pl)
 
     def execute_formfinder(self, payload):
-        self.nr_of_devices-=1
         pl = payload
         Vmin = pl['Vmin']
         Vstep = pl['Vstep']
@@ -261,48 +280,29 @@ class VirtualArC(Instrument):
                 else:
                     pw=pw*(1+pwstep/100.0)
 
-        if self.nr_of_devices==0:
-            self.write=self.base_write
-        else:
-            self.write=self.get_formfinder_device
-
     ################################################## CURVETRACER ####
-    def get_curvetracer(self, value):
-        self.counter+=1
-        self.q_in.put(value.rstrip())
-        if self.counter==13:
-            #self.execute_endurance()
-            self.Vpos=float(self.q_in.get())
-            self.Vneg=float(self.q_in.get())
-            self.Vstart=float(self.q_in.get())
-            self.Vstep=float(self.q_in.get())
-            self.pwstep=float(self.q_in.get())
-            self.interpulse=float(self.q_in.get())
-            self.CSp=float(self.q_in.get())
-            self.CSn=float(self.q_in.get())
-
-            self.cycles=int(float(self.q_in.get()))
-            self.type=int(float(self.q_in.get()))
-
-            self.option=int(float(self.q_in.get()))
-            self.return_option=int(float(self.q_in.get()))
-
-            self.nr_of_devices=int(float(self.q_in.get()))
-
-            self.counter=0
-            self.write=self.get_curvetracer_device
-
-    def get_curvetracer_device(self, value):
-        self.counter+=1
-        self.q_in.put(value.rstrip())
-        if self.counter==2:
-            self.w=int(float(self.q_in.get()))
-            self.b=int(float(self.q_in.get()))
-            self.counter=0
-            self.execute_curvetracer()
+    def _cmd_curvetracer(self):
+        p = yield from self._params(13)
+        self.Vpos=p[0]
+        self.Vneg=p[1]
+        self.Vstart=p[2]
+        self.Vstep=p[3]
+        self.pwstep=p[4]
+        self.interpulse=p[5]
+        self.CSp=p[6]
+        self.CSn=p[7]
+
+        self.cycles=int(p[8])
+        self.type=int(p[9])
+
+        self.option=int(p[10])
+        self.return_option=int(p[11])
+
+        for _ in range(int(p[12])):
+            (w, b) = yield from self._params(2)
+            self._submit(self._device, self.execute_curvetracer, w, b)
 
     def execute_curvetracer(self):
-        self.nr_of_devices-=1
         Vpos_max=self.Vpos
         Vneg_max=self.Vneg
         Vstep=self.Vstep
@@ -379,46 +379,38 @@ class VirtualArC(Instrument):
 
             self.tripleSend(0.0, 0.0, 0.0)
 
-        if self.nr_of_devices==0:
-            self.write=self.base_write
-        else:
-            self.write=self.get_curvetracer_device
-
-    ################################################## SWITCHSEEKER FAST ###
-    def get_switchseeker_fast(self, value):
-        self.counter+=1
-        self.q_in.put(value.rstrip())
-        if self.counter==13:
-            self.pw=float(self.q_in.get())
-            self.Vmin=float(self.q_in.get())
-            self.Vstep=float(self.q_in.get())
-            self.Vmax=float(self.q_in.get())
-            self.interpulse=float(self.q_in.get())
-            self.thr=float(self.q_in.get())
-            self.reads_in_trailercard=int(float(self.q_in.get()))
-            self.pPulses=int(float(self.q_in.get()))
-            self.cycles=int(float(self.q_in.get()))
-            self.tol=float(self.q_in.get())
-
-            self.checkRead=int(float(self.q_in.get()))
-            self.skipStage1=int(float(self.q_in.get()))
-
-            self.nr_of_devices=int(float(self.q_in.get()))
-
-            self.counter=0
-            self.write=self.get_switchseeker_fast_device
-
-    def get_switchseeker_fast_device(self, value):
-        self.counter+=1
-        self.q_in.put(value.rstrip())
-        if self.counter==2:
-            self.w=int(float(self.q_in.get()))
-            self.b=int(float(self.q_in.get()))
-            self.counter=0
-            self.execute_switchseeker_fast()
+    ################################################## SWITCHSEEKER ###
+    def _switchseeker_params(self):
+        p = yield from self._params(13)
+        self.pw=p[0]
+        self.Vmin=p[1]
+        self.Vstep=p[2]
+        self.Vmax=p[3]
+        self.interpulse=p[4]
+        self.thr=p[5]
+        self.reads_in_trailercard=int(p[6])
+        self.pPulses=int(p[7])
+        self.cycles=int(p[8])
+        self.tol=p[9]
+
+        self.checkRead=int(p[10])
+        self.skipStage1=int(p[11])
+
+        return int(p[12])
+
+    def _cmd_switchseeker_fast(self):
+        devices = yield from self._switchseeker_params()
+        for _ in range(devices):
+            (w, b) = yield from self._params(2)
+            self._submit(self._device, self.execute_switchseeker_fast, w, b)
+
+    def _cmd_switchseeker_slow(self):
+        devices = yield from self._switchseeker_params()
+        for _ in range(devices):
+            (w, b) = yield from self._params(2)
+            self._submit(self._device, self.execute_switchseeker_slow, w, b)
 
     def execute_switchseeker_fast(self):
-        self.nr_of_devices-=1
         baseline=0
 
         currR=0
@@ -480,49 +472,9 @@ class VirtualArC(Instrument):
                             self.pw, self.interpulse, self.tol, self.cycles, self.Vmin, \
                             self.Vstep, self.Vmax, RES)
 
-        if self.nr_of_devices==0:
-            self.write=self.base_write
-        else:
-            self.write=self.get_switchseeker_fast_device
         self.tripleSend(0.0,0.0,0.0)
 
-
-    ################################################## SWITCHSEEKER SLOW ###
-    def get_switchseeker_slow(self, value):
-        self.counter+=1
-        self.q_in.put(value.rstrip())
-        if self.counter==13:
-            #self.execute_endurance()
-            self.pw=float(self.q_in.get())
-            self.Vmin=float(self.q_in.get())
-            self.Vstep=float(self.q_in.get())
-            self.Vmax=float(self.q_in.get())
-            self.interpulse=float(self.q_in.get())
-            self.thr=float(self.q_in.get())
-            self.reads_in_trailercard=int(float(self.q_in.get()))
-            self.pPulses=int(float(self.q_in.get()))
-            self.cycles=int(float(self.q_in.get()))
-            self.tol=float(self.q_in.get())
-
-            self.checkRead=int(float(self.q_in.get()))
-            self.skipStage1=int(float(self.q_in.get()))
-
-            self.nr_of_devices=int(float(self.q_in.get()))
-
-            self.counter=0
-            self.write=self.get_switchseeker_slow_device
-
-    def get_switchseeker_slow_device(self, value):
-        self.counter+=1
-        self.q_in.put(value.rstrip())
-        if self.counter==2:
-            self.w=int(float(self.q_in.get()))
-            self.b=int(float(self.q_in.get()))
-            self.counter=0
-            self.execute_switchseeker_slow()
-
     def execute_switchseeker_slow(self):
-        self.nr_of_devices-=1
         baseline=0
 
         currR=0
@@ -600,10 +552,6 @@ class VirtualArC(Instrument):
                             self.pw, self.interpulse, self.tol, self.cycles, self.Vmin, \
                             self.Vstep, self.Vmax, RES)
 
-        if self.nr_of_devices==0:
-            self.write=self.base_write
-        else:
-            self.write=self.get_switchseeker_slow_device
         self.tripleSend(0.0,0.0,0.0)
 
     def SS_BasicUnit(self, M, N, Vbias, T, rw, interpulse):
@@ -614,7 +562,7 @@ class VirtualArC(Instrument):
                 self.tripleSend(read(self.crossbar,self.w,self.b),Vbias,T)
         for i in range(M):
             Rmem=read(self.crossbar,self.w,self.b)
-            self.tripleSend(read(self.crossbar,self.w,self.b),Vread,0.0)
+            self.tripleSend(read(self.crossbar,self.w,self.b),self.Vread,0.0)
             outcome+=Rmem/M
 
         return outcome
@@ -670,40 +618,26 @@ class VirtualArC(Instrument):
                         semiterm=0
 
     ################################################## ENDURANCE #####
-    def get_endurance(self, value):
-        self.counter+=1
-        self.q_in.put(value.rstrip())
-        if self.counter==11:
-            pl = {}
-            pl["pos_bias"] = float(self.q_in.get())
-            pl["pos_pw"] = float(self.q_in.get())
-            pl["pos_cutoff"] = float(self.q_in.get())
-            pl["neg_bias"] = float(self.q_in.get())
-            pl["neg_pw"] = float(self.q_in.get())
-            pl["neg_cutoff"] = float(self.q_in.get())
-
-            pl["interpulse"] = float(self.q_in.get())
-            pl["pos_pulses"] = int(self.q_in.get())
-            pl["neg_pulses"] = int(self.q_in.get())
-            pl["cycles"] = int(self.q_in.get())
-
-            self.nr_of_devices=int(float(self.q_in.get()))
-            self.counter=0
-            self.write=partial(self.get_endurance_device, payload=pl)
-
-    def get_endurance_device(self, value, payload):
-        self.counter+=1
-        self.q_in.put(value.rstrip())
-        if self.counter==2:
-            self.w=int(float(self.q_in.get()))
-            self.b=int(float(self.q_in.get()))
-            self.counter=0
-            target = partial(self.execute_endurance, payload=payload)
-            t = Thread(target=target)
-            t.start()
+    def _cmd_endurance(self):
+        p = yield from self._params(11)
+        pl = {}
+        pl["pos_bias"] = p[0]
+        pl["pos_pw"] = p[1]
+        pl["pos_cutoff"] = p[2]
+        pl["neg_bias"] = p[3]
+        pl["neg_pw"] = p[4]
+        pl["neg_cutoff"] = p[5]
+
+        pl["interpulse"] = p[6]
+        pl["pos_pulses"] = int(p[7])
+        pl["neg_pulses"] = int(p[8])
+        pl["cycles"] = int(p[9])
+
+        for _ in range(int(p[10])):
+            (w, b) = yield from self._params(2)
+            self._submit(self._device, self.execute_endurance, w, b, pl)
 
     def execute_endurance(self, payload):
-        self.nr_of_devices-=1
         pl = payload
         for _ in range(pl["cycles"]):
             for _ in range(pl["pos_pulses"]):
@@ -714,110 +648,135 @@ class VirtualArC(Instrument):
                 self.crossbar=pulse(self.crossbar,self.w,self.b,pl["neg_bias"],pl["neg_pw"],self.dt)
                 self.tripleSend(read(self.crossbar,self.w,self.b),pl["neg_bias"],pl["neg_pw"])
 
-        if self.nr_of_devices==0:
-            self.write=self.base_write
-        else:
-            self.write=self.get_endurance_device
         self.tripleSend(0,0,0)
 
-
     ################################################## READ SINGLE ###
-    def get_readSingle(self, value):
-        self.counter+=1
-        self.q_in.put(int(value.rstrip()))
-        if self.counter==2:
-            self.compute_readSingle()
-            self.counter=0
-            self.write=self.base_write
+    def _cmd_readSingle(self):
+        (w, b) = yield from self._params(2)
+        self._submit(self._device, self.compute_readSingle, w, b)
 
     def compute_readSingle(self):
-        self.w=int(self.q_in.get())
-        self.b=int(self.q_in.get())
-        self.q_out.put(str(read(self.crossbar,self.w,self.b))+"\n")
-        self.write=self.base_write
+        self.sendFloats(read(self.crossbar,self.w,self.b))
 
 
     ################################################## READ ALL #######
-    def get_readAll(self, value):
-        self.counter+=1
-        self.q_in.put(float(value.rstrip()))
-        if self.counter==3:
-            self.compute_readAll()
-            self.counter=0
+    def _cmd_readAll(self):
+        (type_of_readAll, wline_nr, bline_nr) = yield from self._params(3)
+        if int(type_of_readAll) != 2:
+            self._submit(self.compute_readAll, int(wline_nr), int(bline_nr))
+            return
+
+        # stand-alone/custom array; devices are sent one by one
+        (devices, ) = yield from self._params(1)
+        for _ in range(int(devices)):
+            (w, b) = yield from self._params(2)
+            self._submit(self.compute_readOne, int(w), int(b))
 
-    def compute_readAll(self):
-        type_of_readAll=int(self.q_in.get())
-        wline_nr=int(self.q_in.get())
-        bline_nr=int(self.q_in.get())
+    def compute_readAll(self, wline_nr, bline_nr):
+        values = [read(self.crossbar,w,b) for w in range(1,wline_nr+1) \
+            for b in range(1,bline_nr+1)]
+        self.sendFloats(*values)
 
-        for w in range(1,wline_nr+1):
-            for b in range(1,bline_nr+1):
-                self.q_out.put(read(self.crossbar,w,b))
-        self.write=self.base_write
+    def compute_readOne(self, w, b):
+        self.sendFloats(read(self.crossbar,w,b))
 
 
     ################################################## SINGLE PULSE ###
-    def get_pulse(self, value):
-        self.counter+=1
-        self.q_in.put(value.rstrip())
-        if self.counter==4:
-            self.compute_pulse()
-            self.counter=0
-
-    def get_pulseonly(self, value):
-        sel.counter += 1
-        self.q_int.put(value.rstrip())
-        if self.counter == 2:
-            self.compute_pulse_only()
-            self.counter = 0
-
-    def compute_pulse(self):
-        w=int(self.q_in.get())
-        b=int(self.q_in.get())
-        ampl=float(self.q_in.get())
-        pw=float(self.q_in.get())
+    def _cmd_pulse(self):
+        (w, b, ampl, pw) = yield from self._params(4)
+        self._submit(self.compute_pulse, int(w), int(b), ampl, pw)
 
-        self.crossbar=pulse(self.crossbar,w,b,ampl,pw,self.dt)
-        self.q_out.put(str(read(self.crossbar,w,b))+"\n")
-        self.write=self.base_write
+    def _cmd_pulseonly(self):
+        (ampl, pw) = yield from self._params(2)
+        self._submit(self.compute_pulse_only, ampl, pw)
 
-    def compute_pulse_only(self):
-        ampl=float(self.q_in.get())
-        pw=float(self.q_in.get())
+    def compute_pulse(self, w, b, ampl, pw):
+        self.crossbar=pulse(self.crossbar,w,b,ampl,pw,self.dt)
+        self.sendFloats(read(self.crossbar,w,b))
 
+    def compute_pulse_only(self, ampl, pw):
         self.crossbar=pulse(self.crossbar,self.w,self.b,ampl,pw,self.dt)
-        self.q_out.put(str(read(self.crossbar,self.w,self.b))+"\n")
-        self.write=self.base_write
+        self.sendFloats(read(self.crossbar,self.w,self.b))
 
-    def close(self):
-        pass
 
-    def tripleSend(self, Mnow, ampl, pw):
-        self.q_out.put(str(Mnow)+"\n", True)
-        self.q_out.put(str(ampl)+"\n", True)
-        self.q_out.put(str(pw)+"\n", True)
+class VirtualArC(ArC1):
+    """
+    ArC ONE emulated on a virtual crossbar. This is the regular `ArC1`
+    driver talking to a `VirtualPort` instead of a serial port, so it
+    exercises the exact same command and read paths. Arguments select the
+    device model and its per-device variation, see `VirtualPort`.
+    """
 
+    def __init__(self, model='parametric', params=None, variation=0.0, seed=None,
+            timeout=7):
+        super().__init__(VirtualPort(model, params, variation, seed), timeout)
 
-def pulse(crossbar, w, b, ampl, pw, dt):
-    global write_scheme
+    @property
+    def crossbar(self):
+        """
+        The emulated `VirtualCrossbar`.
+        """
+        return self._port.crossbar
+
+
+class VirtualCrossbar:
+    """
+    Array of emulated devices. Device state is held by a single device
+    model instance operating on ``(words+1)×(bits+1)`` arrays (row and
+    column 0 are unused) so that a pulse updates every device in one go
+    instead of stepping each one individually.
+    """
+
+    def __init__(self, model, words=32, bits=32):
+        self.model = model
+        self.words = words
+        self.bits = bits
+
+    @property
+    def Rmem(self):
+        return self.model.Rmem
 
-    b_inactive=list(range(1,33))
-    b_inactive.remove(b)
+    def biasing(self, w, b, ampl):
+        """
+        Voltage across every device when applying ``ampl`` on device
+        ``(w, b)`` using the V/2 scheme; the rest of the selected word- and
+        bitline are half-selected and everything else is unbiased.
+        """
+        V = np.zeros((self.words+1, self.bits+1))
+        V[w, 1:] = ampl*write_scheme['V/2']
+        V[1:, b] = ampl*write_scheme['V/2']
+        V[w, b] = ampl
+        return V
+
+    def pulse(self, w, b, ampl, pw, dt, mode=None):
+        V = self.biasing(w, b, ampl)
+        mode = mode or pulseMode
+
+        if mode == 'stepped' or not self.model.exact:
+            for timestep in range(int(pw/dt)):
+                self.model.step(V, dt)
+            return
+
+        if mode == 'check':
+            stepped = self.model.integrate(self.model.Rmem, V, pw, dt)
 
-    w_inactive=list(range(1,33))
-    w_inactive.remove(w)
+        self.model.pulse(V, pw, dt)
 
-    for timestep in range(int(pw/dt)):
-        crossbar[w][b].step_dt(ampl,dt)
-        for i in b_inactive:
-            crossbar[w][i].step_dt(ampl/2, dt)
-        for i in w_inactive:
-            crossbar[i][b].step_dt(ampl/2, dt)
+        if mode == 'check':
+            dev = np.abs(self.model.Rmem - stepped)/np.abs(stepped)
+            if np.max(dev) > checkTolerance:
+                (cw, cb) = np.unravel_index(np.argmax(dev), dev.shape)
+                print("closed form deviates from stepped integration by "
+                    "%.2f%% at W=%d B=%d (V=%g, pw=%g)" % \
+                    (100*dev[cw, cb], cw, cb, V[cw, cb], pw))
+
+
+def pulse(crossbar, w, b, ampl, pw, dt):
+    crossbar.pulse(w, b, ampl, pw, dt)
     return crossbar
 
 
 def read(crossbar, w, b):
     global readNoise
-    Rmem=crossbar[w][b].Rmem
+    Rmem=crossbar.Rmem[w][b]
     return Rmem+readNoise*Rmem*(2*np.random.random()-1)
-
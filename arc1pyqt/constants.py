@@ -1,5 +1,7 @@
 MIN_RES = 100
 MAX_RES = 100000000
 
-SAVE_FI_PATTERN = 'Session file (*.csv);;Compressed Session file (*.csv.gz)'
-OPEN_FI_PATTERN = 'Session files (*.csv *.csv.gz);;All files (*.*)'
+SAVE_FI_PATTERN = 'Session file (*.csv);;Compressed Session file (*.csv.gz);;' + \
+    'Binary Session file (*.arc1)'
+ZSTD_SAVE_FI_PATTERN = 'Zstandard compressed Session file (*.csv.zst)'
+OPEN_FI_PATTERN = 'Session files (*.csv *.csv.gz *.arc1);;All files (*.*)'
@@ -0,0 +1,548 @@
+"""
+Columnar storage for the measurement history of a single crosspoint.
+
+Every measurement in an ArC ONE session consists of the resistance, the
+amplitude and pulse width of the applied pulse, the module tag, the read tag,
+the read voltage and, for end tags, the index of the matching start tag.
+Historically these were stored as one python list per measurement which is
+expensive in long running sessions. `DeviceHistory` keeps each of these
+fields in a separate growable numpy array instead. Tag strings are interned
+in a session-wide `TagTable` and only their integer codes are stored.
+
+For backwards compatibility `DeviceHistory` still behaves like a list of
+rows, so that
+
+>>> history[-1]
+[1000.0, 0.5, 0.0, 'S R2 V=0.5', 'R2', 0.5, -1]
+
+returns the last measurement in the familiar
+``[res, amp, pw, tag, readTag, Vread, startIdx]`` layout. Slicing a
+`DeviceHistory` returns another `DeviceHistory` that shares its arrays with
+the original (no data is copied) and exposes the columns of the requested
+range as numpy views through `DeviceHistory.resistance`,
+`DeviceHistory.amplitude` and friends.
+"""
+
+import collections
+import numpy as np
+
+
+TagInfo = collections.namedtuple('TagInfo', ['module', 'phase', 'extra'])
+"""
+Structured representation of a history tag. Fields are
+
+* ``module``: the module tag, for instance ``'EN'`` for ``'EN_s'``. Tags
+  without an underscore, such as reads (``'S R2 V=0.5'``) and pulses
+  (``'P'``), use at most their first three characters (``'S R'``, ``'P'``).
+* ``phase``: ``'s'``, ``'i'`` or ``'e'`` for start, intermediate and end
+  tags respectively, ``''`` for module tags with no phase (for instance
+  ``'RET_1697040000.123'``) and ``None`` for tags without an underscore.
+* ``extra``: anything following the module and phase, typically a cycle
+  number (``'CT_i_37'``) or a timestamp (``'RET_1697040000.123'``).
+"""
+
+
+Blocks = collections.namedtuple('Blocks', ['start', 'end', 'tagcode'])
+"""
+Block index of a device history, as returned by `DeviceHistory.blocks`.
+Every field is an array with one element per block: ``start`` and ``end``
+are the (inclusive) range of history rows covered by the block and
+``tagcode`` is the tag code of the row that closed it.
+"""
+
+
+def parseTag(tag):
+    """
+    Split a history tag into a `TagInfo`. The phase is the last ``s``,
+    ``i`` or ``e`` component of the tag (or an ``i`` followed by a cycle
+    number) and anything else after the module tag ends up in ``extra``.
+
+    >>> parseTag('CT_i_37')
+    TagInfo(module='CT', phase='i', extra='37')
+    >>> parseTag('MPF_CT_e')
+    TagInfo(module='MPF', phase='e', extra='CT')
+    >>> parseTag('RET_1697040000.123')
+    TagInfo(module='RET', phase='', extra='1697040000.123')
+    >>> parseTag('S R2 V=0.5')
+    TagInfo(module='S R', phase=None, extra='')
+    """
+
+    parts = tag.split('_')
+
+    # no underscore; this is either a read ('S R2 V=0.5') or a pulse ('P')
+    # and we need AT MOST the first three characters
+    if len(parts) == 1:
+        return TagInfo(tag[:3], None, '')
+
+    (module, rest) = (parts[0], parts[1:])
+
+    if rest[-1] in ['s', 'i', 'e']:
+        return TagInfo(module, rest[-1], '_'.join(rest[:-1]))
+    if len(rest) >= 2 and rest[-2] == 'i':
+        return TagInfo(module, 'i', '_'.join(rest[:-2] + rest[-1:]))
+
+    return TagInfo(module, '', '_'.join(rest))
+
+
+class TagTable:
+    """
+    Intern table mapping tag strings to integer codes and back. Tags are
+    parsed once, when first encountered, and their `TagInfo` is kept along
+    with the code. A single table is shared by all devices of a session
+    (see `tagTable`). The per-code arrays returned by `TagTable.phases`,
+    `TagTable.treeMask` and `TagTable.standardMask` are maintained as tags
+    are registered, so retrieving them does not depend on the size of the
+    table.
+    """
+
+    # initial capacity of the per-code arrays
+    _INITIAL_CAPACITY = 64
+
+    def __init__(self):
+        self._tags = []
+        self._infos = []
+        self._codes = {}
+        self._allocate(self._INITIAL_CAPACITY)
+
+    def _allocate(self, capacity):
+        self._phaseArr = np.zeros(capacity, dtype='U1')
+        self._treeArr = np.zeros(capacity, dtype=bool)
+        self._standardArr = np.zeros(capacity, dtype=bool)
+
+    def _grow(self):
+        (phases, tree, standard) = (self._phaseArr, self._treeArr,
+            self._standardArr)
+        self._allocate(2*len(phases))
+        self._phaseArr[:len(phases)] = phases
+        self._treeArr[:len(tree)] = tree
+        self._standardArr[:len(standard)] = standard
+
+    def clear(self):
+        """
+        Forget all registered tags.
+        """
+        self._tags.clear()
+        self._infos.clear()
+        self._codes.clear()
+        self._allocate(self._INITIAL_CAPACITY)
+
+    def code(self, tag):
+        """
+        Return the integer code of ``tag`` registering it if it has not
+        been encountered before.
+        """
+        try:
+            return self._codes[tag]
+        except KeyError:
+            code = len(self._tags)
+            info = parseTag(tag)
+            self._tags.append(tag)
+            self._infos.append(info)
+            self._codes[tag] = code
+
+            if code >= len(self._phaseArr):
+                self._grow()
+            self._phaseArr[code] = info.phase or ''
+            self._treeArr[code] = self.updatesTree(code)
+            self._standardArr[code] = info.phase is not None
+
+            return code
+
+    def tag(self, code):
+        """
+        Return the tag string associated with ``code``.
+        """
+        return self._tags[code]
+
+    def info(self, code):
+        """
+        Return the `TagInfo` associated with ``code``.
+        """
+        return self._infos[code]
+
+    def codeArray(self, tags):
+        """
+        Intern a sequence of tags returning an array of their codes. Tags
+        typically come in runs of identical values (for instance the
+        intermediate tags of a module) so every run is only looked up once.
+        """
+        tags = np.asarray(tags, dtype=str)
+        if len(tags) == 0:
+            return np.empty(0, dtype=np.int32)
+
+        starts = np.flatnonzero(np.concatenate(([True], tags[1:] != tags[:-1])))
+        lengths = np.diff(np.append(starts, len(tags)))
+        codes = np.array([self.code(t) for t in tags[starts].tolist()], dtype=np.int32)
+
+        return np.repeat(codes, lengths)
+
+    def phases(self):
+        """
+        Return an array, indexed by tag code, with the phase of every
+        registered tag encoded as a single character (``'s'``, ``'i'``,
+        ``'e'`` or ``''``).
+        """
+        return self._phaseArr[:len(self._tags)]
+
+    def treeMask(self):
+        """
+        Return a boolean array, indexed by tag code, that is True for the
+        tags that mark a new entry in the history tree (see
+        `TagTable.updatesTree`).
+        """
+        return self._treeArr[:len(self._tags)]
+
+    def standardMask(self):
+        """
+        Return a boolean array, indexed by tag code, that is True for the
+        tags that follow the ``MOD_phase`` convention of the modules (ie.
+        everything but reads and pulses).
+        """
+        return self._standardArr[:len(self._tags)]
+
+    def codes(self, predicate):
+        """
+        Return an array with the codes of all registered tags whose
+        `TagInfo` satisfies ``predicate``.
+        """
+        return np.array([c for (c, info) in enumerate(self._infos) \
+            if predicate(info)], dtype=np.int32)
+
+    def updatesTree(self, code):
+        """
+        Check whether a tag marks a new entry in the history tree. That is
+        true for reads, pulses and the end tags of modules.
+        """
+        info = self._infos[code]
+        return info.module in ['S R', 'P'] or info.phase == 'e'
+
+    @property
+    def tags(self):
+        """
+        All registered tags; the index of each tag is its code.
+        """
+        return self._tags
+
+    def __len__(self):
+        return len(self._tags)
+
+
+# session-wide tag table
+tagTable = TagTable()
+
+
+class DeviceHistory:
+    """
+    Measurement history of a single device held in growable numpy arrays.
+    Use `DeviceHistory.append` to add new measurements; the backing arrays
+    are grown geometrically so appends are amortised O(1).
+    """
+
+    # initial capacity of the backing arrays
+    _INITIAL_CAPACITY = 64
+
+    _columns = (
+        ('resistance', np.float64),
+        ('amplitude', np.float64),
+        ('pulsewidth', np.float64),
+        ('vread', np.float64),
+        ('tagcode', np.int32),
+        ('readtagcode', np.int32),
+        ('startidx', np.int64)
+    )
+
+    def __init__(self, tags=None):
+        self._tags = tags if tags is not None else tagTable
+        self._data = { name: np.empty(0, dtype=dt) for (name, dt) in self._columns }
+        self._start = 0
+        self._stop = 0
+        # views are slices of another history and cannot be extended
+        self._view = False
+        # cached block index; see `DeviceHistory.blocks`
+        self._blocks = None
+
+    @classmethod
+    def fromColumns(cls, columns, tags=None):
+        """
+        Create a history backed by existing column arrays, for instance
+        memory-mapped arrays from a binary session file (see
+        `arc1pyqt.sessionio`). ``columns`` must be a dict with an array for
+        each of the columns of `DeviceHistory` (``resistance``,
+        ``amplitude``, ``pulsewidth``, ``vread``, ``tagcode``,
+        ``readtagcode`` and ``startidx``). The arrays are not copied until
+        the history is extended or `DeviceHistory.detach` is called.
+        """
+        history = cls(tags)
+        history._data = { name: columns[name] for (name, _) in cls._columns }
+        history._stop = len(history._data['resistance'])
+        return history
+
+    def detach(self):
+        """
+        Copy the backing arrays into newly allocated memory. This should be
+        called before the file backing a memory-mapped history is modified.
+        """
+        if self._view:
+            raise ValueError("Cannot detach a history view")
+
+        for (name, dt) in self._columns:
+            self._data[name] = np.array(self._data[name][:self._stop], dtype=dt)
+
+    def _grow(self, required):
+        capacity = len(self._data['resistance'])
+        if required <= capacity:
+            return
+
+        capacity = max(capacity * 2, required, self._INITIAL_CAPACITY)
+
+        for (name, dt) in self._columns:
+            arr = np.empty(capacity, dtype=dt)
+            arr[:self._stop] = self._data[name][:self._stop]
+            self._data[name] = arr
+
+    def append(self, res, amp, pw, tag, readTag, Vread, startIdx=-1):
+        """
+        Append a new measurement to the history.
+        """
+        self.appendCodes(res, amp, pw, self._tags.code(tag),
+            self._tags.code(readTag), Vread, startIdx)
+
+    def appendCodes(self, res, amp, pw, tagCode, readTagCode, Vread, startIdx=-1):
+        """
+        Same as `DeviceHistory.append` but with tags already interned in
+        the tag table of this history.
+        """
+        if self._view:
+            raise ValueError("Cannot append to a history view")
+
+        self._grow(self._stop + 1)
+        idx = self._stop
+        data = self._data
+
+        data['resistance'][idx] = res
+        data['amplitude'][idx] = amp
+        data['pulsewidth'][idx] = pw
+        data['vread'][idx] = np.nan if Vread is None else Vread
+        data['tagcode'][idx] = tagCode
+        data['readtagcode'][idx] = readTagCode
+        data['startidx'][idx] = startIdx
+
+        self._stop += 1
+
+    def extendCodes(self, res, amp, pw, tagCodes, readTagCodes, Vread, startIdx=None):
+        """
+        Bulk version of `DeviceHistory.appendCodes`. All arguments are
+        arrays (or scalars to be broadcast) of the same length. If
+        ``startIdx`` is ``None`` all start indices are set to -1.
+        """
+        if self._view:
+            raise ValueError("Cannot append to a history view")
+
+        res = np.asarray(res, dtype=np.float64)
+        num = len(res)
+        self._grow(self._stop + num)
+        (lo, hi) = (self._stop, self._stop + num)
+        data = self._data
+
+        data['resistance'][lo:hi] = res
+        data['amplitude'][lo:hi] = amp
+        data['pulsewidth'][lo:hi] = pw
+        data['vread'][lo:hi] = Vread
+        data['tagcode'][lo:hi] = tagCodes
+        data['readtagcode'][lo:hi] = readTagCodes
+        data['startidx'][lo:hi] = -1 if startIdx is None else startIdx
+
+        self._stop = hi
+
+    def _index(self, idx):
+        # convert a (possibly negative) row index to an absolute
+        # position in the backing arrays
+        length = self._stop - self._start
+        if idx < 0:
+            idx += length
+        if idx < 0 or idx >= length:
+            raise IndexError("history index out of range")
+        return self._start + idx
+
+    def column(self, name):
+        """
+        Return column ``name`` (one of ``resistance``, ``amplitude``,
+        ``pulsewidth``, ``vread``, ``tagcode``, ``readtagcode`` or
+        ``startidx``) as a view.
+        """
+        return self._data[name][self._start:self._stop]
+
+    @property
+    def resistance(self):
+        """ Resistance column (view) """
+        return self.column('resistance')
+
+    @property
+    def amplitude(self):
+        """ Pulse amplitude column (view) """
+        return self.column('amplitude')
+
+    @property
+    def pulsewidth(self):
+        """ Pulse width column (view) """
+        return self.column('pulsewidth')
+
+    @property
+    def vread(self):
+        """ Read voltage column (view) """
+        return self.column('vread')
+
+    @property
+    def tagcodes(self):
+        """ Interned tag codes (view) """
+        return self.column('tagcode')
+
+    @property
+    def readtagcodes(self):
+        """ Interned read tag codes (view) """
+        return self.column('readtagcode')
+
+    @property
+    def startidx(self):
+        """ Start indices of end tags, -1 if not set (view) """
+        return self.column('startidx')
+
+    @property
+    def tagTable(self):
+        """ Tag table used to intern the tags of this history """
+        return self._tags
+
+    def tagCode(self, idx):
+        """ Tag code of row ``idx`` """
+        return int(self._data['tagcode'][self._index(idx)])
+
+    def tag(self, idx):
+        """ Tag string of row ``idx`` """
+        return self._tags.tag(self.tagCode(idx))
+
+    def tagInfo(self, idx):
+        """ `TagInfo` of row ``idx`` """
+        return self._tags.info(self.tagCode(idx))
+
+    def setTag(self, idx, tag):
+        """ Replace the tag of row ``idx`` """
+        self._data['tagcode'][self._index(idx)] = self._tags.code(tag)
+        self._invalidateBlocks(idx)
+
+    def setStartIndex(self, idx, startIdx):
+        """ Replace the start index of row ``idx`` """
+        self._data['startidx'][self._index(idx)] = startIdx
+        self._invalidateBlocks(idx)
+
+    def blocks(self, first=0):
+        """
+        Return the `Blocks` of this history that end at or after row
+        ``first``. A block is every entry of the history tree: a single
+        read or pulse, or a complete module run closed by an end tag (see
+        `TagTable.updatesTree`). The index is built once and then only
+        extended with whatever has been appended since the last call.
+        Module runs whose start cannot be determined are left out.
+        """
+        (upto, start, end, code) = self._blocks or (0, np.empty(0, np.int64),
+            np.empty(0, np.int64), np.empty(0, np.int32))
+
+        if upto < len(self):
+            tagcodes = self.tagcodes
+            startidx = self.startidx
+
+            rows = upto + np.flatnonzero(self._tags.treeMask()[tagcodes[upto:]])
+            codes = tagcodes[rows]
+            starts = rows.copy()
+
+            # module runs start right after the stored start index
+            standard = self._tags.standardMask()[codes]
+            stored = standard & (startidx[rows] > 0)
+            starts[stored] = startidx[rows[stored]] + 1
+
+            # if not stored look for the last start tag of the same module
+            allStarts = np.flatnonzero(self._tags.phases() == 's')
+            for i in np.flatnonzero(standard & ~stored).tolist():
+                modTag = self._tags.info(codes[i]).module
+                startCodes = [c for c in allStarts.tolist() if \
+                    self._tags.info(c).module.startswith(modTag)]
+                matches = np.flatnonzero(np.isin(tagcodes[:rows[i]+1], startCodes))
+                starts[i] = matches[-1] if len(matches) > 0 else -1
+
+            keep = starts >= 0
+            start = np.concatenate((start, starts[keep]))
+            end = np.concatenate((end, rows[keep]))
+            code = np.concatenate((code, codes[keep]))
+            self._blocks = (len(self), start, end, code)
+
+        sel = slice(np.searchsorted(end, first), None)
+        return Blocks(start[sel], end[sel], code[sel])
+
+    def _invalidateBlocks(self, idx):
+        # drop cached blocks that might involve row ``idx``
+        if self._blocks is None:
+            return
+        if idx < 0:
+            idx += len(self)
+        (upto, start, end, code) = self._blocks
+        if idx >= upto:
+            return
+        # blocks closed before ``idx`` do not depend on it
+        keep = np.searchsorted(end, idx)
+        self._blocks = (idx, start[:keep], end[:keep], code[:keep])
+
+    def row(self, idx):
+        """
+        Return row ``idx`` as a ``[res, amp, pw, tag, readTag, Vread,
+        startIdx]`` list. The list is a copy; use `DeviceHistory.setTag`
+        or `DeviceHistory.setStartIndex` to modify the history.
+        """
+        i = self._index(idx)
+        data = self._data
+        vread = float(data['vread'][i])
+
+        return [float(data['resistance'][i]),
+                float(data['amplitude'][i]),
+                float(data['pulsewidth'][i]),
+                self._tags.tag(data['tagcode'][i]),
+                self._tags.tag(data['readtagcode'][i]),
+                None if np.isnan(vread) else vread,
+                int(data['startidx'][i])]
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            (start, stop, step) = key.indices(len(self))
+            if step != 1:
+                return [self.row(i) for i in range(start, stop, step)]
+            view = DeviceHistory.__new__(DeviceHistory)
+            view._tags = self._tags
+            view._data = self._data
+            view._start = self._start + start
+            view._stop = self._start + max(start, stop)
+            view._view = True
+            view._blocks = None
+            return view
+
+        return self.row(key)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def __reversed__(self):
+        for i in range(len(self)-1, -1, -1):
+            yield self.row(i)
+
+    def __repr__(self):
+        return "<DeviceHistory: %d entries>" % len(self)
+
+
+def emptyHistory(words=32, bits=32):
+    """
+    Generate a new, empty, history matrix for a ``words × bits`` crossbar.
+    Indexing is 1-based as with the rest of the application, so the matrix
+    is actually ``(words+1) × (bits+1)``.
+    """
+    return [[DeviceHistory() for bit in range(bits+1)] for word in range(words+1)]
@@ -2,8 +2,12 @@ from dataclasses import dataclass
 from abc import abstractmethod
 from serial import Serial, PARITY_EVEN, STOPBITS_ONE, serialutil
 import numpy as np
+import collections
+import threading
 import time
 import struct
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError, \
+    CancelledError
 
 
 @dataclass
@@ -17,6 +21,96 @@ class HWConfig:
     Vread: float = 0.5
 
 
+class InstrumentError(Exception):
+    """
+    Base class for communication errors with an instrument.
+    """
+    pass
+
+
+class ReadTimeout(InstrumentError):
+    """
+    Raised when the instrument does not respond within the read timeout.
+    """
+    pass
+
+
+class ReadCancelled(InstrumentError):
+    """
+    Raised when a pending read is cancelled with `ArC1.cancel`.
+    """
+    pass
+
+
+class RingBuffer:
+    """
+    Fixed capacity FIFO of bytes backed by a preallocated numpy array, so
+    that streaming data does not allocate a new buffer for every read.
+    """
+
+    def __init__(self, capacity):
+        self._buf = np.empty(capacity, dtype=np.uint8)
+        self._start = 0
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def capacity(self):
+        return len(self._buf)
+
+    @property
+    def free(self):
+        return len(self._buf) - self._len
+
+    def extend(self, data):
+        """
+        Append ``data``; it must fit in the free space of the buffer.
+        """
+        data = np.frombuffer(data, dtype=np.uint8)
+        if len(data) > self.free:
+            raise ValueError("Ring buffer overflow")
+        end = (self._start + self._len) % len(self._buf)
+        first = min(len(data), len(self._buf) - end)
+        self._buf[end:end+first] = data[:first]
+        self._buf[:len(data)-first] = data[first:]
+        self._len += len(data)
+
+    def peek(self, size):
+        """
+        Copy of the first ``size`` bytes, without consuming them.
+        """
+        size = min(size, self._len)
+        end = self._start + size
+        if end <= len(self._buf):
+            return self._buf[self._start:end].copy()
+        return np.concatenate((self._buf[self._start:],
+            self._buf[:end-len(self._buf)]))
+
+    def drop(self, size):
+        """
+        Consume the first ``size`` bytes.
+        """
+        size = min(size, self._len)
+        self._start = (self._start + size) % len(self._buf)
+        self._len -= size
+        if self._len == 0:
+            self._start = 0
+
+    def pop(self, size):
+        data = self.peek(size)
+        self.drop(size)
+        return data
+
+    def find(self, value):
+        """
+        Index of the first byte equal to ``value`` or -1.
+        """
+        idx = np.flatnonzero(self.peek(self._len) == value)
+        return int(idx[0]) if len(idx) > 0 else -1
+
+
 class Instrument:
 
 
@@ -28,6 +122,10 @@ class Instrument:
     def write_b(self, what):
         pass
 
+    @abstractmethod
+    def command(self, job, *params):
+        pass
+
     @abstractmethod
     def read_floats(self, how_many):
         pass
@@ -50,16 +148,67 @@ class Instrument:
 
 
 class ArC1(Instrument):
-
-    def __init__(self, port):
+    """
+    Driver for ArC ONE. All serial traffic goes through two background
+    threads owned by the instrument: a writer that sends everything queued
+    by `ArC1.write` (tokens queued while a write is in progress are sent
+    together in a single write) and a reader that continuously drains the
+    port into a ring buffer. Reads are requests that are fulfilled, in
+    order, by whoever brings in the data they need, and are handed back as
+    `concurrent.futures.Future` objects; the blocking read methods wait on
+    these futures.
+    """
+
+    # Reads wait in slices of this length (in s) so that they can be
+    # cancelled
+    POLL_INTERVAL = 0.1
+
+    # Size of the buffer incoming data is read into
+    STREAM_BUFFER_SIZE = 65536
+
+    # After an aborted read incoming data are discarded until the
+    # instrument has been quiet for this long (in s) ...
+    DRAIN_QUIET = 0.5
+    # ... or for at most this long if there is no read timeout
+    DRAIN_LIMIT = 10
+
+    def __init__(self, port, timeout=7):
         """
         Initialise an ArC ONE connected at the specified ``port`` which must be
         a platform-specific string that points to a serial port. For example
         ``COM5`` on Windows, ``/dev/ttyACM0`` on Linux or
-        ``/dev/tty.usbmodem12345`` on macOS.
+        ``/dev/tty.usbmodem12345`` on macOS. An already open object that
+        behaves like `serial.Serial` can also be used instead. Reads fail
+        with `ReadTimeout` if the instrument sends nothing for ``timeout``
+        seconds (or never if None).
         """
-        self._port = Serial(port, baudrate=921600, timeout=7, \
-                parity=PARITY_EVEN, stopbits=STOPBITS_ONE)
+        if isinstance(port, str):
+            self._port = Serial(port, baudrate=921600, timeout=self.POLL_INTERVAL, \
+                    parity=PARITY_EVEN, stopbits=STOPBITS_ONE)
+        else:
+            port.timeout = self.POLL_INTERVAL
+            self._port = port
+
+        self.timeout = timeout
+        self._cancelled = threading.Event()
+
+        # incoming data, pending read requests and the time data was last
+        # received; guarded by `_inCond`
+        self._stream = RingBuffer(self.STREAM_BUFFER_SIZE)
+        self._requests = collections.deque()
+        self._lastReceived = time.monotonic()
+        self._ioError = None
+        self._inCond = threading.Condition()
+
+        # outgoing data; guarded by `_outCond`
+        self._outgoing = bytearray()
+        self._outCond = threading.Condition()
+
+        self._stopping = False
+        self._threads = [threading.Thread(target=target, daemon=True) \
+            for target in (self._readerLoop, self._writerLoop)]
+        for thread in self._threads:
+            thread.start()
 
         # current firmware version. It's not available unless
         # explicitly queried. When that's done the value is cached
@@ -68,21 +217,43 @@ class ArC1(Instrument):
         # not supported by current firmware
         self._firmware = None
 
-    def write(self, *args):
+    def write(self, data):
         """
-        Write arguments to the serial port. This essentially wraps
-        `serial.Serial`.
+        Queue bytes to be written to the serial port by the I/O thread.
         """
-        if self._port is not None:
-            self._port.write(*args)
+        if self._port is None:
+            return
+        with self._outCond:
+            self._outgoing.extend(data)
+            self._outCond.notify()
 
     def write_b(self, what):
         """
         Write an encodable stream to the serial port. Argument ``what``
         should implement __bytes__ for this to work.
         """
-        if self._port is not None:
-            self._port.write(what.encode())
+        self.write(what.encode())
+
+    @staticmethod
+    def encode(job, *params):
+        """
+        Encode a job code followed by its parameters, one per line, into
+        the bytes `ArC1.command` would send. Values are formatted with
+        `str` so floats and ints go out exactly as they would if written
+        one by one. If ``job`` is None only the parameters are encoded.
+        Useful to prepare large payloads ahead of time and send them later
+        with `ArC1.write`.
+        """
+        tokens = [] if job is None else [job]
+        tokens.extend(params)
+        return ''.join('%s\n' % t for t in tokens).encode()
+
+    def command(self, job, *params):
+        """
+        Send a job header in a single write: the job code followed by its
+        parameters (see `ArC1.encode`).
+        """
+        self.write(self.encode(job, *params))
 
     def queue_select(self, word, bit):
         """
@@ -90,51 +261,44 @@ class ArC1(Instrument):
         select a device, as this is expected to be done separately from the
         module loaded just before.
         """
-        self.write_b("%d\n" % int(word))
-        self.write_b("%d\n" % int(bit))
+        self.command(None, int(word), int(bit))
 
     def select(self, word, bit):
         """
         Actively select a device. This will close the specified crosspoint
         """
-        self.write_b("02\n")
-        self.queue_select(word, bit)
+        self.command("02", int(word), int(bit))
 
     def read_one(self, word, bit):
         """
         Read resistance of device located at word, bit
         """
-        self.write_b("1\n")
-        self.queue_select(word, bit)
+        self.command("1", int(word), int(bit))
 
-        return float(self.read_floats(1))
+        return float(self.read_floats(1)[0])
 
     def pulseread_one(self, word, bit, voltage, pw):
         """
         Pulse a device at `word × bit` and read its value
         """
-        self.write_b("3\n")
-        self.queue_select(word, bit)
-
-        self.write_b("%f\n" % voltage)
-        self.write_b("%f\n" % pw)
+        self.command("3", int(word), int(bit), "%f" % voltage, "%f" % pw)
 
-        return float(self.read_floats(1))
+        return float(self.read_floats(1)[0])
 
     def pulse_active(self, voltage, pw):
         """
         Pulse currently selected device. Selection must be previously
-        done with `arc1pyqt.instrument.ArC1.select`.
+        done with `arc1pyqt.instrument.ArC1.select`. The instrument replies
+        with the resistance of the device after the pulse, which is left
+        to be read with `ArC1.read_floats`.
         """
-        self.write_b("04\n")
-        self.write_b("%f\n" % voltage)
-        self.write_b("%f\n" % pw)
+        self.command("04", "%f" % voltage, "%f" % pw)
 
     def reset(self):
         """
         Force an mbed reset
         """
-        self._port.write_b("00\n")
+        self.write_b("00\n")
         time.sleep(0.5)
 
     def initialise(self, config):
@@ -145,21 +309,17 @@ class ArC1(Instrument):
         self.write_b("00\n")
         time.sleep(1)
 
-        self.write_b("0\n")
-        self.write_b("%d\n" % config.cycles)
-        self.write_b("%d\n" % config.words)
-        self.write_b("%d\n" % config.bits)
-        self.write_b("%d\n" % config.readmode)
-        self.write_b("%d\n" % config.sessionmode)
-        self.write_b("%d\n" % config.sneakpath)
-        self.write_b("%f\n" % config.Vread)
+        self.command("0", "%d" % config.cycles, "%d" % config.words,
+            "%d" % config.bits, "%d" % config.readmode,
+            "%d" % config.sessionmode, "%d" % config.sneakpath,
+            "%f" % config.Vread)
 
         confirmation = 0
-        confirmation = int(self._port.readline())
+        confirmation = int(self.readline())
 
         if confirmation != 1:
             try:
-                self._port.close()
+                self.close()
             except serialutil.SerialException:
                 pass
             self._port = None
@@ -177,31 +337,30 @@ class ArC1(Instrument):
         if self._port is None:
             return
 
-        self.write_b("01\n")
         if config.Vread < 0 and config.readmode == 2:
-            self.write_b("3\n")
+            readmode = 3
         else:
-            self.write_b("%d\n" % config.readmode)
-        self.write_b("%f\n" % config.Vread)
+            readmode = config.readmode
+        self.command("01", "%d" % readmode, "%f" % config.Vread)
 
     def firmware_version(self, force=False):
 
         if (not force) and (self._firmware is not None):
             return self._firmware
 
-        timeout = self._port.timeout
         try:
-            self._port.timeout = 2
             time.sleep(0.2)
-            self._port.write(b"999\n")
-            data = self._port.read(size=4)
+            self.write(b"999\n")
+            request = self._request(self._takeBytes(4))
+            try:
+                data = request.result(timeout=2)
+            finally:
+                request.cancel()
             (major, minor) = struct.unpack("2H", data)
             ret = (major, minor)
         except Exception as exc:
             ret = (-1, -1)
 
-        # restore timeout
-        self._port.timeout = timeout
         self._firmware = ret
 
         return ret
@@ -215,33 +374,272 @@ class ArC1(Instrument):
 
     def close(self):
         """
-        Disconnect from the tool closing the serial port.
+        Disconnect from the tool closing the serial port. Any pending read
+        is cancelled.
         """
         if self._port is None:
             return
+        self.cancel()
+
+        self._stopping = True
+        with self._outCond:
+            self._outCond.notify_all()
+        with self._inCond:
+            self._inCond.notify_all()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join()
+
         self._port.close()
         self._port = None
 
+    def cancel(self):
+        """
+        Abort all reads currently waiting for data and every read that
+        follows until `ArC1.clearCancel` is called; they raise
+        `ReadCancelled`. This can be called from any thread.
+        """
+        self._cancelled.set()
+        with self._inCond:
+            for (_, future) in self._requests:
+                future.cancel()
+            self._inCond.notify_all()
+
+    def clearCancel(self):
+        """
+        Allow reads again after `ArC1.cancel`. Typically called once the
+        operation that was cancelled has wound down.
+        """
+        self._cancelled.clear()
+
+    ################################################## I/O THREADS ####
+    def _writerLoop(self):
+        while True:
+            with self._outCond:
+                self._outCond.wait_for(lambda: len(self._outgoing) > 0 or \
+                    self._stopping)
+                if len(self._outgoing) == 0:
+                    return
+                (data, self._outgoing) = (bytes(self._outgoing), bytearray())
+            try:
+                self._port.write(data)
+            except serialutil.SerialException as exc:
+                self._fail(exc)
+                return
+
+    def _readerLoop(self):
+        port = self._port
+        while not self._stopping:
+            with self._inCond:
+                # wait for room if nobody is consuming what's read
+                self._inCond.wait_for(lambda: self._stream.free > 0 or \
+                    self._stopping)
+                free = self._stream.free
+            if self._stopping:
+                return
+
+            try:
+                data = port.read(size=min(max(port.inWaiting(), 1), free))
+            except serialutil.SerialException as exc:
+                if not self._stopping:
+                    self._fail(exc)
+                return
+
+            if len(data) > 0:
+                with self._inCond:
+                    self._stream.extend(data)
+                    self._lastReceived = time.monotonic()
+                    self._service()
+                    self._inCond.notify_all()
+
+    def _fail(self, exc):
+        with self._inCond:
+            self._ioError = exc
+            self._inCond.notify_all()
+
+    ################################################## READ REQUESTS ##
+    def _request(self, take):
+        """
+        Queue a read request. ``take`` is called with the input buffer
+        whenever data arrives, until it returns something other than None,
+        which becomes the result of the returned future.
+        """
+        future = Future()
+        with self._inCond:
+            self._requests.append((take, future))
+            self._service()
+        return future
+
+    def _service(self):
+        # fulfil pending requests in order; called with `_inCond` held
+        while len(self._requests) > 0:
+            (take, future) = self._requests[0]
+            if future.cancelled():
+                self._requests.popleft()
+                continue
+            result = take(self._stream)
+            if result is None:
+                break
+            self._requests.popleft()
+            future.set_result(result)
+        # consuming data frees up room for the reader
+        self._inCond.notify_all()
+
+    def _wait(self, future):
+        """
+        Wait for the result of read request ``future``, raising
+        `ReadTimeout` if no data arrives for `timeout` seconds and
+        `ReadCancelled` on `ArC1.cancel`.
+        """
+        start = time.monotonic()
+        while True:
+            if self._cancelled.is_set():
+                future.cancel()
+            try:
+                return future.result(timeout=self.POLL_INTERVAL)
+            except FutureTimeoutError:
+                pass
+            except CancelledError:
+                self._drain()
+                raise ReadCancelled("Read from %s cancelled" % \
+                    self.__class__.__name__)
+
+            with self._inCond:
+                if self._ioError is not None:
+                    future.cancel()
+                    raise InstrumentError("Connection to %s lost: %s" % \
+                        (self.__class__.__name__, self._ioError))
+                idle = time.monotonic() - max(self._lastReceived, start)
+                timedOut = self.timeout is not None and \
+                    idle > self.timeout and future.cancel()
+            if timedOut:
+                self._drain()
+                raise ReadTimeout("%s sent no data for %g s; the "
+                    "instrument might have stalled" % \
+                    (self.__class__.__name__, self.timeout))
+
+    def _drain(self):
+        # After an aborted read whatever the instrument has sent, or is
+        # still sending for the aborted job, no longer lines up with what
+        # the next read expects; discard everything until the instrument
+        # goes quiet, unless other reads are still waiting for data
+        start = time.monotonic()
+        limit = self.timeout if self.timeout is not None else self.DRAIN_LIMIT
+        with self._inCond:
+            if any(not future.cancelled() for (_, future) in self._requests):
+                return
+            self._requests.clear()
+            while True:
+                self._stream.drop(len(self._stream))
+                # room has been freed up for the reader
+                self._inCond.notify_all()
+                now = time.monotonic()
+                quiet = now - max(self._lastReceived, start)
+                if quiet >= self.DRAIN_QUIET or now - start >= limit or \
+                        self._stopping or self._ioError is not None:
+                    break
+                self._inCond.wait(self.DRAIN_QUIET - quiet)
+            try:
+                self._port.reset_input_buffer()
+            except (AttributeError, serialutil.SerialException):
+                pass
+
+    def _takeBytes(self, size):
+        buf = bytearray()
+        def take(stream):
+            buf.extend(stream.pop(size - len(buf)))
+            return bytes(buf) if len(buf) >= size else None
+        return take
+
+    def _takeLine(self):
+        buf = bytearray()
+        def take(stream):
+            idx = stream.find(ord('\n'))
+            buf.extend(stream.pop(len(stream) if idx < 0 else idx+1))
+            return bytes(buf) if idx >= 0 else None
+        return take
+
+    def _takeRecords(self, width, terminated):
+        # complete records, up to an all-zero one if ``terminated``;
+        # returns (records, whether the terminating record was found)
+        size = 4*width
+        def take(stream):
+            count = len(stream) // size
+            if count == 0:
+                return None
+            block = np.frombuffer(stream.peek(count*size), dtype=np.float32)
+            block = block.reshape(count, width)
+            if terminated:
+                ends = np.flatnonzero(~block.any(axis=1))
+                if len(ends) > 0:
+                    end = int(ends[0])
+                    stream.drop((end+1)*size)
+                    return (block[:end], True)
+            stream.drop(count*size)
+            return (block, False)
+        return take
+
+    def read_floats_async(self, how_many):
+        """
+        Request a number of floating point numbers from the serial port.
+        Returns a `concurrent.futures.Future` holding them.
+        """
+        take = self._takeBytes(how_many*4)
+        def takeFloats(stream):
+            data = take(stream)
+            if data is None:
+                return None
+            return np.frombuffer(memoryview(data), dtype=np.float32)
+        return self._request(takeFloats)
+
     def read_floats(self, how_many):
         """
         Read a number of floating point numbers from the serial port.
+        Raises `ReadTimeout` if the instrument stalls and `ReadCancelled`
+        if the read is cancelled with `ArC1.cancel`.
         """
         if self._port is None:
             return
 
-        while self._port.inWaiting() < how_many*4:
-            pass
+        return self._wait(self.read_floats_async(how_many))
 
-        values = self._port.read(size=how_many*4)
-        buf = memoryview(values)
+    def readline(self):
+        """
+        Read a string up to a line terminator. Raises the same exceptions
+        as `ArC1.read_floats`.
+        """
+        if self._port is None:
+            return
 
-        return np.frombuffer(buf, dtype=np.float32)
+        return self._wait(self._request(self._takeLine()))
 
-    def readline(self):
+    def read_records(self, width=3):
         """
-        Read a string up to a line terminator
+        Read all the complete records of ``width`` floats the instrument
+        has sent so far as a ``N×width`` array, waiting for at least one.
+        Raises the same exceptions as `ArC1.read_floats`.
         """
         if self._port is None:
             return
 
-        return self._port.readline()
+        (block, _) = self._wait(self._request(self._takeRecords(width, False)))
+        return block
+
+    def records(self, width=3):
+        """
+        Iterate over blocks of records (see `ArC1.read_records`) until the
+        all-zero record the firmware uses to terminate a stream of
+        measurements. The terminating record is consumed but not returned;
+        anything sent after it is kept for subsequent reads.
+
+        >>> for block in HW.ArC.records(3):
+        >>>     for (res, amp, pw) in block:
+        >>>         ...
+        """
+        while True:
+            request = self._request(self._takeRecords(width, True))
+            (block, done) = self._wait(request)
+            if len(block) > 0:
+                yield block
+            if done:
+                return
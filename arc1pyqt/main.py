@@ -14,12 +14,11 @@ Main module of ArC One Control Panel
 
 import sys
 import os
+import io
 import serial
 import pkgutil
-import csv
 import time
 import subprocess
-import gzip
 import types
 import warnings
 from functools import partial
@@ -44,9 +43,11 @@ from .ControlWidgets import AboutWidget
 from .ControlWidgets import ModulePathWidget
 from .Globals import fonts, styles, functions
 from . import modutils
+from . import sessionio
 from .instrument import ArC1
 from .version import VersionInfo, vercmp
 from .VirtualArC import VirtualArC
+from .VirtualArC import models as virtualModels
 from . import Graphics
 from . import ProgPanels
 
@@ -72,6 +73,39 @@ if sys.platform == "win32":
     ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
 
 
+class SaveSessionWorker(QtCore.QObject):
+    """
+    Runs one of the session writers of `arc1pyqt.sessionio` (any function
+    that accepts ``progress`` and ``cancelled`` keyword arguments) off the
+    GUI thread.
+    """
+
+    progress = QtCore.pyqtSignal(int)
+    """ Percentage of the session saved so far """
+    finished = QtCore.pyqtSignal(bool, str)
+    """ Saving has finished; whether it completed and any error message """
+
+    def __init__(self, func, *args, **kwargs):
+        super().__init__()
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self._cancelled = False
+
+    def cancel(self):
+        # called directly from the GUI thread; the worker thread is busy
+        # running `run` so a queued slot would never be serviced
+        self._cancelled = True
+
+    def run(self):
+        try:
+            completed = self.func(*self.args, progress=self.progress.emit,
+                cancelled=lambda: self._cancelled, **self.kwargs)
+            self.finished.emit(completed, '')
+        except Exception as exc:
+            self.finished.emit(False, str(exc))
+
+
 class Arcontrol(QtWidgets.QMainWindow):
 
     def __init__(self):
@@ -123,6 +157,13 @@ class Arcontrol(QtWidgets.QMainWindow):
         self.saveAsAction.setStatusTip('Save session as...')
         self.saveAsAction.triggered.connect(partial(self.saveSession, new=True))
 
+        # stays enabled while the rest of the interface is locked by a
+        # running module
+        stopAction = QtWidgets.QAction('Stop operation', self)
+        stopAction.setShortcut('Esc')
+        stopAction.setStatusTip('Abort the operation currently running')
+        stopAction.triggered.connect(self.stopOperation)
+
         exitAction = QtWidgets.QAction('Exit', self)
         exitAction.setShortcut('Ctrl+Q')
         exitAction.setStatusTip('Exit application')
@@ -136,6 +177,7 @@ class Arcontrol(QtWidgets.QMainWindow):
         fileMenu.addAction(self.saveAction)
         fileMenu.addAction(self.saveAsAction)
         fileMenu.addSeparator()
+        fileMenu.addAction(stopAction)
         fileMenu.addSeparator()
         fileMenu.addAction(exitAction)
 
@@ -181,6 +223,65 @@ class Arcontrol(QtWidgets.QMainWindow):
         self.displayModeGroup.addAction(displayAbsCurrentAction)
         displayResistanceAction.setChecked(True)
 
+        compressionMenu = QtWidgets.QMenu('Compression level', self)
+        compressionMenu.setStatusTip('Compression level of compressed session files')
+        self.compressionGroup = QtWidgets.QActionGroup(self)
+        self.compressionGroup.setExclusive(True)
+        for level in range(1, 10):
+            label = { 1: '1 (fastest)', 9: '9 (smallest)' }.get(level, str(level))
+            levelAction = QtWidgets.QAction(label, self)
+            levelAction.setCheckable(True)
+            levelAction.setChecked(level == APP.compressionLevel)
+            levelAction.triggered.connect(partial(self.compressionLevelChanged,
+                level=level))
+            self.compressionGroup.addAction(levelAction)
+            compressionMenu.addAction(levelAction)
+
+        timeoutMenu = QtWidgets.QMenu('Read timeout', self)
+        timeoutMenu.setStatusTip('Abort operations if ArC ONE sends no data for this long')
+        self.timeoutGroup = QtWidgets.QActionGroup(self)
+        self.timeoutGroup.setExclusive(True)
+        for timeout in [2, 7, 30, 120, None]:
+            label = 'Never' if timeout is None else '%d s' % timeout
+            timeoutAction = QtWidgets.QAction(label, self)
+            timeoutAction.setCheckable(True)
+            timeoutAction.setChecked(timeout == APP.readTimeout)
+            timeoutAction.triggered.connect(partial(self.readTimeoutChanged,
+                timeout=timeout))
+            self.timeoutGroup.addAction(timeoutAction)
+            timeoutMenu.addAction(timeoutAction)
+
+        imageCrossbarAction = QtWidgets.QAction('Fast crossbar view', self)
+        imageCrossbarAction.setStatusTip('Draw the crossbar as a single image')
+        imageCrossbarAction.setCheckable(True)
+        imageCrossbarAction.setChecked(APP.imageCrossbar)
+        imageCrossbarAction.toggled.connect(self.imageCrossbarToggled)
+
+        virtualMenu = QtWidgets.QMenu('Virtual device model', self)
+        virtualMenu.setStatusTip('Device model emulated by VirtualArC')
+        self.virtualModelGroup = QtWidgets.QActionGroup(self)
+        self.virtualModelGroup.setExclusive(True)
+        for name in sorted(virtualModels.keys()):
+            modelAction = QtWidgets.QAction(name.capitalize(), self)
+            modelAction.setCheckable(True)
+            modelAction.setChecked(name == APP.virtualModel)
+            modelAction.triggered.connect(partial(self.virtualModelChanged,
+                model=name))
+            self.virtualModelGroup.addAction(modelAction)
+            virtualMenu.addAction(modelAction)
+        virtualMenu.addSeparator()
+        self.virtualVariationGroup = QtWidgets.QActionGroup(self)
+        self.virtualVariationGroup.setExclusive(True)
+        for variation in [0.0, 0.05, 0.1, 0.2]:
+            variationAction = QtWidgets.QAction('%d%% device variation' % \
+                (100*variation), self)
+            variationAction.setCheckable(True)
+            variationAction.setChecked(variation == APP.virtualVariation)
+            variationAction.triggered.connect(partial(self.virtualVariationChanged,
+                variation=variation))
+            self.virtualVariationGroup.addAction(variationAction)
+            virtualMenu.addAction(variationAction)
+
         configAction = QtWidgets.QAction('Modify hardware settings', self)
         configAction.setStatusTip('Modify hardware settings')
         configAction.triggered.connect(self.showConfig)
@@ -191,6 +292,10 @@ class Arcontrol(QtWidgets.QMainWindow):
         # Populate settings menu
         settingsMenu.addAction(configAction)
         settingsMenu.addAction(setCWDAction)
+        settingsMenu.addMenu(compressionMenu)
+        settingsMenu.addMenu(timeoutMenu)
+        settingsMenu.addAction(imageCrossbarAction)
+        settingsMenu.addMenu(virtualMenu)
         settingsMenu.addSeparator()
         #settingsMenu.addSeparator()
         settingsMenu.addAction(openModuleDirAction)
@@ -411,6 +516,28 @@ class Arcontrol(QtWidgets.QMainWindow):
         APP.displayMode = mode
         functions.displayUpdate.cast()
 
+    def compressionLevelChanged(self, _, level):
+        APP.compressionLevel = level
+
+    def readTimeoutChanged(self, _, timeout):
+        APP.readTimeout = timeout
+        if HW.ArC is not None:
+            HW.ArC.timeout = timeout
+
+    def stopOperation(self):
+        self.pp.stop()
+
+    def virtualModelChanged(self, _, model):
+        # takes effect the next time VirtualArC is connected
+        APP.virtualModel = model
+
+    def virtualVariationChanged(self, _, variation):
+        APP.virtualVariation = variation
+
+    def imageCrossbarToggled(self, checked):
+        APP.imageCrossbar = checked
+        self.redrawCrossbar()
+
     def showConfig(self):
         from .ControlWidgets import ConfigHardwareWidget
         self.cfgHW = ConfigHardwareWidget()
@@ -625,13 +752,10 @@ class Arcontrol(QtWidgets.QMainWindow):
             pass
 
 
-    def _loadCSV(self, csvfile, filesize, filename):
-
-        bytecount = lambda x: len(x.encode())
-
-        bytesLoaded = 0
-        rdr = csv.reader(csvfile)
-        delimiter_size = len(rdr.dialect.lineterminator.encode())
+    def _loadCSV(self, csvfile, raw, filename):
+        # ``raw`` is the file ``csvfile`` ultimately reads from; progress
+        # is its position, so that it is accurate for compressed files
+        # as well
 
         error = 0
 
@@ -645,54 +769,78 @@ class Arcontrol(QtWidgets.QMainWindow):
         dialog.setBar(bar)
         dialog.setCancelButton(None)
 
-        for (counter, values) in enumerate(rdr):
-            if (counter == 0):
-                APP.sessionName=str(values[0])
-                functions.historyTreeAntenna.changeSessionName.emit()
-            else:
-                if counter > 2:
-                    try:
-                        w = int(values[0])
-                        b = int(values[1])
-                        m = float(values[2])
-                        a = float(values[3])
-                        pw = float(values[4])
-                        tag = str(values[5])
-                        readTag = str(values[6])
-                        readVoltage = float(values[7])
-                        CB.append(w, b, m, a, pw, str(tag), readTag, readVoltage)
-
-                        # ignore Read All points
-                        if 'S R' in tag or tag[-1]=='e' or tag == 'P':
-                            functions.historyTreeAntenna.updateTree.emit(w, b)
-                    except ValueError:
-                        error = 1
-
-            # find the byte size of the values + the byte size of the delimiter + the commas
-            bytesLoaded += sum(map(bytecount, values)) + delimiter_size + len(values) - 1
-            progress = int((bytesLoaded/filesize)*100)
-            dialog.setValue(progress)
+        try:
+            APP.sessionName = sessionio.readCSVHeader(csvfile)
+            functions.historyTreeAntenna.changeSessionName.emit()
+        except ValueError:
+            return 1
+
+        # devices in order of appearance; their tree is built once at the end
+        touched = {}
+
+        # rows are parsed and inserted in bulk, one chunk at a time
+        for (blocks, chunkError) in sessionio.iterCSVBlocks(csvfile):
+            if chunkError:
+                error = 1
+            for blk in blocks:
+                CB.extendCodes(blk.w, blk.b, blk.res, blk.amp, blk.pw,
+                    blk.tags, blk.readTags, blk.vread)
+                touched[(blk.w, blk.b)] = True
+
+            # progress is only updated once per chunk
+            try:
+                progress = int((raw.tell()/os.fstat(raw.fileno()).st_size)*100)
+                dialog.setValue(min(progress, 99))
+            except (OSError, ZeroDivisionError):
+                pass
+
+        for (w, b) in touched.keys():
+            functions.historyTreeAntenna.rebuildTreeTopLevel.emit(w, b)
 
         dialog.setValue(100)
         return error
 
+    def _loadBinary(self, path):
+
+        try:
+            session = sessionio.BinarySession(path)
+        except (ValueError, KeyError, OSError) as exc:
+            print("Error when opening binary session:", exc)
+            return 1
+
+        APP.sessionName = session.sessionName
+        functions.historyTreeAntenna.changeSessionName.emit()
+
+        # column data are memory-mapped so nothing is actually read
+        # from disk until a device's data are requested
+        lut = session.tagLUT()
+        error = 0
+
+        for (w, b) in session.devices:
+            if w < 1 or w >= len(CB.history) or b < 1 or b >= len(CB.history[w]):
+                error = 1
+                continue
+            CB.history[w][b] = session.history(w, b, lut=lut)
+            # tree entries are only populated when expanded
+            functions.historyTreeAntenna.rebuildTreeTopLevel.emit(w, b)
+
+        return error
+
     def findAndLoadFile(self):
 
         path = QtWidgets.QFileDialog.getOpenFileName(self, 'Open File',
-            filter=constants.OPEN_FI_PATTERN)[0]
+            filter=self._fileFilter(constants.OPEN_FI_PATTERN))[0]
 
         if not os.path.isfile(path):
             return
 
-        if path.endswith('.gz'):
-            opener = gzip.open
-            filesize = functions.gzipFileSize(path)
+        if path.endswith(sessionio.BINARY_SUFFIX):
+            error = self._loadBinary(path)
         else:
-            opener = open
-            filesize = os.stat(path).st_size
-
-        with opener(path, 'rt') as csvfile:
-            error = self._loadCSV(csvfile, filesize, os.path.basename(path))
+            with open(path, 'rb') as raw:
+                csvfile = io.TextIOWrapper(sessionio.openCompressed(path,
+                    'rb', fileobj=raw), encoding='utf-8')
+                error = self._loadCSV(csvfile, raw, os.path.basename(path))
 
         # check if positions read are correct
         if (error):
@@ -714,7 +862,9 @@ class Arcontrol(QtWidgets.QMainWindow):
             return True
 
     def deleteAllData(self):
-        CB.history=[[[] for bit in range(33)] for word in range(33)]
+        CB.clear()
+        if APP.journal is not None:
+            APP.journal.reset(APP.sessionName)
 
         if CB.customArray:
             for w in range(1,HW.conf.words+1):
@@ -747,46 +897,202 @@ class Arcontrol(QtWidgets.QMainWindow):
                 path = APP.workingDirectory
             else:
                 path_ = QtCore.QFileInfo(QtWidgets.QFileDialog.getSaveFileName(self, \
-                    'Save File', APP.workingDirectory, constants.SAVE_FI_PATTERN)[0])
+                    'Save File', APP.workingDirectory,
+                    self._fileFilter(constants.SAVE_FI_PATTERN))[0])
                 path = path_.filePath()
                 APP.saveFileName = path_.fileName()
                 APP.workingDirectory = path_.filePath()
         else:
             path_ = QtCore.QFileInfo(QtWidgets.QFileDialog.getSaveFileName(self, \
-                'Save File', '', constants.SAVE_FI_PATTERN)[0])
+                'Save File', '', self._fileFilter(constants.SAVE_FI_PATTERN))[0])
             path = path_.filePath()
             APP.saveFileName=path_.fileName()
             APP.workingDirectory=path_.filePath()
 
-        if len(path) > 0:
-            if str(path).endswith('csv.gz'):
-                opener = gzip.open
-            else:
-                opener = open
-
-            with opener(str(path), 'w', newline='') as stream:
-                writer = csv.writer(stream)
-
-                # Header
-                writer.writerow([APP.sessionName])
-                writer.writerow([time.strftime("%c")])
-                writer.writerow(['Wordline', 'Bitline', 'Resistance', 'Amplitude (V)',
-                    'Pulse width (s)', 'Tag', 'ReadTag', 'ReadVoltage'])
-
-                # Actual data
-                for w in range(1,HW.conf.words+1):
-                    for b in range(1,HW.conf.bits+1):
-                        for row in range(len(CB.history[w][b])):
-                            rowdata = [w, b]
-                            # drop the start index, it's ephemeral
-                            # and it's only needed for runtime
-                            for item in CB.history[w][b][row][:-1]:
-                                if item is not None:
-                                    rowdata.append(item)
-                                else:
-                                    rowdata.append('')
-                            writer.writerow(rowdata)
+        if len(path) > 0 and str(path).endswith(sessionio.BINARY_SUFFIX):
+            self._saveBinary(str(path))
+        elif len(path) > 0 and self._journalComplete():
+            # everything is already in the journal; just regroup it
+            APP.journal.flush()
+            self._saveInBackground(str(path), sessionio.compactJournal,
+                APP.journal.path, str(path), APP.sessionName,
+                time.strftime("%c"), level=APP.compressionLevel)
+        elif len(path) > 0:
+            self._saveInBackground(str(path), sessionio.writeCSV, str(path),
+                APP.sessionName, time.strftime("%c"), CB.history,
+                HW.conf.words, HW.conf.bits, level=APP.compressionLevel)
+
+    def _saveInBackground(self, path, func, *args, **kwargs):
+
+        dialog = QtWidgets.QProgressDialog("Saving file <b>%s</b>…" % \
+                os.path.basename(path), "Cancel", 0, 100, parent=self)
+        bar = QtWidgets.QProgressBar()
+        bar.setStyleSheet(styles.progressBarStyle)
+        dialog.setWindowModality(QtCore.Qt.WindowModal)
+        dialog.setWindowTitle("Saving file")
+        dialog.setWindowIcon(Graphics.getIcon('appicon'))
+        dialog.setBar(bar)
+        dialog.setAutoClose(False)
+        dialog.setAutoReset(False)
+
+        worker = SaveSessionWorker(func, *args, **kwargs)
+        thread = QtCore.QThread()
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.progress.connect(dialog.setValue)
+        worker.finished.connect(thread.quit)
+        worker.finished.connect(partial(self._saveFinished, dialog))
+        thread.finished.connect(self._onSaveThreadFinished)
+        dialog.canceled.connect(lambda: worker.cancel())
+
+        # keep references around until saving is done
+        self._saveJob = (thread, worker)
+        thread.start()
+        dialog.show()
+
+    def _saveFinished(self, dialog, completed, error):
+        dialog.close()
+
+        if completed:
             self.saveAction.setEnabled(False)
+        elif len(error) > 0:
+            errMessage = QtWidgets.QMessageBox()
+            errMessage.setText("Could not save session: %s" % error)
+            errMessage.setIcon(QtWidgets.QMessageBox.Critical)
+            errMessage.setWindowTitle("Error")
+            errMessage.exec_()
+
+    def _onSaveThreadFinished(self):
+        """ Clean up after the saving thread has exited """
+        if self._saveJob is None:
+            return
+        (thread, worker) = self._saveJob
+        thread.wait()
+        worker.deleteLater()
+        self._saveJob = None
+
+    def _fileFilter(self, pattern):
+        # session files compressed with Zstandard are only supported
+        # if the `zstandard` package is installed
+        if sessionio.zstandard is None:
+            return pattern
+        if pattern == constants.SAVE_FI_PATTERN:
+            return pattern + ';;' + constants.ZSTD_SAVE_FI_PATTERN
+        return pattern.replace('*.csv.gz', '*.csv.gz *.csv.zst')
+
+    def _journalComplete(self):
+        # The journal only holds data that went through
+        # `functions.updateHistory` since the session was last cleared
+        # or recovered; it can only stand in for the session if that's
+        # all the data there is
+        if APP.journal is None:
+            return False
+        total = sum(len(CB.history[w][b]) for w in range(1, HW.conf.words+1) \
+            for b in range(1, HW.conf.bits+1))
+        return APP.journal.rows == total and \
+            total == sum(len(h) for row in CB.history for h in row)
+
+    def startJournal(self, directory):
+        """
+        Start autosaving to a journal of this process under ``directory``.
+        Every journal is accompanied by a lock file held for as long as its
+        process runs; journals whose lock is not held were left behind by
+        an instance that did not exit cleanly and the user is offered to
+        recover them.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self._journalLock = None
+
+        # a lock for this pid might be around if it has been recycled from
+        # another instance still running; pick another name then
+        for attempt in range(10):
+            suffix = '' if attempt == 0 else '-%d' % attempt
+            path = os.path.join(directory, 'autosave-%d%s.csv' % \
+                (os.getpid(), suffix))
+            lock = QtCore.QLockFile(path + '.lock')
+            lock.setStaleLockTime(0)
+            if lock.tryLock(0):
+                self._journalLock = lock
+                break
+
+        if self._journalLock is None:
+            print("Could not lock an autosave journal in %s; autosaving "
+                "is disabled" % directory)
+            APP.journal = None
+            return
+
+        APP.journal = sessionio.Journal(path)
+
+        orphans = sorted((os.path.join(directory, f) for f in \
+            os.listdir(directory) if f.startswith('autosave') and \
+            f.endswith('.csv')), key=os.path.getmtime, reverse=True)
+
+        for orphan in orphans:
+            if orphan == path:
+                continue
+            lock = QtCore.QLockFile(orphan + '.lock')
+            lock.setStaleLockTime(0)
+            # still in use by a running instance
+            if not lock.tryLock(0):
+                continue
+            try:
+                if self._recoverJournal(orphan, path):
+                    return
+            finally:
+                lock.unlock()
+
+        APP.journal.reset(APP.sessionName)
+
+    def stopJournal(self):
+        """
+        Close and remove the journal of this process and release its lock.
+        """
+        if APP.journal is None:
+            return
+        APP.journal.close(remove=True)
+        APP.journal = None
+        self._journalLock.unlock()
+
+    def _recoverJournal(self, orphan, path):
+        # Offer to recover the abandoned journal ``orphan``. If accepted it
+        # is loaded and becomes the journal of this process at ``path``,
+        # otherwise it is removed. Returns whether it was recovered.
+        if os.path.getsize(orphan) == 0 or \
+                QtWidgets.QMessageBox.question(self, "Recover session",
+                "Data from a session that was not closed properly were found. "
+                "Do you want to recover them?",
+                QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No) != \
+                QtWidgets.QMessageBox.Yes:
+            os.remove(orphan)
+            return False
+
+        os.replace(orphan, path)
+        if APP.journal.resume() == 0:
+            return False
+
+        with open(path, 'rt') as csvfile:
+            self._loadCSV(csvfile, csvfile.buffer,
+                os.path.basename(path))
+        for w in range(1, HW.conf.words+1):
+            for b in range(1, HW.conf.bits+1):
+                if CB.history[w][b]:
+                    functions.cbAntenna.recolor.emit(CB.history[w][b][-1][0],w,b)
+        self.saveAction.setEnabled(True)
+        return True
+
+    def _saveBinary(self, path):
+        args = (path, APP.sessionName, time.strftime("%c"), CB.history,
+            HW.conf.words, HW.conf.bits)
+        try:
+            sessionio.writeBinary(*args)
+        except PermissionError:
+            # Memory-mapped files cannot be replaced on some platforms;
+            # move all data into memory and try again
+            for row in CB.history:
+                for history in row:
+                    history.detach()
+            sessionio.writeBinary(*args)
+        self.saveAction.setEnabled(False)
 
     def closeEvent(self, evt):
         reply = QtWidgets.QMessageBox.question(self, "Exit Application",
@@ -819,11 +1125,13 @@ class Arcontrol(QtWidgets.QMainWindow):
 
         port = self.comPorts.currentText()
         if port == "VirtualArC":
-            HW.ArC = VirtualArC()
+            HW.ArC = VirtualArC(model=APP.virtualModel,
+                variation=APP.virtualVariation, seed=APP.virtualSeed,
+                timeout=APP.readTimeout)
             return
 
         try:
-            HW.ArC = ArC1(port)
+            HW.ArC = ArC1(port, timeout=APP.readTimeout)
             HW.ArC.initialise(HW.conf)
             functions.interfaceAntenna.changeArcStatus.emit('Ready')
 
@@ -915,6 +1223,13 @@ def main():
     APP.scalingFactor=float(monitor_height)/1200
 
     ex = Arcontrol()
+
+    # Autosave journal; a clean exit removes it, so finding an unlocked
+    # one at startup means that a previous session crashed
+    ex.startJournal(QStandardPaths.writableLocation(
+        QStandardPaths.AppDataLocation))
+    app.aboutToQuit.connect(ex.stopJournal)
+
     sys.exit(app.exec_())
 
 
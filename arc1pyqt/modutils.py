@@ -7,6 +7,9 @@ import importlib.util as imputil
 from glob import glob
 from functools import partial
 import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 
 from PyQt5 import QtGui, QtCore, QtWidgets
 
@@ -16,10 +19,12 @@ HW = state.hardware
 CB = state.crossbar
 
 from .Globals import styles, functions
+from .instrument import InstrumentError
 
 
 ModDescriptor = collections.namedtuple('ModDescriptor', \
-        ['module', 'name', 'display', 'toplevel', 'callback'])
+        ['module', 'name', 'display', 'toplevel', 'callback', 'prepare'],
+        defaults=[None])
 """
 ModDescriptor describes everything the interface needs to create
 programming panels. The fields of this named tuple are
@@ -29,12 +34,14 @@ programming panels. The fields of this named tuple are
 * ``display``: display label for the tree
 * ``toplevel``: toplevel widget for the toplevel tag; can be ``None``
 * ``callback``: callback for data display; can be ``None``
+* ``prepare``: data preparation step for ``callback``; can be ``None``
 
 Users typically don't need to make descriptors. They will be created
 accordingly on program load.
 """
 
-ModTag = collections.namedtuple('ModTag', ['tag', 'name', 'callback'])
+ModTag = collections.namedtuple('ModTag', ['tag', 'name', 'callback', 'prepare'],
+        defaults=[None])
 """
 A module tag. Every module needs to provide a toplevel tag under a module-local
 variable named ``tags``. For instance a module named `TestModule` may have
@@ -53,6 +60,19 @@ if no such functionality is wanted (probably for most cases).
 >>>     'subtags': [ ModTag('TSM', 'TestSubModule', TestModule.subModData) ]
 >>> }
 
+The data display callback is called as ``callback(w, b, data, parent)``
+with ``data`` being the history rows of the block (a
+`arc1pyqt.history.DeviceHistory` view) and must return a widget. Modules
+that need to process the data before plotting them should do so in a
+separate ``prepare(w, b, data)`` step which is given as the optional fourth
+field of the tag. This is run on a worker thread, must not touch the
+interface and its return value is passed to ``callback`` in place of
+``data``. Prepared results are cached (see `ResultCache`) so opening the
+same results again is instant.
+
+>>> tags = { 'top': ModTag('TM', 'TestModule', TestModule.showData,
+>>>     TestModule.prepareData) }
+
 """
 
 
@@ -72,7 +92,8 @@ def __registerTagsFromModule(module, kls=None):
     else:
         display = top.name
 
-    descriptor = ModDescriptor(module, top.name, display, kls, top.callback)
+    descriptor = ModDescriptor(module, top.name, display, kls, top.callback,
+            top.prepare)
     APP.modules[top.tag] = descriptor
 
     if 'subtags' not in module.tags.keys():
@@ -84,7 +105,7 @@ def __registerTagsFromModule(module, kls=None):
         else:
             display = tag.name
         descriptor = ModDescriptor(module, tag.name, display, None,\
-                tag.callback)
+                tag.callback, tag.prepare)
         APP.modules[tag.tag] = descriptor
 
 
@@ -281,7 +302,6 @@ class BaseProgPanel(QtWidgets.QWidget):
         self.short = short
         self.propertyWidgets = {}
         self.thread = None
-        self._deferredUpdates = {}
 
     def execute(self, wrapper, entrypoint=None, deferredUpdate=False):
         """
@@ -305,18 +325,18 @@ class BaseProgPanel(QtWidgets.QWidget):
         self.threadWrapper = wrapper
         self.thread = QtCore.QThread()
 
-        # When deferring tree updates store current point in history for the
-        # whole crossbar. Once the operation is finished the history tree will
-        # then be populated starting from this point in history
+        # When deferring tree updates start tracking which devices receive
+        # new measurements. Once the operation is finished the history tree
+        # will then be populated for these devices only, starting from their
+        # first new row
         if deferredUpdate:
-            for (r, row) in enumerate(CB.history):
-                for (c, col) in enumerate(row):
-                    self._deferredUpdates['%d%d' % (r, c)] = (r, c, len(col))
+            CB.takeDirty()
 
         self.threadWrapper.moveToThread(self.thread)
         self.thread.started.connect(entrypoint)
         self.threadWrapper.finished.connect(self.thread.quit)
         self.threadWrapper.sendData.connect(functions.updateHistory)
+        self.threadWrapper.sendDataBlock.connect(functions.updateHistoryBlock)
         self.threadWrapper.highlight.connect(functions.cbAntenna.cast)
         self.threadWrapper.displayData.connect(functions.displayUpdate.cast)
         if not deferredUpdate:
@@ -326,6 +346,17 @@ class BaseProgPanel(QtWidgets.QWidget):
         self.thread.finished.connect(partial(self._onThreadFinished, deferredUpdate))
         self.thread.start()
 
+    def stop(self):
+        """
+        Abort the operation started with `execute`, if any. Reads of the
+        instrument raise `ReadCancelled` from then on, which ends runners
+        decorated with `BaseThreadWrapper.runner`, until the operation's
+        thread has finished.
+        """
+        if (HW.ArC is None) or (self.thread is None):
+            return
+        HW.ArC.cancel()
+
     def _onThreadFinished(self, deferredUpdate=False):
         """ Clean up running threads and wake up the interface """
         if self.thread is None:
@@ -333,15 +364,17 @@ class BaseProgPanel(QtWidgets.QWidget):
 
         functions.interfaceAntenna.wakeUp()
         self.thread.wait()
+        # reads are allowed again once the operation has wound down
+        if HW.ArC is not None:
+            HW.ArC.clearCancel()
         self.threadWrapper.deleteLater()
         self.threadWrapper = None
         self.thread = None
 
         # If updates were deferred do them now in batch
         if deferredUpdate:
-            for (_, (w, b, idx)) in self._deferredUpdates.items():
+            for ((w, b), idx) in CB.takeDirty().items():
                 functions.historyTreeAntenna.updateTree_batch.emit(w, b, idx)
-            self._deferredUpdates.clear()
 
     def registerPropertyWidget(self, wdg, name):
         """
@@ -457,12 +490,29 @@ class BaseThreadWrapper(QtCore.QObject):
 
     The run function can then be connected to the ``start`` signal of a
     QThread as usual.
+
+    Modules producing data at high rates should use ``queueData`` instead of
+    emitting ``sendData`` for every measurement. Queued measurements are
+    sent to the session log in blocks, whenever ``blockSize`` measurements
+    have accumulated or ``blockInterval`` seconds have passed since the
+    last block, and finally when the runner returns. Call ``flushData``
+    before emitting ``updateTree`` to make sure the tree sees all the data.
+
+    >>>     @BaseThreadWrapper.runner
+    >>>     def do_stuff(self):
+    >>>         for (res, amp, pw) in measure_lots():
+    >>>             self.queueData(w, b, res, amp, pw, 'XYZ_i')
+    >>>         self.flushData()
+    >>>         self.updateTree.emit(w, b)
     """
 
     finished = QtCore.pyqtSignal()
     """ Process has finished """
     sendData = QtCore.pyqtSignal(int, int, float, float, float, str)
     """ Transfer data to be written to the session log """
+    sendDataBlock = QtCore.pyqtSignal(object, object, object, object, object,
+        object, object)
+    """ Transfer a block of data to be written to the session log """
     highlight = QtCore.pyqtSignal(int, int)
     """ Highlight a device in the crossbar view """
     displayData = QtCore.pyqtSignal()
@@ -472,6 +522,88 @@ class BaseThreadWrapper(QtCore.QObject):
     disableInterface = QtCore.pyqtSignal(bool)
     """ Toggle interface interaction """
 
+    blockSize = 256
+    """ Maximum number of queued measurements before a block is sent """
+    blockInterval = 0.1
+    """ Maximum time (in s) queued measurements wait before being sent """
+
+    # Defaults for subclasses that predate block support and do not call
+    # `BaseThreadWrapper.__init__`; the block is created on first use
+    _block = None
+    _lastBlock = 0.0
+
+    def __init__(self):
+        super().__init__()
+        self._block = []
+        self._lastBlock = time.monotonic()
+
+    def _queued(self):
+        if self._block is None:
+            self._block = []
+        return self._block
+
+    def queueData(self, w, b, m, a, pw, tag, Vread=None):
+        """
+        Queue a measurement to be sent to the session log as part of a
+        block. Arguments are the same as the ones of ``sendData``, plus an
+        optional read voltage (the current read voltage is used if None).
+        """
+        if Vread is None:
+            Vread = HW.conf.Vread
+        self._queued().append((w, b, m, a, pw, tag, Vread))
+
+        if len(self._block) >= self.blockSize or \
+                (time.monotonic() - self._lastBlock) >= self.blockInterval:
+            self.flushData()
+
+    def queueRecords(self, w, b, records, tag):
+        """
+        Queue the blocks of ``(resistance, amplitude, pulse width)`` records
+        yielded by ``records`` (typically `ArC1.records`) as a single block
+        of measurements for device ``(w, b)``: the first is tagged
+        ``tag_s``, the last ``tag_e`` and everything in between ``tag_i``.
+        A lone measurement is tagged ``tag_e``. Returns the number of
+        measurements queued.
+        """
+        Vread = HW.conf.Vread
+        count = 0
+        pending = None
+
+        for block in records:
+            if pending is not None:
+                block = np.concatenate((pending, block))
+            # the last record is only tagged once it's known what follows
+            (ready, pending) = (block[:-1].tolist(), block[-1:])
+            if len(ready) == 0:
+                continue
+            tags = [tag+'_i'] * len(ready)
+            if count == 0:
+                tags[0] = tag+'_s'
+            self._queued().extend([(w, b, m, a, pw, t, Vread) for \
+                ((m, a, pw), t) in zip(ready, tags)])
+            count += len(ready)
+            if len(self._block) >= self.blockSize or \
+                    (time.monotonic() - self._lastBlock) >= self.blockInterval:
+                self.flushData()
+
+        if pending is not None:
+            (m, a, pw) = pending[0].tolist()
+            self.queueData(w, b, m, a, pw, tag+'_e', Vread)
+            count += 1
+
+        return count
+
+    def flushData(self):
+        """
+        Send all queued measurements now and request a display update.
+        """
+        self._lastBlock = time.monotonic()
+        if not self._block:
+            return
+        (block, self._block) = (self._block, [])
+        self.sendDataBlock.emit(*[list(c) for c in zip(*block)])
+        self.displayData.emit()
+
     def runner(func):
         """
         Decorator used to signify a runnable function within a custom measuring
@@ -479,10 +611,102 @@ class BaseThreadWrapper(QtCore.QObject):
         """
         def inner(self):
             self.disableInterface.emit(True)
-            func(self)
+            try:
+                func(self)
+            except InstrumentError as exc:
+                # the interface must be released even if the instrument
+                # stalls or the operation is cancelled
+                print("Operation aborted:", exc)
+            finally:
+                if HW.ArC is not None:
+                    HW.ArC.clearCancel()
+            self.flushData()
             self.disableInterface.emit(False)
             self.finished.emit()
             self.displayData.emit()
         return inner
 
 
+class ResultCache(QtCore.QObject):
+    """
+    Prepared module results (see `ModTag`) for blocks of the session
+    history. Preparation steps run on a pool of worker threads and their
+    results are kept, keyed by ``(w, b, start, end, tag)``, until
+    invalidated. History is append-only, so a block's results only go
+    stale when the device's history is rebuilt or the session cleared; use
+    `ResultCache.invalidate` then.
+
+    >>> cache = ResultCache()
+    >>> cache.ready.connect(lambda key, result: show(key, result))
+    >>> cache.request((w, b, start, end, tag), prepare, w, b, data)
+    """
+
+    ready = QtCore.pyqtSignal(object, object)
+    """ Results for a key are available; emitted on the owner's thread """
+    _finished = QtCore.pyqtSignal(object, object)
+
+    def __init__(self, workers=2, parent=None):
+        super().__init__(parent)
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._results = {}
+        self._pending = {}
+        # futures complete on a worker; this brings them back here
+        self._finished.connect(self._onFinished)
+
+    def get(self, key):
+        """
+        Prepared results for ``key`` or None if there are none (yet).
+        """
+        return self._results.get(key, None)
+
+    def request(self, key, prepare, w, b, data):
+        """
+        Schedule ``prepare(w, b, data)`` on the worker pool unless results
+        for ``key`` are already available or being prepared. `ready` is
+        emitted once they are. Returns the results if they are already
+        available, None otherwise.
+        """
+        if key in self._results:
+            return self._results[key]
+        if key in self._pending:
+            return None
+
+        future = self._pool.submit(prepare, w, b, data)
+        self._pending[key] = future
+        future.add_done_callback(partial(self._finished.emit, key))
+        return None
+
+    def _onFinished(self, key, future):
+        # results of an invalidated request are dropped
+        if self._pending.get(key, None) is not future:
+            return
+        del self._pending[key]
+
+        try:
+            result = future.result()
+        except Exception as exc:
+            print("Could not prepare results for", key, ":", exc)
+            return
+
+        self._results[key] = result
+        self.ready.emit(key, result)
+
+    def invalidate(self, w=None, b=None):
+        """
+        Forget results for device ``(w, b)``, or everything if no device
+        is given. Preparation steps still running will be ignored.
+        """
+        def stale(key):
+            return w is None or key[:2] == (w, b)
+
+        for key in [k for k in self._results if stale(k)]:
+            del self._results[key]
+        for key in [k for k in self._pending if stale(k)]:
+            self._pending.pop(key).cancel()
+
+    def shutdown(self):
+        """
+        Stop the worker pool; pending preparation steps are abandoned.
+        """
+        self.invalidate()
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,769 @@
+"""
+Reading and writing ArC ONE session files.
+"""
+
+import os
+import io
+import csv
+import gzip
+import json
+import mmap
+import time
+import struct
+import itertools
+import queue
+import threading
+import numpy as np
+
+from .history import tagTable, DeviceHistory
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# number of CSV rows parsed in one go
+CSV_CHUNK_SIZE = 16384
+
+# maximum tag length for the fast CSV parser; chunks with longer tags
+# are parsed with the csv module instead
+_CSV_TAG_WIDTH = 128
+
+_CSV_DTYPE = np.dtype([('w', np.int64), ('b', np.int64), ('res', np.float64),
+    ('amp', np.float64), ('pw', np.float64), ('tag', 'U%d' % _CSV_TAG_WIDTH),
+    ('readTag', 'U%d' % _CSV_TAG_WIDTH), ('vread', np.float64)])
+
+# set to False if numpy's loadtxt does not support the fast path
+_fastParser = True
+
+# suffixes of compressed session files
+GZIP_SUFFIX = '.gz'
+ZSTD_SUFFIX = '.zst'
+
+# default compression level
+COMPRESSION_LEVEL = 9
+
+CSV_COLUMNS = ['Wordline', 'Bitline', 'Resistance', 'Amplitude (V)',
+    'Pulse width (s)', 'Tag', 'ReadTag', 'ReadVoltage']
+
+
+class SessionBlock:
+    """
+    A block of consecutive measurements for a single device as read from a
+    session file. All fields except ``w`` and ``b`` are numpy arrays of the
+    same length; tags are interned in `arc1pyqt.history.tagTable`.
+    """
+
+    __slots__ = ('w', 'b', 'res', 'amp', 'pw', 'tags', 'readTags', 'vread')
+
+    def __init__(self, w, b, res, amp, pw, tags, readTags, vread):
+        (self.w, self.b) = (w, b)
+        self.res = res
+        self.amp = amp
+        self.pw = pw
+        self.tags = tags
+        self.readTags = readTags
+        self.vread = vread
+
+    def __len__(self):
+        return len(self.res)
+
+
+def _parseRows(rows):
+    # convert a list of CSV rows into column arrays; raises ValueError
+    # if any of the rows is malformed
+    if any(len(r) < 8 for r in rows):
+        raise ValueError("Incomplete row")
+
+    cols = list(zip(*rows))
+
+    w = np.array(cols[0], dtype=np.int64)
+    b = np.array(cols[1], dtype=np.int64)
+    res = np.array(cols[2], dtype=np.float64)
+    amp = np.array(cols[3], dtype=np.float64)
+    pw = np.array(cols[4], dtype=np.float64)
+    tags = tagTable.codeArray(cols[5])
+    readTags = tagTable.codeArray(cols[6])
+    vread = np.array(cols[7], dtype=np.float64)
+
+    return (w, b, res, amp, pw, tags, readTags, vread)
+
+
+def _parseLines(lines):
+    # parse raw CSV lines with numpy's C parser (numpy >= 1.23); returns
+    # None if that is not possible
+    global _fastParser
+
+    if not _fastParser:
+        return None
+
+    try:
+        data = np.loadtxt(lines, delimiter=',', dtype=_CSV_DTYPE,
+            quotechar='"', comments=None, ndmin=1)
+    except TypeError:
+        # older numpy, no `quotechar`
+        _fastParser = False
+        return None
+    except ValueError:
+        return None
+
+    # tags might have been truncated
+    for field in ['tag', 'readTag']:
+        if len(data) > 0 and np.char.str_len(data[field]).max() >= _CSV_TAG_WIDTH:
+            return None
+
+    return (data['w'], data['b'], data['res'], data['amp'], data['pw'],
+        tagTable.codeArray(data['tag']), tagTable.codeArray(data['readTag']),
+        data['vread'])
+
+
+def _parseChunk(lines):
+    # parse a chunk of lines; if vectorised parsing fails fall back to
+    # parsing row by row dropping any invalid ones
+    columns = _parseLines(lines)
+    if columns is not None:
+        return (columns, False)
+
+    rows = [r for r in csv.reader(lines) if len(r) > 0]
+    if len(rows) == 0:
+        return (None, False)
+
+    try:
+        return (_parseRows(rows), False)
+    except ValueError:
+        pass
+
+    valid = []
+    for row in rows:
+        try:
+            _parseRows([row])
+            valid.append(row)
+        except ValueError:
+            pass
+
+    if len(valid) == 0:
+        return (None, True)
+
+    return (_parseRows(valid), True)
+
+
+def _groupByDevice(columns):
+    # split column arrays into per-device blocks keeping the file order
+    # of the rows within each device and the order of first appearance
+    # of the devices
+    (w, b) = columns[:2]
+    key = w * 65536 + b
+
+    order = np.argsort(key, kind='stable')
+    sortedKey = key[order]
+    (uniq, first) = np.unique(sortedKey, return_index=True)
+    bounds = np.append(first, len(sortedKey))
+
+    blocks = []
+    for (i, k) in enumerate(uniq.tolist()):
+        idx = order[bounds[i]:bounds[i+1]]
+        (bw, bb) = (int(w[idx[0]]), int(b[idx[0]]))
+        blocks.append((int(idx[0]), SessionBlock(bw, bb,
+            *[c[idx] for c in columns[2:]])))
+
+    return [blk for (_, blk) in sorted(blocks, key=lambda x: x[0])]
+
+
+def readCSVHeader(stream):
+    """
+    Read the three header lines of a CSV session file returning the name of
+    the session.
+    """
+    rdr = csv.reader(itertools.islice(stream, 3))
+    header = list(rdr)
+    if len(header) < 1 or len(header[0]) < 1:
+        raise ValueError("Invalid session header")
+    return str(header[0][0])
+
+
+def writeCSVHeader(writer, sessionName, date):
+    """
+    Write the three header lines of a CSV session file using the csv
+    ``writer``.
+    """
+    writer.writerow([sessionName])
+    writer.writerow([date])
+    writer.writerow(CSV_COLUMNS)
+
+
+def openCompressed(path, mode='rb', level=COMPRESSION_LEVEL, fileobj=None):
+    """
+    Open ``path`` for binary reading or writing (``mode`` is either ``'rb'``
+    or ``'wb'``) going through the compressor matching its suffix: gzip for
+    ``.gz`` and Zstandard for ``.zst`` (only if the ``zstandard`` package is
+    installed). Anything else is opened as is. ``level`` is the compression
+    level when writing. If ``fileobj`` is provided, it is an already open
+    binary file for ``path`` that is used instead of opening ``path``.
+    """
+    if path.endswith(GZIP_SUFFIX):
+        if fileobj is not None:
+            return gzip.GzipFile(fileobj=fileobj, mode=mode,
+                compresslevel=level)
+        return gzip.open(path, mode, compresslevel=level)
+
+    if path.endswith(ZSTD_SUFFIX):
+        if zstandard is None:
+            raise ValueError("Zstandard compression is not available")
+        raw = open(path, mode) if fileobj is None else fileobj
+        if mode.startswith('w'):
+            return zstandard.ZstdCompressor(level=level).stream_writer(raw,
+                closefd=fileobj is None)
+        return zstandard.ZstdDecompressor().stream_reader(raw,
+            closefd=fileobj is None)
+
+    return open(path, mode) if fileobj is None else fileobj
+
+
+def iterCSVBlocks(stream, chunksize=CSV_CHUNK_SIZE):
+    """
+    Parse the body of a CSV session file from ``stream`` (which must be
+    positioned after the header, see `readCSVHeader`) in chunks of
+    ``chunksize`` rows. For every chunk a tuple of ``(blocks, error)`` is
+    generated where ``blocks`` is a list of `SessionBlock` and ``error`` is
+    True if any malformed rows were dropped from the chunk.
+    """
+    while True:
+        lines = list(itertools.islice(stream, chunksize))
+        if len(lines) == 0:
+            return
+
+        (columns, error) = _parseChunk(lines)
+        if columns is None:
+            yield ([], error)
+        else:
+            yield (_groupByDevice(columns), error)
+
+
+def _quoteTag(tag):
+    # quote a tag the way `csv.writer` would
+    if any(c in tag for c in ',"\r\n'):
+        return '"%s"' % tag.replace('"', '""')
+    return tag
+
+
+def _formatFloats(col):
+    # format a float column exactly as `csv.writer` would with NaNs as
+    # empty fields; columns with many repeated values (amplitudes, pulse
+    # widths, read voltages) only have their unique values formatted
+    (uniq, inverse) = np.unique(col, return_inverse=True)
+    if len(uniq) > len(col) // 2:
+        return ['' if x != x else repr(x) for x in col.tolist()]
+    strs = np.array(['' if x != x else repr(x) for x in uniq.tolist()],
+        dtype=object)
+    return strs[inverse.ravel()].tolist()
+
+
+def _formatBlock(w, b, history, tagcodes, readtagcodes, tags):
+    # format a device history (or a slice of it) into CSV lines; `tags`
+    # are the already quoted tags of the tag table, indexed by code, and
+    # `tagcodes`/`readtagcodes` the tag codes of the rows of `history`
+    prefix = ['%d,%d' % (w, b)] * len(history)
+    res = _formatFloats(history.resistance)
+    amp = _formatFloats(history.amplitude)
+    pw = _formatFloats(history.pulsewidth)
+    vread = _formatFloats(history.vread)
+    tag = tags[tagcodes].tolist()
+    readTag = tags[readtagcodes].tolist()
+
+    lines = map(','.join, zip(prefix, res, amp, pw, tag, readTag, vread))
+    return ''.join([l + '\r\n' for l in lines]).encode('utf-8')
+
+
+def writeCSV(path, sessionName, date, history, words, bits,
+        level=COMPRESSION_LEVEL, progress=None, cancelled=None):
+    """
+    Save the session ``history`` (a matrix of
+    `arc1pyqt.history.DeviceHistory`) for a ``words × bits`` crossbar as a
+    CSV session file, compressed according to the suffix of ``path`` (see
+    `openCompressed`). Rows are formatted one block of devices at a time
+    while a separate thread compresses and writes out the previous blocks.
+
+    If provided, ``progress`` is called with the percentage of rows written
+    so far and ``cancelled`` is polled between blocks; if it returns True
+    saving is abandoned, nothing is written to ``path`` and False is
+    returned. Returns True otherwise.
+    """
+
+    # the temporary file keeps the suffix of `path` so that it goes
+    # through the same compressor
+    (head, tail) = os.path.split(path)
+    tmp = os.path.join(head, '.~' + tail)
+    table = history[1][1].tagTable
+
+    # take a snapshot of all the histories; measurements appended while
+    # saving end up in the next save. Tags can still be changed in place
+    # (see `DeviceHistory.setTag`) so tag codes are copied, and only then
+    # is the tag table read, so that it covers every copied code
+    devices = []
+    for w in range(1, words+1):
+        for b in range(1, bits+1):
+            dev = history[w][b][0:len(history[w][b])]
+            if len(dev) > 0:
+                devices.append((w, b, dev, dev.tagcodes.copy(),
+                    dev.readtagcodes.copy()))
+    tags = np.array([_quoteTag(t) for t in list(table.tags)], dtype=object)
+    total = max(sum(len(dev) for (_, _, dev, _, _) in devices), 1)
+
+    chunks = queue.Queue(maxsize=8)
+    errors = []
+
+    def compress():
+        try:
+            with openCompressed(tmp, 'wb', level) as out:
+                while True:
+                    chunk = chunks.get()
+                    if chunk is None:
+                        break
+                    out.write(chunk)
+        except Exception as exc:
+            errors.append(exc)
+            # keep draining so that the producer never blocks
+            while chunks.get() is not None:
+                pass
+
+    compressor = threading.Thread(target=compress, daemon=True)
+    compressor.start()
+
+    header = io.StringIO(newline='')
+    writeCSVHeader(csv.writer(header), sessionName, date)
+    chunks.put(header.getvalue().encode('utf-8'))
+
+    done = 0
+    aborted = False
+    for (w, b, dev, tagcodes, readtagcodes) in devices:
+        for start in range(0, len(dev), CSV_CHUNK_SIZE):
+            if len(errors) > 0 or (cancelled is not None and cancelled()):
+                aborted = True
+                break
+            block = dev[start:start+CSV_CHUNK_SIZE]
+            chunks.put(_formatBlock(w, b, block,
+                tagcodes[start:start+CSV_CHUNK_SIZE],
+                readtagcodes[start:start+CSV_CHUNK_SIZE], tags))
+            done += len(block)
+            if progress is not None:
+                progress(int(done*100/total))
+        if aborted:
+            break
+
+    chunks.put(None)
+    compressor.join()
+
+    if aborted or len(errors) > 0:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        if len(errors) > 0:
+            raise errors[0]
+        return False
+
+    os.replace(tmp, path)
+    return True
+
+
+# Binary session files
+#
+# A binary session file is laid out as follows (all values little-endian)
+#
+#   magic (8 bytes) | version (u32) | reserved (u32) | directory offset (u64) |
+#   directory length (u64) | column blocks ... | directory
+#
+# Every device with data has one contiguous block per history column, each
+# aligned to 8 bytes, followed by its tree index: the rows that produce an
+# entry in the history tree (reads, pulses and module end tags). The
+# directory is a UTF-8 encoded JSON document holding the session name, the
+# tag table (the index of each tag is its code) and, for every device, the
+# number of rows and the offsets of its column blocks and tree index.
+
+BINARY_MAGIC = b'ARC1SESS'
+BINARY_VERSION = 1
+BINARY_SUFFIX = '.arc1'
+
+_BINARY_HEADER = struct.Struct('<8sIIQQ')
+
+_BINARY_COLUMNS = (
+    ('resistance', '<f8'),
+    ('amplitude', '<f8'),
+    ('pulsewidth', '<f8'),
+    ('vread', '<f8'),
+    ('tagcode', '<i4'),
+    ('readtagcode', '<i4'),
+    ('startidx', '<i8')
+)
+
+
+def _writeAligned(stream, arr, dtype):
+    # write `arr` as `dtype` padding the stream to 8 bytes first;
+    # returns the offset the array was written to
+    pos = stream.tell()
+    if pos % 8 != 0:
+        stream.write(b'\0' * (8 - pos % 8))
+        pos = stream.tell()
+    stream.write(np.ascontiguousarray(arr, dtype=dtype).tobytes())
+    return pos
+
+
+def writeBinary(path, sessionName, date, history, words, bits):
+    """
+    Save the session ``history`` (a matrix of
+    `arc1pyqt.history.DeviceHistory`) for a ``words × bits`` crossbar into
+    the binary session file ``path``. The file is first written next to
+    ``path`` and then moved in place, so that memory-mapped histories
+    loaded from ``path`` remain valid.
+    """
+
+    tmp = path + '.tmp'
+    devices = []
+    table = history[1][1].tagTable
+    updatesTree = table.treeMask()
+
+    with open(tmp, 'wb') as stream:
+        stream.write(_BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0, 0, 0))
+
+        for w in range(1, words+1):
+            for b in range(1, bits+1):
+                dev = history[w][b]
+                if len(dev) == 0:
+                    continue
+
+                entry = { 'w': w, 'b': b, 'rows': len(dev), 'columns': {} }
+                for (name, dt) in _BINARY_COLUMNS:
+                    entry['columns'][name] = _writeAligned(stream,
+                        dev.column(name), dt)
+
+                treeRows = np.flatnonzero(updatesTree[dev.tagcodes])
+                entry['tree'] = _writeAligned(stream, treeRows, '<i8')
+                entry['treeRows'] = len(treeRows)
+                devices.append(entry)
+
+        directory = json.dumps({ 'session': sessionName, 'date': date,
+            'tags': list(table.tags), 'devices': devices }).encode('utf-8')
+        dirOffset = stream.tell()
+        stream.write(directory)
+
+        stream.seek(0)
+        stream.write(_BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0,
+            dirOffset, len(directory)))
+
+    os.replace(tmp, path)
+
+
+class BinarySession:
+    """
+    A binary session file opened for reading. Column data are memory-mapped
+    and only read from disk when they are actually accessed, so opening a
+    session is independent of its size. Histories returned by
+    `BinarySession.history` share the mapping.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            # copy-on-write; modifications never reach the file
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+        if len(self._map) < _BINARY_HEADER.size:
+            raise ValueError("Not a binary session file")
+
+        (magic, version, _, dirOffset, dirLength) = \
+            _BINARY_HEADER.unpack_from(self._map, 0)
+
+        if magic != BINARY_MAGIC:
+            raise ValueError("Not a binary session file")
+        if version > BINARY_VERSION:
+            raise ValueError("Unsupported binary session version %d" % version)
+
+        directory = json.loads(bytes(self._map[dirOffset:dirOffset+dirLength]))
+        self.sessionName = directory['session']
+        self.date = directory.get('date', '')
+        self.tags = directory['tags']
+        self._devices = { (d['w'], d['b']): d for d in directory['devices'] }
+
+    @property
+    def devices(self):
+        """
+        Coordinates of all devices with data, in file order.
+        """
+        return list(self._devices.keys())
+
+    def _array(self, offset, count, dtype):
+        return np.frombuffer(self._map, dtype=dtype, count=count, offset=offset)
+
+    def history(self, w, b, tags=None, lut=None):
+        """
+        Return the `arc1pyqt.history.DeviceHistory` of device ``(w, b)``.
+        Tag codes are interned in ``tags`` (defaults to
+        `arc1pyqt.history.tagTable`); if the codes of the file do not match
+        those of ``tags`` a lookup table ``lut`` mapping file codes to
+        ``tags`` codes must be provided (see `BinarySession.tagLUT`) in
+        which case the tag columns are read and translated immediately.
+        """
+        entry = self._devices[(w, b)]
+        rows = entry['rows']
+        columns = {}
+
+        for (name, dt) in _BINARY_COLUMNS:
+            columns[name] = self._array(entry['columns'][name], rows, dt)
+
+        if lut is not None:
+            columns['tagcode'] = lut[columns['tagcode']]
+            columns['readtagcode'] = lut[columns['readtagcode']]
+
+        return DeviceHistory.fromColumns(columns, tags)
+
+    def treeRows(self, w, b):
+        """
+        Rows of device ``(w, b)`` that produce an entry in the history tree.
+        """
+        entry = self._devices[(w, b)]
+        return self._array(entry['tree'], entry['treeRows'], '<i8')
+
+    def tagLUT(self, tags=None):
+        """
+        Intern the tags of the file in ``tags`` (defaults to
+        `arc1pyqt.history.tagTable`). Returns None if the file codes are
+        identical to the ``tags`` codes, otherwise an array mapping file
+        codes to ``tags`` codes.
+        """
+        if tags is None:
+            tags = tagTable
+        lut = np.array([tags.code(t) for t in self.tags], dtype=np.int32)
+        if np.array_equal(lut, np.arange(len(lut))):
+            return None
+        return lut
+
+
+# Autosave journal
+#
+# The journal is a CSV session file that is only ever appended to: rows are
+# written in the order they were measured instead of being grouped by
+# device. The CSV loader copes with interleaved devices so a journal left
+# behind by a crash can be opened as any other session, and
+# `compactJournal` turns it into a regular session file.
+
+# flush pending rows once this many have accumulated ...
+JOURNAL_FLUSH_SIZE = 4096
+# ... or at least this often (in seconds)
+JOURNAL_FLUSH_INTERVAL = 1.0
+
+
+class Journal:
+    """
+    Append-only autosave journal at ``path``. Rows submitted with
+    `Journal.record` are buffered and written out in batches by a
+    background thread, so recording a measurement never waits on the
+    disk.
+
+    >>> journal = Journal('/path/to/autosave.csv')
+    >>> journal.reset('Package 1')
+    >>> journal.record(1, 1, 1000.0, 0.5, 1e-4, 'P', 'R2', 0.5)
+    >>> journal.close()
+    """
+
+    def __init__(self, path, flushSize=JOURNAL_FLUSH_SIZE,
+            flushInterval=JOURNAL_FLUSH_INTERVAL):
+        self.path = path
+        self.flushSize = flushSize
+        self.flushInterval = flushInterval
+        # number of rows recorded since the last reset
+        self.rows = 0
+
+        self._pending = []
+        self._stream = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._ioLock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def reset(self, sessionName):
+        """
+        Discard all journaled rows and start a new journal for session
+        ``sessionName``.
+        """
+        with self._ioLock:
+            with self._cond:
+                self._pending = []
+                self.rows = 0
+            if self._stream is not None:
+                self._stream.close()
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._stream = open(self.path, 'w', newline='')
+            writeCSVHeader(csv.writer(self._stream), sessionName,
+                time.strftime("%c"))
+            self._sync()
+
+    def resume(self):
+        """
+        Continue appending to an existing journal, for instance one left
+        behind by a crash, dropping any incomplete last row. Returns the
+        number of rows already in the journal.
+        """
+        with open(self.path, 'rb') as stream:
+            lines = stream.readlines()
+
+        valid = sum(len(l) for l in lines)
+        if len(lines) > 0 and not lines[-1].endswith(b'\n'):
+            valid -= len(lines.pop())
+
+        with self._ioLock:
+            with self._cond:
+                self._pending = []
+                self.rows = max(len(lines) - 3, 0)
+            if self._stream is not None:
+                self._stream.close()
+            self._stream = open(self.path, 'a', newline='')
+            self._stream.truncate(valid)
+
+        return self.rows
+
+    def record(self, w, b, res, amp, pw, tag, readTag, Vread):
+        """
+        Queue a row for writing; a ``Vread`` of None is stored as an empty
+        field, as in regular session files.
+        """
+        with self._cond:
+            self._pending.append((w, b, res, amp, pw, tag, readTag, Vread))
+            self.rows += 1
+            if len(self._pending) >= self.flushSize:
+                self._cond.notify()
+
+    def recordBlock(self, rows):
+        """
+        Same as `Journal.record` for an iterable of row tuples.
+        """
+        with self._cond:
+            before = len(self._pending)
+            self._pending.extend(rows)
+            self.rows += len(self._pending) - before
+            if len(self._pending) >= self.flushSize:
+                self._cond.notify()
+
+    def flush(self):
+        """
+        Write out all pending rows now.
+        """
+        with self._ioLock:
+            with self._cond:
+                (rows, self._pending) = (self._pending, [])
+            self._write(rows)
+
+    def close(self, remove=False):
+        """
+        Flush pending rows and stop the writer thread. The journal file is
+        deleted if ``remove`` is True.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+        with self._ioLock:
+            if self._stream is not None:
+                self._stream.close()
+                self._stream = None
+            if remove and os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._pending) < self.flushSize:
+                    self._cond.wait(self.flushInterval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def _write(self, rows):
+        # must be called with `_ioLock` held
+        if len(rows) == 0 or self._stream is None:
+            return
+        writer = csv.writer(self._stream)
+        writer.writerows([(w, b, float(res), float(amp), float(pw), tag,
+            readTag, '' if Vread is None else float(Vread))
+            for (w, b, res, amp, pw, tag, readTag, Vread) in rows])
+        self._sync()
+
+    def _sync(self):
+        self._stream.flush()
+        try:
+            os.fsync(self._stream.fileno())
+        except OSError:
+            pass
+
+
+def compactJournal(src, dst, sessionName, date, level=COMPRESSION_LEVEL,
+        progress=None, cancelled=None):
+    """
+    Turn the journal ``src`` into the regular session file ``dst``
+    (compressed according to its suffix, see `openCompressed`) with rows
+    grouped by device. Rows are moved as text, only the device coordinates
+    are parsed. The journal is indexed in a first pass and then copied one
+    device at a time, so only the position of every row is held in memory.
+    Rows appended to the journal while compacting are left out.
+
+    ``progress`` and ``cancelled`` work as in `writeCSV`; returns False if
+    compaction was cancelled and True otherwise.
+    """
+
+    (keys, offsets, lengths) = ([], [], [])
+
+    with open(src, 'rb') as stream:
+        # skip the journal header; the session header is written anew
+        for _ in range(3):
+            stream.readline()
+        pos = stream.tell()
+        for line in stream:
+            # a crash might have left an incomplete last line
+            if not line.endswith(b'\n'):
+                break
+            (w, b, _) = line.split(b',', 2)
+            keys.append(int(w) * 65536 + int(b))
+            offsets.append(pos)
+            lengths.append(len(line))
+            pos += len(line)
+
+        order = np.argsort(np.array(keys, dtype=np.int64), kind='stable')
+        offsets = np.array(offsets, dtype=np.int64)[order]
+        lengths = np.array(lengths, dtype=np.int64)[order]
+        del keys
+
+        # rows of a device measured back to back are contiguous in the
+        # journal; read every such run at once
+        runs = np.flatnonzero(np.concatenate(([True],
+            offsets[1:] != offsets[:-1] + lengths[:-1])))
+        runEnds = np.append(runs[1:], len(offsets))
+
+        (head, tail) = os.path.split(dst)
+        tmp = os.path.join(head, '.~' + tail)
+        total = max(len(offsets), 1)
+        aborted = False
+
+        with openCompressed(tmp, 'wb', level) as out:
+            header = io.StringIO(newline='')
+            writeCSVHeader(csv.writer(header), sessionName, date)
+            out.write(header.getvalue().encode('utf-8'))
+
+            done = 0
+            for (first, last) in zip(runs.tolist(), runEnds.tolist()):
+                stream.seek(offsets[first])
+                out.write(stream.read(int(offsets[last-1] + lengths[last-1] -
+                    offsets[first])))
+                if last - done >= CSV_CHUNK_SIZE or last == len(offsets):
+                    done = last
+                    if progress is not None:
+                        progress(int(done*100/total))
+                    if cancelled is not None and cancelled():
+                        aborted = True
+                        break
+
+    if aborted:
+        os.remove(tmp)
+        return False
+
+    os.replace(tmp, dst)
+    return True
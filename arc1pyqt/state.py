@@ -3,6 +3,7 @@ from dataclasses import dataclass
 import numpy as np
 from PyQt5.QtCore import QMutex, QWaitCondition
 from .instrument import HWConfig
+from .history import emptyHistory, tagTable
 
 
 class DisplayMode(IntEnum):
@@ -17,27 +18,87 @@ class Crossbar:
     word = 1
     bit = 1
     limits = { 'words': (1, 1), 'bits': (1, 1) }
-    history = [[[] for bit in range(33)] for word in range(33)]
+    history = emptyHistory()
     checkSA = False
     customArray = []
     startTags = {}
+    dirty = {}
 
-    def append(self, w, b, *args):
-        tag = args[3]
+    def append(self, w, b, res, amp, pw, tag, readTag, Vread):
+        self.appendCodes(w, b, res, amp, pw, tagTable.code(tag),
+            tagTable.code(readTag), Vread)
+
+    def appendCodes(self, w, b, res, amp, pw, tagCode, readTagCode, Vread):
+        """
+        Same as `Crossbar.append` but with tags already interned in the
+        session tag table (`arc1pyqt.history.tagTable`).
+        """
+        phase = tagTable.info(tagCode).phase
         startIdx = -1
-        if tag.endswith('_s'):
+        if phase == 's':
             if len(self.history[w][b]) <= 0:
                 start = 0
             else:
                 start = len(self.history[w][b])-1
             self.addStartTag(w, b, start)
-        if tag.endswith('_e'):
+        elif phase == 'e':
             key = '%s,%s' % (w,b)
             if key in self.startTags.keys() and len(self.startTags[key]) > 0:
                 startIdx = self.startTags[key].pop()
-        self.history[w][b].append([*args, startIdx])
+        self.dirty.setdefault((w, b), len(self.history[w][b]))
+        self.history[w][b].appendCodes(res, amp, pw, tagCode, readTagCode,
+            Vread, startIdx)
+
+    def extendCodes(self, w, b, res, amp, pw, tagCodes, readTagCodes, Vread,
+            notify=False):
+        """
+        Bulk version of `Crossbar.appendCodes` that inserts a block of
+        measurements for a single device. Start and end tags are paired
+        exactly as they would be if each row was appended individually.
+        Argument ``notify`` is passed on to `Crossbar.addStartTag`.
+        """
+        history = self.history[w][b]
+        offset = len(history)
+        self.dirty.setdefault((w, b), offset)
+        history.extendCodes(res, amp, pw, tagCodes, readTagCodes, Vread)
 
-    def addStartTag(self, w, b, idx):
+        # only start and end tags need further processing
+        tagCodes = np.asarray(tagCodes)
+        phases = tagTable.phases()[tagCodes]
+        key = '%s,%s' % (w, b)
+        for idx in np.flatnonzero((phases == 's') | (phases == 'e')).tolist():
+            row = offset + idx
+            if phases[idx] == 's':
+                self.addStartTag(w, b, max(row-1, 0), before=row, notify=notify)
+            elif key in self.startTags.keys() and len(self.startTags[key]) > 0:
+                history.setStartIndex(row, self.startTags[key].pop())
+
+    def clear(self):
+        """
+        Discard all measurements and any pending start tags.
+        """
+        self.history = emptyHistory()
+        self.startTags = {}
+        self.dirty = {}
+        tagTable.clear()
+
+    def takeDirty(self):
+        """
+        Return the devices that received new measurements since the last
+        call as a dict mapping ``(w, b)`` to the index of the first new
+        history row of each device, and start tracking afresh.
+        """
+        (dirty, self.dirty) = (self.dirty, {})
+        return dirty
+
+    def addStartTag(self, w, b, idx, before=None, notify=True):
+        """
+        Register the start index ``idx`` of a new block. Argument ``before``
+        limits the search for orphan intermediate tags to rows preceding it
+        (defaults to the whole history) and ``notify`` controls whether the
+        history tree is asked to rebuild if an orphan block had to be
+        closed.
+        """
         key = '%s,%s' % (w, b)
         if key not in self.startTags.keys():
             self.startTags[key] = [idx]
@@ -54,39 +115,43 @@ class Crossbar:
             if len(self.startTags[key]) > 0:
                 print("orphan start tag encountered when adding new start tag")
                 # go backwards in history
-                for (revidx, entry) in enumerate(reversed(self.history[w][b])):
-                    # and find the last intermediate tag (first backwards)
-                    if entry[3].endswith('_i') or entry[3].find('_i_') > 0:
-                        print(" entry       ", entry)
-                        # store the index of that tag
-                        revidx = len(self.history[w][b]) - revidx -1
-                        # take only the first part of the tag, so for instance
-                        # if tag is 'XXX_i' -> 'XXX'
-                        # if tag is 'XXX_i_y' -> 'XXX'
-                        # this is always first.
-                        tag = entry[3].split('_')[0]
-                        # correct the intermediate tag into an end tag
-                        self.history[w][b][revidx][3] = '%s_e' % tag
-                        # and put that stray start index into its proper place
-                        # emptying the startTag stack
-                        self.history[w][b][revidx][-1] = self.startTags[key].pop()
-                        print(" corrected to", self.history[w][b][revidx])
-
-                        # Unfortunately altering history after having been
-                        # communicated to the interface means that the previous
-                        # entries in the history tree are now invalid. That's
-                        # because we can only realise there is a problem with a
-                        # given data block only AFTER we cross into the next one
-                        # which is already too late. This signal notifies the
-                        # history tree to reload that specific (w, b) combination.
-                        # As you can understand in a log file with many errors this
-                        # will take a while. There is probably a better way to do
-                        # this by removing the previous entry from the tree and
-                        # reading only those too, however this requires much
-                        # working around specific cases for a situation that should
-                        # not happen *that* frequently anyway.
+                history = self.history[w][b]
+                # find the last intermediate tag ('XXX_i' or 'XXX_i_y'); that
+                # is the last row whose tag code is one of the intermediate
+                # codes
+                intermediate = np.flatnonzero(tagTable.phases() == 'i')
+                matches = np.flatnonzero(np.isin(history.tagcodes[:before],
+                    intermediate))
+                if len(matches) > 0:
+                    # store the index of that tag
+                    revidx = int(matches[-1])
+                    print(" entry       ", history[revidx])
+                    # take only the module part of the tag, so for instance
+                    # if tag is 'XXX_i' -> 'XXX'
+                    # if tag is 'XXX_i_y' -> 'XXX'
+                    tag = history.tagInfo(revidx).module
+                    # correct the intermediate tag into an end tag
+                    history.setTag(revidx, '%s_e' % tag)
+                    # and put that stray start index into its proper place
+                    # emptying the startTag stack
+                    history.setStartIndex(revidx, self.startTags[key].pop())
+                    print(" corrected to", history[revidx])
+
+                    # Unfortunately altering history after having been
+                    # communicated to the interface means that the previous
+                    # entries in the history tree are now invalid. That's
+                    # because we can only realise there is a problem with a
+                    # given data block only AFTER we cross into the next one
+                    # which is already too late. This signal notifies the
+                    # history tree to reload that specific (w, b) combination.
+                    # As you can understand in a log file with many errors this
+                    # will take a while. There is probably a better way to do
+                    # this by removing the previous entry from the tree and
+                    # reading only those too, however this requires much
+                    # working around specific cases for a situation that should
+                    # not happen *that* frequently anyway.
+                    if notify:
                         functions.historyTreeAntenna.rebuildTreeTopLevel.emit(w, b)
-                        break
 
             self.startTags[key].append(idx)
 
@@ -103,6 +168,13 @@ class Application:
     displayMode = DisplayMode.RESISTANCE
     mutex = QMutex()
     waitCondition = QWaitCondition()
+    journal = None
+    compressionLevel = 9
+    readTimeout = 7
+    imageCrossbar = False
+    virtualModel = 'parametric'
+    virtualVariation = 0.0
+    virtualSeed = None
 
 
 @dataclass
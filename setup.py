@@ -155,7 +155,8 @@ setup(
     python_requires = '>=3.6',
     install_requires = requirements,
     entry_points = {
-        'console_scripts': ['arc1pyqt = arc1pyqt.main:main']
+        'console_scripts': ['arc1pyqt = arc1pyqt.main:main',
+            'arc1pyqt-emulator = arc1pyqt.VirtualArC.pty_emulator:main']
     },
     package_data = {
         'arc1pyqt': ['Graphics/*png', 'Graphics/*svg', 'Graphics/*ico',\